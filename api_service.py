@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, g, has_request_context
 from flask_cors import CORS  # 导入CORS支持
 import io
 import os
@@ -7,59 +7,999 @@ import tempfile
 import json
 import yaml
 import uuid
-from PIL import Image
-from generate_from_json import generate_diagram
+import time
+import shutil
+import zipfile
+import hmac
+import re
+import pstats
+import threading
+from concurrent.futures import wait, CancelledError, FIRST_COMPLETED
+from functools import partial
+from generate_from_json import RenderTimeoutError, render_draft
+from topology_ir import compile_topology
+from topology_index import QueryError
+from config_validator import ConfigValidationError, check_config
+from render_cache import RenderCache, config_cache_key
+from format_variants import (MIME_TYPES, LAYOUT_VARIANT, RESIZABLE_FORMATS, COMPRESSIBLE_FORMATS, compress,
+                             negotiate_encoding, negotiate_format, parse_size, parse_variant, resize,
+                             variant_name)
+from render_pool import RenderPool, PoolBusyError
+from preview_sessions import PreviewSessions
+from job_store import InMemoryJobStore, FileJobStore, QUEUED, RUNNING, DONE, FAILED
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, COUNT_BUCKETS, BYTES_BUCKETS
+from request_trace import TraceLog, server_timing
 
 app = Flask(__name__)
 CORS(app)  # 启用CORS支持，允许所有域的跨域请求
 
-# 图像输出目录，临时存储生成的图像
-OUTPUT_DIR = "D:/network_diagrams"
+# 图像输出目录，存放渲染缓存和异步任务结果，可通过环境变量OUTPUT_DIR修改
+OUTPUT_DIR = os.environ.get('OUTPUT_DIR', "D:/network_diagrams")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# 渲染结果缓存，相同配置的重复请求直接从缓存返回
+CACHE_DIR = os.path.abspath(os.path.join(OUTPUT_DIR, "cache"))
+render_cache = RenderCache(
+    CACHE_DIR,
+    max_bytes=int(os.environ.get('RENDER_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    max_entries=int(os.environ.get('RENDER_CACHE_MAX_ENTRIES', 1024)),
+)
+
+# 布局缓存目录（reuse_layout配置使用），由所有渲染工作进程共享
+os.environ.setdefault('LAYOUT_CACHE_DIR', os.path.abspath(os.path.join(OUTPUT_DIR, "layouts")))
+
+# 布局时间预算（秒），配置中没有 layout_budget 时使用。此时总是先按配置原样布局，
+# 只在超出预算份额时终止Graphviz并降档重试（不按图的规模跳过档位），0表示不限制
+LAYOUT_BUDGET = float(os.environ.get('LAYOUT_BUDGET', 60))
+
+# 渲染进程池，避免大图渲染占满请求线程；进程数和队列深度可配置
+render_pool = RenderPool(
+    workers=int(os.environ.get('RENDER_WORKERS', 0)) or None,
+    queue_depth=int(os.environ['RENDER_QUEUE_DEPTH']) if 'RENDER_QUEUE_DEPTH' in os.environ else None,
+    timeout=float(os.environ.get('RENDER_TIMEOUT', 120)),
+)
+
+# 异步任务存储及结果目录，结果在任务结束后保留JOB_RESULT_TTL秒
+JOBS_DIR = os.path.abspath(os.path.join(OUTPUT_DIR, "jobs"))
+os.makedirs(JOBS_DIR, exist_ok=True)
+# JOB_STORE=file 时任务记录保存在 JOBS_DIR/records 中，由各工作进程共享（生产模式默认如此）
+if os.environ.get('JOB_STORE', 'memory') == 'file':
+    job_store = FileJobStore(os.path.join(JOBS_DIR, "records"), ttl=float(os.environ.get('JOB_RESULT_TTL', 3600)))
+else:
+    job_store = InMemoryJobStore(ttl=float(os.environ.get('JOB_RESULT_TTL', 3600)))
+# 本进程的渲染进程池中尚未结束的任务: 任务ID -> Future
+_running_jobs = {}
+
+# 单次批量请求允许的最大配置数
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 1000))
+
+# 草图预览在请求线程中直接调用Graphviz（不经过渲染进程池），同一会话只保留最新的一次
+PREVIEW_TIMEOUT = float(os.environ.get('PREVIEW_TIMEOUT', 10))
+# 会话的最新渲染代号放在共享目录中，多进程部署时同一会话的请求落在不同工作进程也能取消旧渲染
+preview_sessions = PreviewSessions(max_in_flight=int(os.environ.get('PREVIEW_MAX_IN_FLIGHT', 0)) or os.cpu_count() or 1,
+                                   state_dir=os.path.join(OUTPUT_DIR, "preview_sessions"))
+# 草图预览在渲染缓存中的条目名前缀，如 <key>.draft.svg
+DRAFT_VARIANT = "draft"
+
+# /diagrams/<hash> 按内容寻址，同一地址的结果不会改变，允许浏览器和CDN长期缓存（秒）
+DIAGRAMS_MAX_AGE = int(os.environ.get('DIAGRAMS_MAX_AGE', 365 * 24 * 3600))
+
+# 运行指标，通过 /metrics 以Prometheus文本格式暴露（每个进程单独统计）
+metrics_registry = Registry()
+REQUESTS = metrics_registry.counter(
+    'diagram_requests_total', '按端点、状态码和输出格式统计的请求数', ('endpoint', 'status', 'format'))
+PHASE_SECONDS = metrics_registry.histogram(
+    'diagram_phase_seconds', '各阶段耗时: parse(请求解析与校验) queue(排队) build(构图) '
+    'layout(Graphviz布局) render(按布局绘制各格式) resize(生成缩略图) compress(gzip/brotli压缩) '
+    'draft(草图预览的布局与绘制) send(打开结果并构造响应)', ('phase',))
+CONFIG_NODES = metrics_registry.histogram('diagram_config_nodes', '渲染配置的节点数', buckets=COUNT_BUCKETS)
+CONFIG_EDGES = metrics_registry.histogram('diagram_config_edges', '渲染配置的连线数', buckets=COUNT_BUCKETS)
+CONFIG_CLUSTERS = metrics_registry.histogram('diagram_config_clusters', '渲染配置的区域数', buckets=COUNT_BUCKETS)
+OUTPUT_BYTES = metrics_registry.histogram(
+    'diagram_output_bytes', '渲染结果的字节数', ('format',), buckets=BYTES_BUCKETS)
+LAYOUT_TIER_SECONDS = metrics_registry.histogram(
+    'diagram_layout_tier_seconds', '每次布局尝试的耗时，按布局档位和结果（ok: 完成, timeout: 超出预算后降档）统计',
+    ('tier', 'outcome'))
+RENDER_FAILURES = metrics_registry.counter(
+    'diagram_render_failures_total', '渲染子进程失败次数（timeout: 超时, error: Graphviz或进程错误）', ('reason',))
+metrics_registry.gauge('diagram_renders_in_flight', '正在渲染及排队中的任务数',
+                       callback=lambda: render_pool.stats()['in_flight'])
+metrics_registry.gauge('diagram_render_cache_hits', '渲染结果缓存命中次数',
+                       callback=lambda: render_cache.stats()['hits'])
+metrics_registry.gauge('diagram_render_cache_misses', '渲染结果缓存未命中次数',
+                       callback=lambda: render_cache.stats()['misses'])
+metrics_registry.gauge('diagram_render_cache_bytes', '渲染结果缓存占用字节数',
+                       callback=lambda: render_cache.stats()['bytes'])
+
+# 预热用的最小配置，启动时在每个渲染工作进程中各渲染一次
+WARMUP_CONFIG = {
+    "title": "warm-up",
+    "nodes": [{"id": "a", "icon": "server", "label": "A"}, {"id": "b", "icon": "switch", "label": "B"}],
+    "connections": [{"from": "a", "to": "b"}],
+}
+# 预热完成后置位，/ready 据此判断是否可以接收流量；优雅退出时清除
+_ready = threading.Event()
+_warmup = {}
+metrics_registry.gauge('diagram_warmup_seconds', '本进程启动预热耗时（导入依赖并完成预热渲染）',
+                       callback=lambda: _warmup.get('seconds', 0))
+
+# 请求追踪日志（JSON Lines，按大小轮转）
+trace_log = TraceLog(
+    os.environ.get('TRACE_LOG', os.path.join(OUTPUT_DIR, "traces", "traces.jsonl")),
+    max_bytes=int(os.environ.get('TRACE_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backups=int(os.environ.get('TRACE_LOG_BACKUPS', 5)),
+)
+
+# 管理员令牌，设置后才允许按请求开启性能分析；分析结果保存在PROFILES_DIR中
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+PROFILES_DIR = os.path.abspath(os.path.join(OUTPUT_DIR, "profiles"))
+os.makedirs(PROFILES_DIR, exist_ok=True)
+PROFILES_KEEP = int(os.environ.get('PROFILES_KEEP', 50))
+
+@app.after_request
+def _count_request(response):
+    """按端点、状态码和输出格式统计请求数，并结束本次请求的追踪"""
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code, format=g.get('diagram_format', ''))
+    trace = g.get('trace')
+    if trace is not None:
+        _finish_trace(trace, endpoint, response)
+    return response
+
+def _start_trace():
+    """开始记录当前请求的追踪信息，各阶段耗时由 _observe_phase 写入"""
+    g.trace = {"trace_id": uuid.uuid4().hex, "time": time.time(), "phases": {},
+               "_start": time.perf_counter()}
+    return g.trace
+
+def _finish_trace(trace, endpoint, response):
+    """补全追踪信息，写入 Server-Timing 响应头和追踪日志"""
+    phases = trace["phases"]
+    phases["total"] = time.perf_counter() - trace.pop("_start")
+    descriptions = {"cache": trace["cache"]} if "cache" in trace else None
+    response.headers['Server-Timing'] = server_timing(phases, descriptions)
+    response.headers['X-Trace-Id'] = trace["trace_id"]
+    trace.update(endpoint=endpoint, method=request.method, status=response.status_code,
+                 format=g.get('diagram_format'))
+    trace["phases"] = {k: round(v, 6) for k, v in phases.items()}
+    if response.status_code >= 400 and response.is_json:
+        trace["error"] = (response.get_json(silent=True) or {}).get("error")
+    try:
+        trace_log.write(trace)
+    except OSError as e:
+        app.logger.warning("写入追踪日志失败: %s", e)
+
+def _observe_phase(phase, seconds):
+    """记录阶段耗时到指标直方图，请求内同时计入本次追踪"""
+    PHASE_SECONDS.observe(seconds, phase=phase)
+    if has_request_context():
+        trace = g.get('trace')
+        if trace is not None:
+            trace["phases"][phase] = trace["phases"].get(phase, 0.0) + seconds
+
+def _is_admin():
+    """请求是否携带有效的管理员令牌（X-Admin-Token 或 Authorization: Bearer）"""
+    if not ADMIN_TOKEN:
+        return False
+    token = request.headers.get('X-Admin-Token', '')
+    auth = request.headers.get('Authorization', '')
+    if not token and auth.startswith('Bearer '):
+        token = auth[len('Bearer '):]
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
+
+def _profile_requested():
+    return request.args.get('profile') in ('1', 'true') or request.headers.get('X-Profile') in ('1', 'true')
+
+def _prune_profiles():
+    """只保留最近的 PROFILES_KEEP 份性能分析结果"""
+    profiles = sorted((entry.stat().st_mtime, entry.path) for entry in os.scandir(PROFILES_DIR)
+                      if entry.name.endswith('.prof'))
+    for _, path in profiles[:-PROFILES_KEEP] if PROFILES_KEEP > 0 else profiles:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
 @app.route('/generate', methods=['POST'])
 def generate_diagram_api():
-    """API endpoint接收JSON数据并返回生成的图表图像"""
+    """API endpoint接收JSON数据并返回生成的图表图像
+
+    输出格式依次取查询参数 format、Accept请求头中支持的类型、配置中的 outformat；
+    formats=svg,png,pdf 以ZIP返回多种格式；width 或 scale 返回缩略图。同一配置
+    只做一次布局，各格式和缩略图都由缓存的布局或完整尺寸的结果派生并分别缓存。
+
+    查询参数 path=A,B、neighbours=A（配合 hops=k）或 reachable=A 只绘制匹配的子图，
+    等同于配置中的 query 键（见 _apply_query_args），最短路径上的连线高亮；
+    找不到路径时返回422。
+
+    响应头 Server-Timing 给出各阶段耗时，X-Trace-Id 对应追踪日志中的记录。
+    管理员可加 ?profile=1（或请求头 X-Profile: 1）对本次渲染做cProfile分析，
+    此时跳过缓存，结果通过响应头 X-Profile-Url 下载。
+    """
+    trace = _start_trace()
+    profile = _profile_requested()
+    if profile and not _is_admin():
+        return jsonify({"error": "性能分析仅限管理员使用"}), 403
     try:
         # 获取请求数据
+        parse_start = time.perf_counter()
         request_data = request.get_json()
         if not request_data:
             return jsonify({"error": "请求体中未找到JSON数据"}), 400
         
-        # 生成唯一的输出文件名
-        unique_id = str(uuid.uuid4())
-        output_filename = os.path.join(OUTPUT_DIR, f"diagram_{unique_id}")
+        # 解析并校验配置，后续缓存和渲染都使用同一份编译结果
+        try:
+            _apply_query_args(request_data)
+            ir = _compile_request(request_data)
+            formats, width, scale = _requested_variants(ir)
+        except ValueError as e:
+            return _invalid_config_response(e)
+        g.diagram_format = ",".join(formats)
+        _observe_phase('parse', time.perf_counter() - parse_start)
+        trace.update(nodes=ir.node_count, edges=ir.edge_count, clusters=ir.cluster_count)
+        if ir.diagnostics:
+            trace["diagnostics"] = ir.diagnostics
         
-        # 设置输出文件名
-        request_data['output_filename'] = output_filename
+        profile_path = None
+        if profile:
+            profile_path = os.path.join(PROFILES_DIR, f"{trace['trace_id']}.prof")
+            trace["profile"] = trace["trace_id"]
         
-        # 获取请求指定的输出格式，默认为PNG
-        output_format = request_data.get('outformat', 'png')
-        request_data['outformat'] = output_format
+        # ETag由缓存键和变体名决定，客户端已有相同结果时直接返回304，不做任何渲染。
+        # 有布局时间预算时结果取决于预算内完成的档位，缓存淘汰后重新渲染的字节可能不同，只给弱ETag
+        cache_key = config_cache_key(request_data, ir)
+        variant = variant_name(formats[0], width, scale) if len(formats) == 1 else None
+        encoding = negotiate_encoding(request.accept_encodings, formats[0]) if variant else None
+        weak = bool(ir.layout_budget)
+        if variant and not profile_path:
+            if _client_has(cache_key, variant, encoding):
+                trace["cache"] = "NOT_MODIFIED"
+                response = _diagram_headers(Response(status=304), cache_key, variant, encoding, weak=weak)
+                response.vary.add('Accept')
+                return response
+            encoded_path = render_cache.get(cache_key, f"{variant}.{encoding}", record=False) if encoding else None
+            if encoded_path:
+                render_cache.record_hit()
+                trace["cache"] = "HIT"
+                response = _send_diagram(encoded_path, formats[0], "HIT", encoding=encoding)
+                response.vary.add('Accept')
+                _diagnostics_header(response, ir)
+                return _diagram_headers(response, cache_key, variant, encoding, weak=weak)
         
-        # 生成图表
-        generate_diagram(request_data)
+        # 缓存中没有的格式在渲染进程池中一起渲染（性能分析需要真实渲染，跳过缓存）
+        outputs, result = _render_variants(ir, cache_key, formats, width, scale, profile_path)
+        cache_status = "HIT" if result is None else "MISS"
+        trace["cache"] = cache_status
+        trace["bytes"] = sum(len(data) for data in outputs.values() if isinstance(data, bytes))
         
-        # 获取生成的文件路径
-        output_file = f"{output_filename}.{output_format}"
+        if variant:
+            output = outputs[formats[0]]
+            if encoding:
+                output = _encode(cache_key, variant, output, encoding)
+            response = _send_diagram(output if isinstance(output, str) else io.BytesIO(output),
+                                     formats[0], cache_status=cache_status, encoding=encoding)
+            if not profile_path:
+                _diagram_headers(response, cache_key, variant, encoding, weak=weak)
+        else:
+            response = _send_variants_zip(outputs, width, scale, cache_status)
+        response.vary.add('Accept')
+        _diagnostics_header(response, ir)
+        if result is not None:
+            trace["layout"] = result["layout"]
+            response.headers['X-Layout-Path'] = result["layout"]
+            if result["tier"]:
+                trace.update(tier=result["tier"], tier_attempts=result["attempts"])
+                response.headers['X-Layout-Tier'] = result["tier"]
+            if result["query"]:
+                trace["query"] = result["query"]
+                response.headers['X-Query-Nodes'] = str(result["query"]["nodes"])
+                response.headers['X-Query-Edges'] = str(result["query"]["edges"])
+        if profile_path:
+            _prune_profiles()
+            response.headers['X-Profile-Url'] = f"/admin/profiles/{trace['trace_id']}"
+        return response
+        
+    except PoolBusyError as e:
+        return _busy_response(e)
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 422
+    except RenderTimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/preview', methods=['POST'])
+def preview_diagram_api():
+    """草图预览：直线连线、简化节点、不嵌入图标的快速布局，用于编辑配置时实时查看
+
+    输出格式由查询参数 format 指定（svg或png，默认svg）。请求头 X-Preview-Session
+    标识编辑会话，同一会话的新请求会终止仍在进行的旧渲染，被取代的请求返回409。
+    正式效果的图表仍通过 /generate 生成。
+    """
+    trace = _start_trace()
+    parse_start = time.perf_counter()
+    request_data = request.get_json(silent=True)
+    if not request_data:
+        return jsonify({"error": "请求体中未找到JSON数据"}), 400
+    outformat = request.args.get('format', 'svg')
+    if outformat not in ('svg', 'png'):
+        return jsonify({"error": "草图预览只支持 svg 和 png 格式"}), 400
+    try:
+        ir = _compile_request(request_data)
+    except ValueError as e:
+        return _invalid_config_response(e)
+    g.diagram_format = outformat
+    _observe_phase('parse', time.perf_counter() - parse_start)
+    trace.update(nodes=ir.node_count, edges=ir.edge_count, clusters=ir.cluster_count)
+    
+    cache_key = config_cache_key(request_data, ir)
+    variant = f"{DRAFT_VARIANT}.{outformat}"
+    path = render_cache.get(cache_key, variant)
+    if path:
+        trace["cache"] = "HIT"
+        response = _send_diagram(path, outformat, "HIT", as_attachment=False)
+    else:
+        try:
+            ticket = preview_sessions.begin(request.headers.get('X-Preview-Session') or trace["trace_id"])
+        except PoolBusyError as e:
+            return _busy_response(e)
+        timings = {}
+        try:
+            data = render_draft(ir, outformat, timeout=PREVIEW_TIMEOUT, timings=timings,
+                                started=partial(preview_sessions.started, ticket))
+        except RenderTimeoutError as e:
+            return jsonify({"error": str(e)}), 504
+        except Exception as e:
+            if ticket.superseded:
+                trace["cache"] = "SUPERSEDED"
+                return jsonify({"error": "已被同一会话中更新的预览请求取代"}), 409
+            return jsonify({"error": str(e)}), 500
+        finally:
+            current = preview_sessions.finish(ticket)
+        if not current:
+            # 渲染完成前已被其它工作进程中的新请求取代；结果仍可缓存，但不再返回给旧请求
+            render_cache.put_bytes(cache_key, variant, data)
+            trace["cache"] = "SUPERSEDED"
+            return jsonify({"error": "已被同一会话中更新的预览请求取代"}), 409
+        _observe_phase('draft', timings.get('build', 0.0) + timings.get('layout', 0.0))
+        render_cache.put_bytes(cache_key, variant, data)
+        trace["cache"] = "MISS"
+        trace["bytes"] = len(data)
+        response = _send_diagram(io.BytesIO(data), outformat, "MISS", as_attachment=False)
+    response.cache_control.no_store = True
+    response.headers['X-Preview'] = 'draft'
+    return response
+
+@app.route('/diagrams/<name>', methods=['GET'])
+def get_diagram(name):
+    """按内容地址获取渲染结果: /diagrams/<缓存键>.<变体>，如 <key>.svg、<key>.w320.png
+
+    缓存键和变体即 /generate 响应头 Content-Location 中的地址；只写缓存键时按Accept
+    请求头选择格式（默认PNG）。同一地址的结果不会改变，响应允许浏览器和CDN长期缓存。
+    只返回渲染缓存中已有的结果（缩略图可由完整尺寸的结果派生），不会触发渲染。
+    """
+    trace = _start_trace()
+    cache_key, _, variant = name.partition('.')
+    if not re.fullmatch(r'[0-9a-f]{64}', cache_key):
+        return jsonify({"error": "无效的结果地址"}), 404
+    try:
+        outformat, width, scale = parse_variant(variant or negotiate_format(request.accept_mimetypes, 'png'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 404
+    variant = variant_name(outformat, width, scale)
+    g.diagram_format = outformat
+    encoding = negotiate_encoding(request.accept_encodings, outformat)
+    if _client_has(cache_key, variant, encoding):
+        trace["cache"] = "NOT_MODIFIED"
+        response = _diagram_headers(Response(status=304), cache_key, variant, encoding, public=True)
+    else:
+        path = render_cache.get(cache_key, f"{variant}.{encoding}", record=False) if encoding else None
+        if path is not None:
+            render_cache.record_hit()
+        else:
+            path = render_cache.get(cache_key, variant)
+            if path is None and variant != outformat and render_cache.get(cache_key, outformat, record=False):
+                with open(render_cache.path_for(cache_key, outformat), 'rb') as f:
+                    data = f.read()
+                resize_start = time.perf_counter()
+                data = resize(data, outformat, width, scale)
+                _observe_phase('resize', time.perf_counter() - resize_start)
+                path = render_cache.put_bytes(cache_key, variant, data)
+            if path is None:
+                return jsonify({"error": "结果不存在或已被清理，请通过 POST /generate 重新生成"}), 404
+            if encoding:
+                path = _encode(cache_key, variant, path, encoding)
+        trace["cache"] = "HIT"
+        response = _send_diagram(path, outformat, "HIT", encoding=encoding, as_attachment=False)
+        _diagram_headers(response, cache_key, variant, encoding, public=True)
+    if '.' not in name:
+        response.vary.add('Accept')
+    return response
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch_api():
+    """批量生成图表，以ZIP流的形式逐个返回结果"""
+    # 支持JSON数组或NDJSON（每行一个配置）
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(ValueError(f"JSON解析失败: {e}"))
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            return jsonify({"error": "请求体应为配置数组或NDJSON"}), 400
+    
+    if not items:
+        return jsonify({"error": "请求体中未找到配置"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"单次最多提交{BATCH_MAX_ITEMS}个配置"}), 413
+    
+    response = Response(_stream_batch_zip(items), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=network_diagrams.zip'
+    return response
+
+class _ZipStream:
+    """供zipfile写入的不可寻址缓冲区，写入的数据由生成器逐块取走"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _batch_entry_name(index, config, output_format):
+    """批量结果在ZIP中的文件名"""
+    base = os.path.basename(str(config.get('output_filename') or '')) or "diagram"
+    return f"{index:04d}_{base}.{output_format}"
+
+def _stream_batch_zip(items):
+    """并行渲染批量配置，每完成一个就写入ZIP流，最后附上manifest.json"""
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED)
+    manifest = [None] * len(items)
+    pending = {}  # Future -> (序号, 缓存键, 输出格式, ZIP文件名, TopologyIR, 使用的缓存布局, 提交时间)
+    
+    def add_result(index, entry_name, source, cache_status, diagnostics, timings=None, layout=None, tier=None):
+        try:
+            if isinstance(source, bytes):
+                archive.writestr(entry_name, source)
+            else:
+                archive.write(source, entry_name)
+        except OSError as e:
+            add_error(index, str(e))
+            return
+        manifest[index] = {"index": index, "status": "ok", "file": entry_name,
+                           "cache": cache_status, "layout": layout, "tier": tier, "timings": timings or {},
+                           "diagnostics": diagnostics}
+    
+    def add_error(index, message):
+        manifest[index] = {"index": index, "status": "error", "error": message}
+    
+    next_index = 0
+    while next_index < len(items) or pending:
+        # 保持最多与渲染进程数相同的在途任务，避免占满共享队列
+        while next_index < len(items) and len(pending) < render_pool.workers:
+            index, config = next_index, items[next_index]
+            next_index += 1
+            if not isinstance(config, dict):
+                add_error(index, str(config) if isinstance(config, Exception) else "配置必须是JSON对象")
+                continue
+            config = dict(config)
+            try:
+                ir = _compile_request(config)
+                cache_key = config_cache_key(config, ir)
+            except ConfigValidationError as e:
+                add_error(index, "配置校验失败")
+                manifest[index]["errors"] = e.errors
+                continue
+            except Exception as e:
+                add_error(index, str(e))
+                continue
+            output_format = ir.outformat
+            entry_name = _batch_entry_name(index, config, output_format)
+            cached_file = render_cache.get(cache_key, output_format)
+            if cached_file:
+                add_result(index, entry_name, cached_file, "HIT", ir.diagnostics)
+                continue
+            positioned = _cached_layout(cache_key)
+            try:
+                future = render_pool.submit_formats(ir, [output_format], positioned)
+            except PoolBusyError as e:
+                # 进程池被其它请求占满，稍后重试该配置
+                next_index -= 1
+                if not pending:
+                    time.sleep(min(e.retry_after, 1))
+                break
+            pending[future] = (index, cache_key, output_format, entry_name, ir, positioned, time.time())
+        
+        chunk = stream.drain()
+        if chunk:
+            yield chunk
+        if not pending:
+            continue
+        
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            index, cache_key, output_format, entry_name, ir, positioned, submitted_at = pending.pop(future)
+            try:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    _count_render_failure(e)
+                    raise
+                _record_render(ir, result, submitted_at)
+                data = _store_formats(cache_key, positioned, result)[output_format]
+                add_result(index, entry_name, data, "MISS", ir.diagnostics, result["timings"],
+                           result["layout"], result["tier"])
+            except Exception as e:
+                add_error(index, str(e) or type(e).__name__)
+        chunk = stream.drain()
+        if chunk:
+            yield chunk
+    
+    archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    archive.close()
+    yield stream.drain()
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交异步渲染任务，立即返回任务ID"""
+    try:
+        request_data = request.get_json()
+        if not request_data:
+            return jsonify({"error": "请求体中未找到JSON数据"}), 400
         
-        # 检查文件是否存在
-        if not os.path.exists(output_file):
-            return jsonify({"error": "图表生成失败"}), 500
-
-        # 打开生成的图像文件并以二进制流返回
-        return send_file(output_file,
-                        mimetype=f'image/{output_format}',
-                        as_attachment=True,
-                        download_name=f"network_diagram.{output_format}")
+        # 顺便清理已过期的任务结果
+        for expired in job_store.purge_expired():
+            if expired.get("result_path") and os.path.exists(expired["result_path"]):
+                os.remove(expired["result_path"])
         
+        try:
+            ir = _compile_request(request_data)
+        except ValueError as e:
+            return _invalid_config_response(e)
+        output_format = g.diagram_format = ir.outformat
+        
+        job_id = uuid.uuid4().hex
+        output_filename = os.path.join(JOBS_DIR, job_id)
+        job = {
+            "id": job_id,
+            "status": QUEUED,
+            "format": output_format,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "timings": {},
+            "layout": None,
+            "tier": None,
+            "diagnostics": ir.diagnostics,
+            "error": None,
+            "result_path": None,
+        }
+        
+        cache_key = config_cache_key(request_data, ir)
+        cached_file = render_cache.get(cache_key, output_format)
+        if cached_file:
+            # 命中缓存，复制一份作为任务结果，由任务TTL管理其生命周期
+            result_path = f"{output_filename}.{output_format}"
+            shutil.copyfile(cached_file, result_path)
+            now = time.time()
+            job.update(status=DONE, started_at=now, finished_at=now, result_path=result_path)
+            job_store.create(job)
+        else:
+            job_store.create(job)
+            positioned = _cached_layout(cache_key)
+            try:
+                future = render_pool.submit_formats(ir, [output_format], positioned)
+            except PoolBusyError:
+                job_store.delete(job_id)
+                raise
+            _running_jobs[job_id] = future
+            future.add_done_callback(
+                lambda f: _finish_job(job_id, f, cache_key, output_format,
+                                      f"{output_filename}.{output_format}", ir, positioned))
+        
+        response = jsonify({
+            "job_id": job_id,
+            "status": job["status"],
+            "status_url": f"/jobs/{job_id}",
+            "result_url": f"/jobs/{job_id}/result",
+        })
+        response.status_code = 202
+        response.headers['Location'] = f"/jobs/{job_id}"
+        return response
+        
+    except PoolBusyError as e:
+        return _busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _finish_job(job_id, future, cache_key, output_format, output_file, ir, positioned):
+    """渲染任务结束时记录状态、耗时和结果文件；positioned 为提交时使用的缓存布局"""
+    _running_jobs.pop(job_id, None)
+    job = job_store.get(job_id)
+    finished_at = time.time()
+    try:
+        result = future.result()
+    except CancelledError:
+        # 工作进程退出时仍在排队的任务被取消，记录为失败，结果按TTL清理
+        job_store.update(job_id, status=FAILED, error="工作进程退出，任务已取消", finished_at=finished_at)
+        return
+    except Exception as e:
+        _count_render_failure(e)
+        job_store.update(job_id, status=FAILED, error=str(e) or type(e).__name__,
+                         finished_at=finished_at)
+        return
+    _record_render(ir, result, job["created_at"] if job is not None else None)
+    timings = dict(result["timings"])
+    if job is not None:
+        timings["queued"] = max(0.0, result["started_at"] - job["created_at"])
+        timings["total"] = finished_at - job["created_at"]
+    if not result["data"].get(output_format):
+        job_store.update(job_id, status=FAILED, error="图表生成失败", timings=timings,
+                         started_at=result["started_at"], finished_at=finished_at)
+        return
+    try:
+        # 写入渲染缓存（连同新算出的布局）；任务结果需要保留到TTL过期，因此另外落盘保存
+        data = _store_formats(cache_key, positioned, result)[output_format]
+        with open(output_file, 'wb') as f:
+            f.write(data)
+    except OSError as e:
+        job_store.update(job_id, status=FAILED, error=str(e), finished_at=finished_at)
+        return
+    job_store.update(job_id, status=DONE, timings=timings, result_path=output_file,
+                     layout=result["layout"], tier=result["tier"], started_at=result["started_at"],
+                     finished_at=finished_at)
+
+def _job_view(job):
+    """任务状态的对外表示
+
+    由本进程渲染的任务按进程池中的Future区分排队和运行中；其它工作进程提交的
+    任务以共享存储中的记录为准，结束前显示为 queued。
+    """
+    if job["status"] == QUEUED:
+        future = _running_jobs.get(job["id"])
+        if future is not None and future.running():
+            job["status"] = RUNNING
+    view = {k: v for k, v in job.items() if k not in ("id", "result_path")}
+    view["job_id"] = job["id"]
+    view["timings"] = {k: round(v, 4) for k, v in job["timings"].items()}
+    if job["finished_at"] is not None:
+        view["expires_at"] = job["finished_at"] + job_store.ttl
+    return view
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询异步任务状态和各阶段耗时"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(_job_view(job))
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """以流的形式下载异步任务生成的图表"""
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    if job["status"] == FAILED:
+        return jsonify({"error": job["error"], "status": FAILED}), 500
+    if job["status"] != DONE:
+        return jsonify({"error": "任务尚未完成", "status": _job_view(job)["status"]}), 409
+    if not os.path.exists(job["result_path"]):
+        return jsonify({"error": "任务结果已被清理"}), 410
+    return send_file(job["result_path"],
+                     mimetype=_mimetype(job["format"]),
+                     as_attachment=True,
+                     download_name=f"network_diagram.{job['format']}")
+
+def _compile_request(config):
+    """补全API默认输出格式（PNG）和布局时间预算，校验配置并编译为TopologyIR
+
+    配置有误时抛出 ConfigValidationError，列出所有错误及其JSON路径，
+    此时尚未启动任何渲染进程。
+    """
+    if isinstance(config, dict):
+        config['outformat'] = config.get('outformat', 'png')
+    check_config(config)
+    ir = compile_topology(config)
+    if ir.layout_budget is None and LAYOUT_BUDGET > 0:
+        # 服务端默认预算只作为超时兜底，未要求预算的请求仍从 full 档位开始，输出不变
+        ir.layout_budget = LAYOUT_BUDGET
+        ir.tier_limits = {}
+    return ir
+
+def _apply_query_args(config):
+    """把查询参数 path、neighbours/hops、reachable 和 directed 写入配置的 query 键
+
+    写入配置后查询参与校验和缓存键计算，不同查询的结果分别缓存。参数无效时抛出ValueError。
+    """
+    args = request.args
+    if args.get('path'):
+        ends = args['path'].split(',')
+        if len(ends) != 2:
+            raise ValueError("path 参数格式为 起点ID,终点ID")
+        query = {"type": "path", "from": ends[0], "to": ends[1]}
+    elif args.get('neighbours'):
+        try:
+            hops = int(args.get('hops', 1))
+        except ValueError:
+            raise ValueError("hops 必须是整数")
+        query = {"type": "neighbours", "node": args['neighbours'], "hops": hops}
+    elif args.get('reachable'):
+        query = {"type": "reachable", "from": args['reachable']}
+    else:
+        return
+    if args.get('directed') is not None:
+        query["directed"] = args['directed'].lower() in ('1', 'true', 'yes')
+    config['query'] = query
+
+def _requested_variants(ir):
+    """从查询参数和Accept请求头确定输出格式列表和缩略图尺寸，参数无效时抛出ValueError"""
+    if request.args.get('formats'):
+        formats = list(dict.fromkeys(f.strip() for f in request.args['formats'].split(',') if f.strip()))
+    else:
+        formats = [request.args.get('format') or negotiate_format(request.accept_mimetypes, ir.outformat)]
+    unknown = [fmt for fmt in formats if fmt not in MIME_TYPES]
+    if unknown:
+        raise ValueError(f"不支持的输出格式: {', '.join(unknown)}，可选: {', '.join(MIME_TYPES)}")
+    width, scale = parse_size(request.args.get('width'), request.args.get('scale'))
+    if width is not None or scale is not None:
+        fixed = [fmt for fmt in formats if fmt not in RESIZABLE_FORMATS]
+        if fixed:
+            raise ValueError(f"{', '.join(fixed)} 格式不支持 width/scale，可缩放的格式: {', '.join(RESIZABLE_FORMATS)}")
+    return formats, width, scale
+
+def _render_variants(ir, cache_key, formats, width=None, scale=None, profile_path=None):
+    """返回 ({格式: 缓存文件路径或字节}, 渲染结果)，全部来自缓存时渲染结果为None
+
+    依次查找: 请求的变体（含缩略图尺寸）→ 完整尺寸的结果（派生缩略图）→ 已定位的布局
+    （只绘制缺少的格式）→ 一次新布局。新产生的布局、各格式和缩略图都写入缓存。
+    """
+    use_cache = profile_path is None
+    sized = width is not None or scale is not None
+    outputs, full, result = {}, {}, None
+    for fmt in formats:
+        path = render_cache.get(cache_key, variant_name(fmt, width, scale)) if use_cache else None
+        if path:
+            outputs[fmt] = path
+        elif sized and use_cache and render_cache.get(cache_key, fmt, record=False):
+            with open(render_cache.path_for(cache_key, fmt), 'rb') as f:
+                full[fmt] = f.read()
+    missing = [fmt for fmt in formats if fmt not in outputs and fmt not in full]
+    if missing:
+        positioned = _cached_layout(cache_key) if use_cache else None
+        submitted_at = time.time()
+        try:
+            result = render_pool.render_formats(ir, missing, positioned=positioned, profile_path=profile_path)
+        except Exception as e:
+            _count_render_failure(e)
+            raise
+        _record_render(ir, result, submitted_at)
+        full.update(_store_formats(cache_key, positioned, result))
+    
+    for fmt, data in full.items():
+        if sized:
+            resize_start = time.perf_counter()
+            data = resize(data, fmt, width, scale)
+            _observe_phase('resize', time.perf_counter() - resize_start)
+            render_cache.put_bytes(cache_key, variant_name(fmt, width, scale), data)
+        outputs[fmt] = data
+    return outputs, result
+
+def _cached_layout(cache_key):
+    """渲染缓存中已定位的DOT文本，没有时返回None"""
+    layout_path = render_cache.get(cache_key, LAYOUT_VARIANT, record=False)
+    if not layout_path:
+        return None
+    with open(layout_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def _store_formats(cache_key, positioned, result):
+    """把 render_formats 的结果（及新算出的布局）写入渲染缓存，返回 {格式: 字节}
+
+    positioned 为提交任务时使用的缓存布局，为None时本次新算的布局一并缓存。
+    """
+    if positioned is None:
+        render_cache.put_bytes(cache_key, LAYOUT_VARIANT, result["positioned"].encode('utf-8'))
+    for fmt, data in result["data"].items():
+        if not data:
+            raise RuntimeError("图表生成失败")
+        render_cache.put_bytes(cache_key, fmt, data)
+    return result["data"]
+
+def _encode(cache_key, variant, output, encoding):
+    """压缩单个结果（缓存文件路径或字节），压缩后的结果同样写入渲染缓存，返回其路径"""
+    if isinstance(output, str):
+        with open(output, 'rb') as f:
+            output = f.read()
+    compress_start = time.perf_counter()
+    data = compress(output, encoding)
+    _observe_phase('compress', time.perf_counter() - compress_start)
+    return render_cache.put_bytes(cache_key, f"{variant}.{encoding}", data)
+
+def _diagram_etag(cache_key, variant, encoding):
+    """ETag的值：缓存键、变体名和内容编码，与缓存条目名 <key>.<变体>[.<编码>] 相同"""
+    return f"{cache_key}.{variant}.{encoding}" if encoding else f"{cache_key}.{variant}"
+
+def _client_has(cache_key, variant, encoding):
+    """请求的 If-None-Match 是否包含当前结果的ETag"""
+    return request.if_none_match.contains_weak(_diagram_etag(cache_key, variant, encoding))
+
+def _diagram_headers(response, cache_key, variant, encoding, public=False, weak=False):
+    """设置单个结果的ETag、Cache-Control、Vary和内容地址（Content-Location）
+
+    /generate 的响应只允许客户端保存并每次用ETag验证；/diagrams 的内容地址不会
+    改变，允许共享缓存长期保存。weak 为True时发送弱ETag（W/"..."）。
+    """
+    response.set_etag(_diagram_etag(cache_key, variant, encoding), weak=weak)
+    if public:
+        response.cache_control.no_cache = None  # send_file 默认加上的 no-cache
+        response.cache_control.public = True
+        response.cache_control.max_age = DIAGRAMS_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    if parse_variant(variant)[0] in COMPRESSIBLE_FORMATS:
+        response.vary.add('Accept-Encoding')
+    response.headers['Content-Location'] = f"/diagrams/{cache_key}.{variant}"
+    return response
+
+def _diagnostics_header(response, ir):
+    """按子网自动分组的提示条数（X-Subnet-Diagnostics），详情见追踪日志的 diagnostics 字段"""
+    if ir.diagnostics:
+        response.headers['X-Subnet-Diagnostics'] = str(len(ir.diagnostics))
+    return response
+
+def _send_variants_zip(outputs, width, scale, cache_status):
+    """把多种格式打包为ZIP返回"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for fmt, output in outputs.items():
+            name = f"network_diagram.{variant_name(fmt, width, scale)}"
+            if isinstance(output, str):
+                archive.write(output, name)
+            else:
+                archive.writestr(name, output)
+    buffer.seek(0)
+    response = send_file(buffer, mimetype='application/zip', as_attachment=True,
+                         download_name="network_diagrams.zip")
+    response.headers['X-Render-Cache'] = cache_status
+    return response
+
+def _record_render(ir, result, submitted_at):
+    """记录一次渲染的各阶段耗时、配置规模和输出大小"""
+    if submitted_at is not None:
+        _observe_phase('queue', max(0.0, result["started_at"] - submitted_at))
+    for phase in ('build', 'layout', 'render'):
+        if phase in result["timings"]:
+            _observe_phase(phase, result["timings"][phase])
+    CONFIG_NODES.observe(ir.node_count)
+    CONFIG_EDGES.observe(ir.edge_count)
+    CONFIG_CLUSTERS.observe(ir.cluster_count)
+    for attempt in result.get("attempts", ()):
+        LAYOUT_TIER_SECONDS.observe(attempt["seconds"], tier=attempt["tier"], outcome=attempt["outcome"])
+    outputs = result["data"] if isinstance(result["data"], dict) else {ir.outformat: result["data"]}
+    for fmt, data in outputs.items():
+        if data:
+            OUTPUT_BYTES.observe(len(data), format=fmt)
+
+def warm_up():
+    """启动渲染工作进程并在每个进程中完成一次预热渲染，之后 /ready 返回200
+
+    返回各步骤耗时（秒）: pool（启动进程并导入diagrams/graphviz）、render（预热渲染）。
+    """
+    start = time.perf_counter()
+    render_pool.warm_up()
+    pool_done = time.perf_counter()
+    futures = [render_pool.submit_render(WARMUP_CONFIG) for _ in range(render_pool.workers)]
+    for future in futures:
+        future.result()
+    end = time.perf_counter()
+    _warmup.update(pool=round(pool_done - start, 3), render=round(end - pool_done, 3),
+                   seconds=round(end - start, 3))
+    _ready.set()
+    return dict(_warmup)
+
+def stop_accepting():
+    """进入优雅退出：/ready 返回503，负载均衡器不再转发新请求"""
+    _ready.clear()
+
+def _count_render_failure(e):
+    """统计渲染子进程失败；队列已满不算失败"""
+    if isinstance(e, (PoolBusyError, QueryError)):
+        return
+    RENDER_FAILURES.inc(reason='timeout' if isinstance(e, RenderTimeoutError) else 'error')
+
+def _invalid_config_response(e):
+    """配置无效时返回400，附带全部校验错误"""
+    body = {"error": "配置校验失败" if isinstance(e, ConfigValidationError) else str(e)}
+    if isinstance(e, ConfigValidationError):
+        body["errors"] = e.errors
+    return jsonify(body), 400
+
+def _busy_response(e):
+    """队列已满时快速拒绝，提示客户端稍后重试"""
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+# 输出格式对应的MIME类型
+def _mimetype(output_format):
+    return MIME_TYPES.get(output_format, f'image/{output_format}')
+
+def _send_diagram(source, output_format, cache_status, encoding=None, as_attachment=True):
+    """以二进制流返回生成的图像，source为缓存文件路径或内存中的文件对象
+
+    encoding 为source已压缩时的内容编码。打开结果文件并构造响应的耗时记为 send
+    阶段（文件体由WSGI服务器直接发送，以保留 sendfile 优化）。
+    """
+    send_start = time.perf_counter()
+    response = send_file(source,
+                         mimetype=_mimetype(output_format),
+                         as_attachment=as_attachment,
+                         download_name=f"network_diagram.{output_format}",
+                         etag=False)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['X-Render-Cache'] = cache_status
+    _observe_phase('send', time.perf_counter() - send_start)
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查端点"""
-    return jsonify({"status": "healthy", "service": "network diagram generator"})
+    return jsonify({"status": "healthy", "service": "network diagram generator",
+                    "cache": render_cache.stats(), "pool": render_pool.stats(),
+                    "preview": preview_sessions.stats()})
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """就绪探针：预热完成且未在退出时返回200，否则返回503"""
+    if not _ready.is_set():
+        return jsonify({"status": "starting" if not _warmup else "draining"}), 503
+    return jsonify({"status": "ready", "warmup": _warmup})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的运行指标"""
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/admin/profiles/<trace_id>', methods=['GET'])
+def get_profile(trace_id):
+    """下载某次渲染的cProfile结果（仅限管理员）
+
+    默认返回可用 pstats/snakeviz 打开的 .prof 文件，?format=text 返回按累计耗时排序的文本摘要。
+    """
+    if not _is_admin():
+        return jsonify({"error": "仅限管理员访问"}), 403
+    if not re.fullmatch(r'[0-9a-f]{32}', trace_id):
+        return jsonify({"error": "无效的追踪ID"}), 400
+    path = os.path.join(PROFILES_DIR, f"{trace_id}.prof")
+    if not os.path.exists(path):
+        return jsonify({"error": "性能分析结果不存在或已被清理"}), 404
+    if request.args.get('format') == 'text':
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats('cumulative').print_stats(50)
+        return Response(out.getvalue(), mimetype='text/plain')
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f"render_{trace_id}.prof")
 
 @app.route('/', methods=['GET'])
 def index():
@@ -127,8 +1067,14 @@ curl -X POST http://localhost:5000/generate \\
 }
             </pre>
             
+            <div class="endpoint">
+                <h2>异步任务:</h2>
+                <code>POST /jobs</code>、<code>GET /jobs/&lt;job_id&gt;</code>、<code>GET /jobs/&lt;job_id&gt;/result</code>
+                <p>提交大型拓扑的渲染任务，轮询状态后下载结果</p>
+            </div>
+            
             <h2>状态检查:</h2>
-            <code>GET /health</code>
+            <code>GET /health</code>、<code>GET /metrics</code>（Prometheus格式的运行指标）
             
             <h2>Web界面:</h2>
             <p>我们也提供了一个Web界面，您可以通过打开 <code>web_interface.html</code> 文件在浏览器中使用它。</p>
@@ -140,4 +1086,8 @@ if __name__ == '__main__':
     # 默认端口5000
     port = int(os.environ.get('PORT', 5050))
     # 在开发环境中使用debug=True，生产环境中应设置为False
-    app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
+    debug = True
+    # 预热渲染进程（调试模式下只在实际提供服务的重载子进程中预热）
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        warm_up()
+    app.run(host='0.0.0.0', port=port, debug=debug) 
\ No newline at end of file
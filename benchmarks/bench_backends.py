@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Compare graph build time of the diagrams and dot backends at several graph sizes"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import io
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_from_json import _build_with_diagrams, run_graphviz
+from dot_emitter import emit_dot
+from topology_ir import compile_topology
+
+ICONS = ["server", "switch", "router", "firewall", "client"]
+
+
+def make_config(n_nodes, per_cluster=50):
+    """Build a config with n_nodes spread over flat clusters and a chain of connections"""
+    clusters = []
+    for start in range(0, n_nodes, per_cluster):
+        clusters.append({
+            "name": f"Zone {start // per_cluster}",
+            "subnet": f"10.{start // per_cluster % 256}.0.0/16",
+            "nodes": [{"id": f"n{i}", "label": f"Host {i}", "icon": ICONS[i % len(ICONS)],
+                       "ip": f"10.0.{i // 256 % 256}.{i % 256}"}
+                      for i in range(start, min(start + per_cluster, n_nodes))],
+        })
+    connections = [{"from": f"n{i}", "to": f"n{i + 1}"} for i in range(n_nodes - 1)]
+    return {"title": f"bench {n_nodes}", "clusters": clusters, "connections": connections}
+
+
+def build_diagrams(config, icons_dir):
+    return _build_with_diagrams(compile_topology(config, icons_dir))
+
+
+def build_dot(config, icons_dir):
+    return emit_dot(config, icons_dir)
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma separated node counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--layout", action="store_true", help="also time the graphviz svg render")
+    args = parser.parse_args()
+
+    icons_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "my_icons")
+    print(f"{'nodes':>8} {'diagrams (s)':>14} {'dot (s)':>10} {'speedup':>9}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        config = make_config(size)
+        with contextlib.redirect_stdout(io.StringIO()):
+            t_diagrams, _ = best_of(lambda: build_diagrams(config, icons_dir), args.repeat)
+            t_dot, source = best_of(lambda: build_dot(config, icons_dir), args.repeat)
+        line = f"{size:>8} {t_diagrams:>14.4f} {t_dot:>10.4f} {t_diagrams / t_dot:>8.1f}x"
+        if args.layout:
+            t_layout, _ = best_of(lambda: run_graphviz(source, "svg"), 1)
+            line += f"   layout {t_layout:.2f}s"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
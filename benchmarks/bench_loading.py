@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Compare peak memory and time of loading a large config whole versus streaming it"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_backends import make_config
+from config_stream import load_topology
+from topology_ir import compile_topology
+
+
+def load_whole(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f) if path.endswith(".json") else yaml.safe_load(f)
+    return compile_topology(config, log=None)
+
+
+def load_streaming(path):
+    return load_topology(path, log=None)
+
+
+def measure(fn, path):
+    """Return (seconds, peak MB, retained MB) of fn(path)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(path)
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return seconds, peak / 2 ** 20, current / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000", help="comma separated node counts")
+    parser.add_argument("--format", choices=["json", "yaml"], default="json")
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'file MB':>8} {'loader':>10} {'time (s)':>9} {'peak MB':>9} {'IR MB':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            path = os.path.join(tmp, f"config_{size}.{args.format}")
+            with open(path, "w", encoding="utf-8") as f:
+                if args.format == "json":
+                    json.dump(make_config(size), f)
+                else:
+                    yaml.safe_dump(make_config(size), f, allow_unicode=True)
+            file_mb = os.path.getsize(path) / 2 ** 20
+            for name, fn in (("whole", load_whole), ("streaming", load_streaming)):
+                seconds, peak, retained = measure(fn, path)
+                print(f"{size:>8} {file_mb:>8.1f} {name:>10} {seconds:>9.2f} {peak:>9.1f} {retained:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
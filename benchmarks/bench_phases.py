@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+"""Time and memory-profile each rendering phase on synthetic topologies.
+
+Phases of the CLI path: load (file -> IR), build (diagrams backend graph),
+emit (dot backend DOT text), layout (graphviz positions), rasterize
+(drawing the laid-out graph in each outformat) and draft (the quick SVG
+preview served by POST /preview, layout included). The API path is measured
+end to end through POST /generate, plus its validate and compile steps.
+
+Results are written as JSON; --compare flags phases that got slower or use
+more memory than a stored baseline (exit status 1 on regression).
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import contextlib
+import io
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from synthetic import generate_config
+from config_stream import load_topology
+from config_validator import validate_config
+from dot_emitter import emit_dot
+from generate_from_json import DOT_BINARY, PINNED_LAYOUT_ARGS, _build_with_diagrams, run_graphviz
+from layout_cache import parse_layout
+from topology_ir import compile_topology
+
+
+def measure(fn, repeat):
+    """Best wall time over repeat runs, then one traced run for the Python peak"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"seconds": round(best, 6), "peak_mb": round(peak / 2 ** 20, 3)}
+
+
+def child_max_rss_mb():
+    # ru_maxrss is in KB on Linux; it is the largest child so far, not per call
+    return round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+
+
+def bench_cli(config, formats, repeat, tmp, record):
+    path = os.path.join(tmp, "config.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    ir, stats = measure(lambda: load_topology(path, log=None), repeat)
+    record("load", None, stats)
+    _, stats = measure(lambda: _build_with_diagrams(ir), repeat)
+    record("build", None, stats)
+    source, stats = measure(lambda: emit_dot(ir), repeat)
+    record("emit", None, stats)
+
+    if not shutil.which(DOT_BINARY):
+        record("layout", None, {"skipped": f"graphviz not found: {DOT_BINARY}"})
+        return
+    layout_json, stats = measure(lambda: run_graphviz(source, "json0"), repeat)
+    record("layout", None, dict(stats, child_max_rss_mb=child_max_rss_mb()))
+    positioned = emit_dot(ir, positions=parse_layout(layout_json, ir))
+    for fmt in formats:
+        _, stats = measure(lambda: run_graphviz(positioned, fmt, args=PINNED_LAYOUT_ARGS), repeat)
+        record("rasterize", fmt, dict(stats, child_max_rss_mb=child_max_rss_mb()))
+    draft = emit_dot(ir, draft=True)
+    _, stats = measure(lambda: run_graphviz(draft, "svg"), repeat)
+    record("draft", "svg", dict(stats, child_max_rss_mb=child_max_rss_mb()))
+
+
+def bench_api(config, formats, repeat, record):
+    import api_service
+
+    client = api_service.app.test_client()
+    _, stats = measure(lambda: validate_config(config), repeat)
+    record("validate", None, stats)
+    _, stats = measure(lambda: compile_topology(config, log=None), repeat)
+    record("compile", None, stats)
+    if not shutil.which(DOT_BINARY):
+        record("request", None, {"skipped": f"graphviz not found: {DOT_BINARY}"})
+        return
+
+    counter = [0]
+
+    def post(fmt):
+        # A fresh title per request keeps the render cache from answering
+        counter[0] += 1
+        body = dict(config, outformat=fmt, title=f"{config['title']} #{counter[0]} {time.time()}")
+        response = client.post("/generate", json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"/generate returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    for fmt in formats:
+        _, stats = measure(lambda: post(fmt), repeat)
+        record("request", fmt, stats)
+    api_service.render_pool.shutdown()
+
+
+def run(args):
+    formats = args.formats.split(",")
+    entries = args.entries.split(",")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("OUTPUT_DIR", os.path.join(tmp, "api"))
+        os.environ.setdefault("RENDER_WORKERS", "1")
+        for nodes in [int(n) for n in args.nodes.split(",")]:
+            scenario = {"nodes": nodes, "depth": args.depth, "fanout": args.fanout,
+                        "edge_density": args.edge_density, "label_length": args.label_length,
+                        "seed": args.seed}
+            name = "n{nodes}-d{depth}-f{fanout}-e{edge_density}-l{label_length}-s{seed}".format(**scenario)
+            config = generate_config(outformat=formats[0], **scenario)
+
+            for entry in entries:
+                def record(phase, outformat, stats):
+                    results.append(dict(scenario=name, entry=entry, phase=phase, outformat=outformat, **stats))
+                    shown = "skipped" if "skipped" in stats else f"{stats['seconds']:.4f}s {stats['peak_mb']:.1f}MB"
+                    print(f"{name:<40} {entry:<4} {phase:<10} {outformat or '-':<5} {shown}", file=sys.stderr)
+
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if entry == "cli":
+                        bench_cli(config, formats, args.repeat, tmp, record)
+                    elif entry == "api":
+                        bench_api(config, formats, args.repeat, record)
+                    else:
+                        raise SystemExit(f"unknown entry point: {entry}")
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def _key(result):
+    return (result["scenario"], result["entry"], result["phase"], result["outformat"])
+
+
+def compare(current, baseline, threshold, min_seconds, min_mb):
+    """Return the list of regressions of current against baseline"""
+    base = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = base.get(_key(result))
+        if old is None:
+            continue
+        for metric, floor in (("seconds", min_seconds), ("peak_mb", min_mb)):
+            if metric not in result or metric not in old:
+                continue
+            before, after = old[metric], result[metric]
+            if after > before * (1 + threshold) and after - before > floor:
+                regressions.append(dict(zip(("scenario", "entry", "phase", "outformat"), _key(result)),
+                                        metric=metric, baseline=before, current=after,
+                                        change=round(after / before - 1, 3) if before else None))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", default="100,1000", help="comma separated node counts")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--edge-density", type=float, default=1.5)
+    parser.add_argument("--label-length", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", default="svg,png,pdf", help="comma separated outformats")
+    parser.add_argument("--entries", default="cli,api", help="entry points to measure: cli, api")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown/memory growth counted as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.005,
+                        help="ignore time differences smaller than this")
+    parser.add_argument("--min-mb", type=float, default=1.0, help="ignore memory differences smaller than this")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        results["regressions"] = compare(results, baseline, args.threshold, args.min_seconds, args.min_mb)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for r in results.get("regressions", []):
+        print(f"REGRESSION {r['scenario']} {r['entry']} {r['phase']} {r['outformat'] or '-'} "
+              f"{r['metric']}: {r['baseline']} -> {r['current']}", file=sys.stderr)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""Seeded generator of synthetic topology configs for benchmarks"""
+import sys
+import json
+import random
+import argparse
+
+ICONS = ["server", "switch", "router", "firewall", "client", "users", "portal", "waf"]
+_WORDS = ["core", "edge", "db", "web", "cache", "auth", "mail", "dns", "proxy", "app",
+          "log", "backup", "vpn", "lb", "api", "queue"]
+
+
+def _label(rng, index, length):
+    """A readable label of roughly length characters"""
+    parts = [f"host{index}"]
+    while sum(len(p) + 1 for p in parts) < length:
+        parts.append(rng.choice(_WORDS))
+    return "-".join(parts)[:max(length, len(parts[0]))]
+
+
+def generate_config(nodes=1000, depth=2, fanout=4, edge_density=1.5, label_length=16,
+                    seed=0, outformat="svg", title=None):
+    """Build a config with a reproducible shape.
+
+    - nodes: total node count
+    - depth: cluster nesting depth (0 puts every node at the top level)
+    - fanout: child clusters per cluster, and top-level clusters
+    - edge_density: connections per node, endpoints chosen at random
+    - label_length: approximate length of each node label
+    The same arguments and seed always produce the same config.
+    """
+    rng = random.Random(seed)
+    config = {
+        "title": title or f"synthetic n={nodes} d={depth} f={fanout} e={edge_density}",
+        "outformat": outformat,
+        "nodes": [],
+        "clusters": [],
+        "connections": [],
+    }
+
+    # Cluster tree: fanout top-level clusters, each with fanout children, depth levels deep
+    containers = [config["nodes"]] if depth == 0 else []
+    level = [(config["clusters"], "")]
+    for d in range(depth):
+        next_level = []
+        for siblings, prefix in level:
+            for i in range(fanout):
+                name = f"{prefix}{i}" if prefix else f"zone{i}"
+                cluster = {"name": name, "subnet": f"10.{d}.{i}.0/24", "nodes": [], "clusters": []}
+                siblings.append(cluster)
+                containers.append(cluster["nodes"])
+                next_level.append((cluster["clusters"], f"{name}."))
+        level = next_level
+
+    node_ids = []
+    for i in range(nodes):
+        node_id = f"n{i}"
+        node_ids.append(node_id)
+        rng.choice(containers).append({
+            "id": node_id,
+            "label": _label(rng, i, label_length),
+            "icon": rng.choice(ICONS),
+            "ip": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}",
+        })
+
+    for _ in range(int(nodes * edge_density) if nodes > 1 else 0):
+        source, target = rng.sample(node_ids, 2)
+        connection = {"from": source, "to": target}
+        if rng.random() < 0.2:
+            connection["style"] = "dashed"
+        if rng.random() < 0.1:
+            connection["bidirectional"] = True
+        config["connections"].append(connection)
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--edge-density", type=float, default=1.5)
+    parser.add_argument("--label-length", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", default="svg", help="outformat written into the config")
+    args = parser.parse_args()
+    config = generate_config(args.nodes, args.depth, args.fanout, args.edge_density,
+                             args.label_length, args.seed, args.format)
+    json.dump(config, sys.stdout, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+import os
+import glob
+import json
+import time
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 构建模式识别的配置文件后缀
+CONFIG_EXTENSIONS = (".json", ".yaml", ".yml")
+MANIFEST_VERSION = 2
+
+
+def find_configs(inputs):
+    """把目录（递归）、通配符和文件路径展开为 {配置文件绝对路径: 所属根目录}，按参数顺序再按路径排序
+
+    目录中只收集 CONFIG_EXTENSIONS 后缀的文件，跳过以 . 开头的文件和目录（包括清单文件）。
+    根目录只由参数本身决定：目录参数为该目录，文件为其所在目录，通配符为第一个通配
+    部分之前的目录。因此增加或删除其它参数不会改变已有配置的输出位置。同一文件被多个
+    参数匹配时以第一个参数为准。
+    """
+    found = {}  # 路径 -> (参数序号, 根目录)
+    for position, item in enumerate(inputs):
+        if os.path.isdir(item):
+            root = os.path.abspath(item)
+            for walk_root, dirs, files in os.walk(item):
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                for name in files:
+                    if name.endswith(CONFIG_EXTENSIONS) and not name.startswith("."):
+                        found.setdefault(os.path.abspath(os.path.join(walk_root, name)), (position, root))
+        elif os.path.isfile(item):
+            found.setdefault(os.path.abspath(item), (position, os.path.dirname(os.path.abspath(item))))
+        else:
+            root = os.path.abspath(_glob_root(item))
+            for path in glob.glob(item, recursive=True):
+                if os.path.isfile(path):
+                    found.setdefault(os.path.abspath(path), (position, root))
+    ordered = sorted(found.items(), key=lambda item: (item[1][0], item[0]))
+    return {path: root for path, (_, root) in ordered}
+
+
+def _glob_root(pattern):
+    """通配符中第一个含通配符的部分之前的目录，如 more/**/*.yaml -> more"""
+    parts = []
+    for part in pattern.replace(os.sep, "/").split("/"):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return "/".join(parts) or "."
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _build_one(config_path, output_base, overrides, level_of_detail, timeout):
+    """在工作进程中生成一个配置，返回引用图标的内容哈希、规模、布局档位和各阶段耗时
+
+    不存在的图标按默认图标渲染，其请求的路径以 "missing" 记录，补上图标文件后重新生成。
+    """
+    from config_stream import load_topology
+    from generate_from_json import generate_diagram
+    from render_cache import icon_digest
+    from topology_ir import ICONS_DIR
+
+    start = time.perf_counter()
+    timings = {}
+    render_info = {}
+    ir = load_topology(config_path, log=None, overrides=dict(overrides))
+    if level_of_detail:
+        ir.level_of_detail = dict(ir.level_of_detail or {}, **level_of_detail)
+    output = f"{output_base}.{ir.outformat}"
+    data = generate_diagram(ir, timeout=timeout, strict=True, timings=timings, in_memory=True,
+                            render_info=render_info)
+    if not data:
+        raise RuntimeError("图表生成失败")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output) or ".", suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, output)
+    icons = {path: icon_digest(path) for path in ir.icon_paths}
+    for name in ir.icon_names:
+        requested = os.path.join(ICONS_DIR, f"{name}.svg")
+        icons.setdefault(requested, icon_digest(requested))
+    return {
+        "output": output,
+        "icons": icons,
+        "nodes": ir.node_count,
+        "edges": ir.edge_count,
+        "warnings": len(ir.warnings),
+        "tier": render_info.get("tier"),
+        "timings": {k: round(v, 4) for k, v in timings.items()},
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+class DiagramBuild:
+    """类似make的批量构建：并行生成多个配置，跳过输入和图标都没有变化的配置
+
+    清单（manifest）记录每个配置的文件状态和内容哈希、输出文件，以及它引用的
+    每个图标的内容哈希。判断是否最新时先比较 (mtime, size)，只有变化时才重新
+    计算哈希；图标按目录中文件的状态只哈希一次。因此没有任何改动时，整个构建
+    只需对每个配置和输出做几次stat，不会导入渲染依赖。
+    """
+
+    def __init__(self, inputs, out_dir, manifest_path=None, overrides=None, level_of_detail=None,
+                 workers=None, timeout=None, force=False):
+        self.inputs = inputs
+        self.out_dir = os.path.abspath(out_dir)
+        self.manifest_path = manifest_path or os.path.join(self.out_dir, ".manifest.json")
+        self.overrides = overrides or {}
+        self.level_of_detail = level_of_detail or {}
+        self.workers = workers
+        self.timeout = timeout
+        self.force = force
+        self._previous_icons = {}  # 上次构建记录的图标状态: 路径 -> {"stat", "digest"}
+        self._icons = {}  # 本次构建已确认的图标状态
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}, {}
+        if manifest.get("version") != MANIFEST_VERSION or manifest.get("options") != self._options():
+            return {}, {}  # 清单格式或命令行选项变化后全部重新生成
+        return manifest.get("configs", {}), manifest.get("icons", {})
+
+    def _save_manifest(self, configs):
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        icons = {path: self._icon_state(path) for entry in configs.values() for path in entry["icons"]}
+        manifest = {"version": MANIFEST_VERSION, "options": self._options(), "configs": configs, "icons": icons}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.manifest_path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _options(self):
+        return {"overrides": self.overrides, "level_of_detail": self.level_of_detail}
+
+    def _icon_state(self, path):
+        """图标的当前状态和内容哈希；文件状态与上次构建相同时沿用记录的哈希，不读取内容"""
+        state = self._icons.get(path)
+        if state is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                state = {"stat": None, "digest": "missing"}
+            else:
+                stat = [st.st_mtime_ns, st.st_size]
+                state = self._previous_icons.get(path)
+                if not state or state["stat"] != stat:
+                    state = {"stat": stat, "digest": _file_digest(path)}
+            self._icons[path] = state
+        return state
+
+    def output_base(self, config_path, root):
+        """输出文件路径（不含扩展名）：在 out_dir 下镜像配置文件相对于其参数根目录的位置"""
+        rel = os.path.relpath(config_path, root)
+        return os.path.join(self.out_dir, os.path.splitext(rel)[0])
+
+    def _is_current(self, config_path, entry, output_base):
+        """返回 (是否最新, 新的文件状态记录)；输出位置与清单记录的不同时也需要重新生成"""
+        st = os.stat(config_path)
+        stat = [st.st_mtime_ns, st.st_size]
+        if not entry or os.path.splitext(entry["output"])[0] != output_base or not os.path.exists(entry["output"]):
+            return False, stat
+        if entry["stat"] != stat and _file_digest(config_path) != entry["sha256"]:
+            return False, stat
+        if any(self._icon_state(path)["digest"] != digest for path, digest in entry["icons"].items()):
+            return False, stat
+        return True, stat
+
+    def run(self, log=print):
+        start = time.perf_counter()
+        configs = find_configs(self.inputs)
+        if not configs:
+            log("❌ 没有找到配置文件")
+            return {"built": [], "skipped": [], "failed": [], "seconds": 0.0}
+        previous, self._previous_icons = ({}, {}) if self.force else self._load_manifest()
+
+        manifest = {}
+        todo = []
+        skipped = []
+        built, failed = [], []
+        outputs = {}  # 输出路径 -> 配置文件，不同参数下相对路径相同的配置会写到同一位置
+        for config_path, root in configs.items():
+            output_base = self.output_base(config_path, root)
+            other = outputs.setdefault(output_base, config_path)
+            if other != config_path:
+                failed.append({"config": config_path,
+                               "error": f"输出位置与 {os.path.relpath(other)} 相同，请分开构建或调整参数"})
+                log(f"❌ {os.path.relpath(config_path)}: {failed[-1]['error']}")
+                continue
+            entry = previous.get(config_path)
+            current, stat = self._is_current(config_path, entry, output_base)
+            if current:
+                manifest[config_path] = dict(entry, stat=stat)
+                skipped.append(config_path)
+            else:
+                todo.append((config_path, output_base))
+
+        if todo:
+            log(f"共{len(configs)}个配置，{len(skipped)}个已是最新，正在生成{len(todo)}个...")
+            with ProcessPoolExecutor(max_workers=self.workers or os.cpu_count() or 1) as executor:
+                futures = {
+                    executor.submit(_build_one, path, output_base, self.overrides,
+                                    self.level_of_detail, self.timeout): path
+                    for path, output_base in todo
+                }
+                for future in as_completed(futures):
+                    path = futures[future]
+                    name = os.path.relpath(path)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed.append({"config": path, "error": str(e) or type(e).__name__})
+                        log(f"❌ {name}: {e}")
+                        continue
+                    st = os.stat(path)
+                    manifest[path] = {"stat": [st.st_mtime_ns, st.st_size], "sha256": _file_digest(path),
+                                      "output": result["output"], "icons": result["icons"]}
+                    built.append(dict(result, config=path))
+                    log(f"✅ {name} -> {os.path.relpath(result['output'])}（{result['seconds']:.2f}秒）")
+
+        # 没有任何变化时不重写清单
+        if todo or previous.keys() != manifest.keys() or any(
+                previous[path]["stat"] != entry["stat"] for path, entry in manifest.items()):
+            self._save_manifest(manifest)
+        return {"built": built, "skipped": skipped, "failed": failed,
+                "seconds": round(time.perf_counter() - start, 3)}
+
+
+def print_summary(summary, slowest=5, log=print):
+    """打印构建汇总：数量、总耗时、最慢的几个配置和失败列表"""
+    built, failed = summary["built"], summary["failed"]
+    log("-" * 50)
+    log(f"生成 {len(built)} 个，跳过（已是最新） {len(summary['skipped'])} 个，失败 {len(failed)} 个，"
+        f"用时 {summary['seconds']:.2f} 秒")
+    if built:
+        tiers = {}
+        for result in built:
+            tiers.setdefault(result["tier"] or "full", []).append(result["seconds"])
+        if set(tiers) != {"full"}:
+            log("布局档位: " + ", ".join(f"{tier} {len(times)}个（平均{sum(times) / len(times):.2f}秒）"
+                                     for tier, times in tiers.items()))
+        render_total = sum(r["seconds"] for r in built)
+        log(f"渲染耗时合计 {render_total:.2f} 秒，最慢的配置:")
+        for result in sorted(built, key=lambda r: r["seconds"], reverse=True)[:slowest]:
+            phases = ", ".join(f"{k} {v:.2f}s" for k, v in result["timings"].items())
+            log(f"  {result['seconds']:8.2f}s  {os.path.relpath(result['config'])}"
+                f"（{result['nodes']}个节点, {result['edges']}条连线; {phases}）")
+    if failed:
+        log("失败的配置:")
+        for failure in failed:
+            log(f"  {os.path.relpath(failure['config'])}: {failure['error']}")
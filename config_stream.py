@@ -0,0 +1,167 @@
+import json
+
+import yaml
+
+from topology_ir import ELEMENT_KEYS, TopologyBuilder
+
+READ_SIZE = 1 << 16
+
+
+def detect_format(path):
+    """Return "json" or "yaml" from the first non-blank bytes of the file"""
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n")
+    return "json" if text[:1] in (b"{", b"[") else "yaml"
+
+
+class _JsonStream:
+    """Incremental reader for a top-level JSON object.
+
+    Only the current value is decoded at a time; the read buffer is trimmed as
+    values are consumed, so memory stays proportional to the largest single
+    element rather than to the file.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size=READ_SIZE):
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > READ_SIZE:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character ("" at end of file)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Invalid JSON: expected one of {chars!r}, found {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow geometrically so a large element is not re-decoded once per chunk
+            self._fill(max(READ_SIZE, len(self.buf) - self.pos))
+
+    def items(self):
+        """Yield (key, value) for each top-level key, and (key, element)
+        for each element of the ELEMENT_KEYS arrays"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            if key in ELEMENT_KEYS and self.peek() == "[":
+                self.pos += 1
+                if self.peek() == "]":
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.value()
+                        if self.expect(",]") == "]":
+                            break
+            else:
+                yield key, self.value()
+            if self.expect(",}") == "}":
+                return
+
+
+def _iter_json(f):
+    yield from _JsonStream(f).items()
+
+
+def _iter_yaml(f):
+    loader = yaml.SafeLoader(f)
+    try:
+        loader.get_event()  # StreamStart
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        loader.get_event()  # DocumentStart
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise ValueError("YAML configuration must be a mapping")
+        loader.get_event()
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_object(loader.compose_node(None, None), deep=True)
+            if key in ELEMENT_KEYS and loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    node = loader.compose_node(None, None)
+                    yield key, loader.construct_object(node, deep=True)
+                    # Drop constructed objects so finished elements can be freed
+                    loader.constructed_objects = {}
+                loader.get_event()
+            else:
+                yield key, loader.construct_object(loader.compose_node(None, None), deep=True)
+            loader.constructed_objects = {}
+    finally:
+        loader.dispose()
+
+
+def iter_config(path, fmt=None):
+    """Yield the top-level entries of a JSON or YAML config file incrementally.
+
+    Scalar options and attribute maps are yielded as (key, value); nodes,
+    clusters and connections are yielded one element at a time as
+    (key, element). fmt defaults to detect_format(path).
+    """
+    fmt = fmt or detect_format(path)
+    with open(path, "r", encoding="utf-8-sig") as f:
+        if fmt == "json":
+            yield from _iter_json(f)
+        else:
+            yield from _iter_yaml(f)
+
+
+def load_topology(path, icons_dir=None, log=print, overrides=None):
+    """Stream a config file straight into a TopologyIR.
+
+    The file is never held in memory as a whole: each node, top-level
+    cluster and connection is compiled as soon as it has been parsed.
+    overrides replaces top-level options (e.g. command line settings).
+    """
+    builder = TopologyBuilder(icons_dir, log)
+    handlers = {"nodes": builder.add_node, "clusters": builder.add_cluster,
+                "connections": builder.add_connection}
+    options = {}
+    for key, value in iter_config(path):
+        handler = handlers.get(key)
+        if handler is not None and isinstance(value, dict):
+            handler(value)
+        elif handler is None:
+            options[key] = value
+    options.update(overrides or {})
+    builder.set_options(options)
+    return builder.finish()
@@ -0,0 +1,236 @@
+import os
+
+from level_of_detail import LOD_OPTIONS
+from topology_index import QUERY_OPTIONS, QUERY_TYPES
+from topology_ir import BACKENDS, DIRECTIONS, ICONS_DIR, OUTFORMATS
+
+# Expected type of every known key, per object kind. Unknown keys are ignored
+# so configs can carry extra metadata.
+_STRING = (str,)
+_NODE_ID = (str, int)
+_OBJECT = (dict,)
+_ARRAY = (list,)
+_BOOL = (bool,)
+_NUMBER = (int, float)
+
+ROOT_FIELDS = {
+    "title": _STRING, "direction": _STRING, "outformat": _STRING, "output_filename": _STRING,
+    "backend": _STRING, "reuse_layout": _BOOL, "level_of_detail": _OBJECT, "layout_budget": _NUMBER,
+    "query": _OBJECT, "subnets": _ARRAY, "graph_attr": _OBJECT, "node_attr": _OBJECT,
+    "nodes": _ARRAY, "clusters": _ARRAY, "connections": _ARRAY,
+}
+NODE_FIELDS = {"id": _NODE_ID, "icon": _STRING, "label": (str, int, float), "ip": _STRING, "image": _STRING}
+CLUSTER_FIELDS = {"name": _STRING, "subnet": _STRING, "nodes": _ARRAY, "clusters": _ARRAY}
+SUBNET_FIELDS = {"subnet": _STRING, "name": _STRING}
+CONNECTION_FIELDS = {"from": _NODE_ID, "to": _NODE_ID, "color": _STRING, "style": _STRING,
+                     "bidirectional": _BOOL}
+
+# Allowed values for enumerated keys
+ROOT_CHOICES = {"direction": DIRECTIONS, "outformat": OUTFORMATS, "backend": BACKENDS}
+
+_TYPE_NAMES = {str: "string", int: "integer", float: "number", bool: "boolean",
+               dict: "object", list: "array"}
+
+
+def _type_name(types):
+    return " or ".join(_TYPE_NAMES[t] for t in types)
+
+
+def _is_type(value, types):
+    # bool is an int subclass, only accept it where booleans are expected
+    return isinstance(value, types) and (bool in types or not isinstance(value, bool))
+
+
+class ConfigValidator:
+    """Checks a diagram config in one linear pass and collects every problem.
+
+    The schema tables above and the set of available icons are prepared once
+    per validator, so validating a request costs one walk over its elements.
+    Errors are dicts with a JSON path ("$.clusters[0].nodes[2].icon") and a
+    message.
+    """
+
+    def __init__(self, icons_dir=None):
+        self.icons_dir = ICONS_DIR if icons_dir is None else icons_dir
+        self._icons = None
+        self._icons_mtime = None
+
+    def known_icons(self):
+        """Names of the icons in icons_dir, rescanned when the directory changes"""
+        try:
+            mtime = os.stat(self.icons_dir).st_mtime_ns
+        except OSError:
+            return frozenset()
+        if mtime != self._icons_mtime:
+            self._icons = frozenset(os.path.splitext(name)[0] for name in os.listdir(self.icons_dir)
+                                    if name.endswith(".svg"))
+            self._icons_mtime = mtime
+        return self._icons
+
+    def validate(self, config):
+        """Return the list of errors in config (empty when it is valid)"""
+        errors = []
+
+        def error(path, message):
+            errors.append({"path": path, "message": message})
+
+        if not isinstance(config, dict):
+            error("$", "config must be an object")
+            return errors
+
+        def check_fields(obj, fields, path):
+            for key, types in fields.items():
+                value = obj.get(key)
+                if value is not None and not _is_type(value, types):
+                    error(f"{path}.{key}", f"must be {_type_name(types)}")
+
+        check_fields(config, ROOT_FIELDS, "$")
+        for key, choices in ROOT_CHOICES.items():
+            value = config.get(key)
+            if isinstance(value, str) and value not in choices:
+                error(f"$.{key}", f'"{value}" is not one of {", ".join(choices)}')
+        self._check_level_of_detail(config.get("level_of_detail"), error)
+        subnets = config.get("subnets")
+        if isinstance(subnets, list):
+            # Unparseable subnets are not errors here; compiling reports them as diagnostics
+            for i, subnet_def in enumerate(subnets):
+                path = f"$.subnets[{i}]"
+                if not isinstance(subnet_def, dict):
+                    error(path, "subnet must be an object")
+                    continue
+                check_fields(subnet_def, SUBNET_FIELDS, path)
+                if not subnet_def.get("subnet"):
+                    error(f"{path}.subnet", '"subnet" is required')
+        budget = config.get("layout_budget")
+        if _is_type(budget, _NUMBER) and budget <= 0:
+            error("$.layout_budget", "must be a positive number of seconds")
+
+        icons = self.known_icons()
+        seen_ids = {}
+
+        def check_nodes(node_defs, path):
+            if not isinstance(node_defs, list):
+                return
+            for i, node_def in enumerate(node_defs):
+                node_path = f"{path}[{i}]"
+                if not isinstance(node_def, dict):
+                    error(node_path, "node must be an object")
+                    continue
+                check_fields(node_def, NODE_FIELDS, node_path)
+                node_id = node_def.get("id")
+                if node_id is None or node_id == "":
+                    error(f"{node_path}.id", "node id is required")
+                elif _is_type(node_id, _NODE_ID):
+                    first = seen_ids.setdefault(node_id, node_path)
+                    if first != node_path:
+                        error(f"{node_path}.id", f'duplicate node id "{node_id}", first defined at {first}')
+                icon = node_def.get("icon")
+                if icon is None or icon == "":
+                    error(f"{node_path}.icon", "node icon is required")
+                elif isinstance(icon, str) and icon not in icons:
+                    error(f"{node_path}.icon", f'unknown icon "{icon}"')
+
+        check_nodes(config.get("nodes"), "$.nodes")
+
+        clusters = config.get("clusters")
+        stack = []
+        if isinstance(clusters, list):
+            stack = [(cluster_def, f"$.clusters[{i}]") for i, cluster_def in reversed(list(enumerate(clusters)))]
+        while stack:
+            cluster_def, path = stack.pop()
+            if not isinstance(cluster_def, dict):
+                error(path, "cluster must be an object")
+                continue
+            check_fields(cluster_def, CLUSTER_FIELDS, path)
+            check_nodes(cluster_def.get("nodes"), f"{path}.nodes")
+            nested = cluster_def.get("clusters")
+            if isinstance(nested, list):
+                stack.extend((nested_def, f"{path}.clusters[{i}]")
+                             for i, nested_def in reversed(list(enumerate(nested))))
+
+        connections = config.get("connections")
+        if isinstance(connections, list):
+            for i, connection in enumerate(connections):
+                path = f"$.connections[{i}]"
+                if not isinstance(connection, dict):
+                    error(path, "connection must be an object")
+                    continue
+                check_fields(connection, CONNECTION_FIELDS, path)
+                for end in ("from", "to"):
+                    node_id = connection.get(end)
+                    if node_id is None or node_id == "":
+                        error(f"{path}.{end}", f'"{end}" is required')
+                    elif _is_type(node_id, _NODE_ID) and node_id not in seen_ids:
+                        error(f"{path}.{end}", f'unknown node id "{node_id}"')
+
+        self._check_query(config.get("query"), seen_ids, error)
+        return errors
+
+    @staticmethod
+    def _check_level_of_detail(options, error):
+        if not isinstance(options, dict):
+            return
+        for key, value in options.items():
+            path = f"$.level_of_detail.{key}"
+            if key not in LOD_OPTIONS:
+                error(path, f"unknown option, expected one of {', '.join(LOD_OPTIONS)}")
+            elif key != "expand" and value is not None and (not _is_type(value, (int,)) or value < 0):
+                error(path, "must be a non-negative integer")
+            elif key == "expand" and not isinstance(value, (str, list)):
+                error(path, "must be a cluster name or a list of names")
+            elif key == "expand" and isinstance(value, list):
+                for i, name in enumerate(value):
+                    if not isinstance(name, str):
+                        error(f"{path}[{i}]", "must be a cluster name")
+
+    @staticmethod
+    def _check_query(query, seen_ids, error):
+        if not isinstance(query, dict):
+            return
+        for key in query:
+            if key not in QUERY_OPTIONS:
+                error(f"$.query.{key}", f"unknown option, expected one of {', '.join(QUERY_OPTIONS)}")
+        query_type = query.get("type")
+        if query_type not in QUERY_TYPES:
+            error("$.query.type", f"must be one of {', '.join(QUERY_TYPES)}")
+            return
+        ends = ("from", "to") if query_type == "path" else ("node",) if query_type == "neighbours" else ("from",)
+        for end in ends:
+            node_id = query.get(end)
+            if node_id is None or node_id == "":
+                error(f"$.query.{end}", f'"{end}" is required for a {query_type} query')
+            elif not _is_type(node_id, _NODE_ID) or node_id not in seen_ids:
+                error(f"$.query.{end}", f'unknown node id "{node_id}"')
+        hops = query.get("hops")
+        if hops is not None and (not _is_type(hops, (int,)) or hops < 0):
+            error("$.query.hops", "must be a non-negative integer")
+        if query.get("directed") is not None and not isinstance(query["directed"], bool):
+            error("$.query.directed", "must be boolean")
+
+
+class ConfigValidationError(ValueError):
+    """Raised for an invalid config; errors holds every problem found"""
+
+    def __init__(self, errors):
+        super().__init__(format_errors(errors))
+        self.errors = errors
+
+
+_default_validator = ConfigValidator()
+
+
+def validate_config(config, validator=None):
+    """Validate config with the shared validator and return the list of errors"""
+    return (validator or _default_validator).validate(config)
+
+
+def check_config(config, validator=None):
+    """Validate config and raise ConfigValidationError listing all errors"""
+    errors = validate_config(config, validator)
+    if errors:
+        raise ConfigValidationError(errors)
+
+
+def format_errors(errors):
+    """One "path: message" line per error"""
+    return "\n".join(f"{e['path']}: {e['message']}" for e in errors)
@@ -0,0 +1,194 @@
+import re
+
+from topology_ir import compile_topology
+
+# Attributes the diagrams library puts on every graph, cluster, node and edge,
+# repeated here so both backends produce the same picture
+_DIAGRAM_GRAPH_ATTR = {
+    "pad": "2.0",
+    "splines": "ortho",
+    "nodesep": "0.60",
+    "ranksep": "0.75",
+    "fontname": "Sans-Serif",
+    "fontsize": "15",
+    "fontcolor": "#2D3436",
+}
+_DIAGRAM_NODE_ATTR = {
+    "shape": "box",
+    "style": "rounded",
+    "fixedsize": "true",
+    "width": "1.4",
+    "height": "1.4",
+    "labelloc": "b",
+    "imagescale": "true",
+    "fontname": "Sans-Serif",
+    "fontsize": "13",
+    "fontcolor": "#2D3436",
+}
+_DIAGRAM_EDGE_ATTR = {"color": "#7B8894"}
+_CLUSTER_GRAPH_ATTR = {
+    "shape": "box",
+    "style": "rounded",
+    "labeljust": "l",
+    "pencolor": "#AEB6BE",
+    "fontname": "Sans-Serif",
+    "fontsize": "12",
+}
+_CLUSTER_BGCOLORS = ("#E5F5FD", "#EBF3E7", "#ECE8F6", "#FDF7E3")
+_EDGE_ATTR = {"fontcolor": "#2D3436", "fontname": "Sans-Serif", "fontsize": "13"}
+_CUSTOM_NODE_HEIGHT = 1.9
+
+# Draft previews: straight edges instead of ortho routing, fewer crossing
+# minimisation passes, and small plain boxes without icon images
+DRAFT_GRAPH_ATTR = {
+    "splines": "line",
+    "mclimit": "0.2",
+    "pad": "0.3",
+    "nodesep": "0.25",
+    "ranksep": "0.4",
+}
+DRAFT_NODE_ATTR = {
+    "shape": "box",
+    "style": "rounded",
+    "fixedsize": "false",
+    "width": "0.5",
+    "height": "0.3",
+    "margin": "0.05,0.03",
+    "fontname": "Sans-Serif",
+    "fontsize": "10",
+}
+
+# DOT identifier quoting, same rules as graphviz.quoting.quote
+_HTML_STRING = re.compile(r'<.*>$', re.DOTALL)
+_ID = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$')
+_KEYWORDS = {'node', 'edge', 'graph', 'digraph', 'subgraph', 'strict'}
+_UNESCAPED_QUOTE = re.compile(r'(?P<escaped_backslashes>(?:\\{2})*)\\?(?P<literal_quote>")')
+
+
+def quote(value):
+    """Return a DOT identifier for value, quoted if needed"""
+    value = str(value)
+    if _HTML_STRING.match(value):
+        return value
+    if not _ID.match(value) or value.lower() in _KEYWORDS:
+        if '"' in value:
+            value = _UNESCAPED_QUOTE.sub(r'\g<escaped_backslashes>\\\g<literal_quote>', value)
+        return '"' + value + '"'
+    return value
+
+
+def attr_list(attrs, label=None):
+    """Return a DOT attribute list: label first, remaining keys sorted"""
+    parts = [f"label={quote(label)}"] if label is not None else []
+    parts += [f"{quote(k)}={quote(v)}" for k, v in sorted(attrs.items()) if v is not None]
+    return f" [{' '.join(parts)}]" if parts else ""
+
+
+def emit_dot(topology, icons_dir=None, positions=None, draft=False):
+    """Compile a topology straight into DOT source in a single pass.
+
+    topology is a TopologyIR or a config dict (compiled first). Produces the
+    same graph as the diagrams backend in generate_from_json.py without
+    creating a diagrams object per node and edge.
+
+    positions is a layout from layout_cache.parse_layout; when given, node
+    positions, cluster boxes and edge routes are written into the source so
+    it can be rendered with "neato -n2" without running a new layout.
+
+    draft=True emits a cheap preview of the same graph: DRAFT_GRAPH_ATTR
+    overrides the routing options (also those from the config), nodes use
+    DRAFT_NODE_ATTR instead of the config's node_attr and no icons are embedded.
+    """
+    ir = compile_topology(topology, icons_dir)
+    if positions is None:
+        node_pos = cluster_pos = edge_pos = None
+    else:
+        node_pos, cluster_pos, edge_pos = positions["nodes"], positions["clusters"], positions["edges"]
+
+    graph_attr = dict(_DIAGRAM_GRAPH_ATTR, label=ir.title, rankdir=ir.direction)
+    graph_attr.update(ir.graph_attr)
+    if draft:
+        graph_attr.update(DRAFT_GRAPH_ATTR)
+    if positions is not None:
+        graph_attr.update(positions["graph"])
+    if draft:
+        node_attr = dict(DRAFT_NODE_ATTR)
+    else:
+        node_attr = dict(_DIAGRAM_NODE_ATTR)
+        node_attr.update(ir.node_attr)
+
+    lines = [f"digraph {quote(ir.title)} {{" if ir.title else "digraph {",
+             f"\tgraph{attr_list(graph_attr)}",
+             f"\tnode{attr_list(node_attr)}",
+             f"\tedge{attr_list(_DIAGRAM_EDGE_ATTR)}"]
+
+    # Attribute lists repeat heavily (same icon, same edge style), so quote each combination once
+    node_attr_suffixes = {}
+    node_labels, node_icon, icon_paths, node_links = ir.node_labels, ir.node_icon, ir.icon_paths, ir.node_links
+
+    def emit_nodes(members, indent):
+        for index in members:
+            label = node_labels[index]
+            suffix_key = (node_icon[index], label.count("\n"))
+            suffix = "" if draft else node_attr_suffixes.get(suffix_key)
+            if suffix is None:
+                height = str(_CUSTOM_NODE_HEIGHT + 0.4 * suffix_key[1])
+                suffix = attr_list({"height": height, "image": icon_paths[suffix_key[0]],
+                                    "shape": "none"})[2:-1]
+                node_attr_suffixes[suffix_key] = suffix
+            line = f"{indent}n{index} [label={quote(label)}{' ' + suffix if suffix else ''}]"
+            if index in node_links:
+                line += attr_list({"URL": node_links[index]})
+            if node_pos and node_pos[index]:
+                line += attr_list(node_pos[index])
+            lines.append(line)
+
+    emit_nodes(ir.root_nodes, "\t")
+
+    # Clusters are walked with an explicit stack so deep nesting cannot hit the recursion limit
+    stack = [(False, cluster) for cluster in reversed(ir.root_clusters)]
+    while stack:
+        closing, cluster = stack.pop()
+        depth = ir.cluster_depth[cluster]
+        indent = "\t" * (depth + 1)
+        if closing:
+            lines.append(f"{indent}}}")
+            continue
+
+        full_name = ir.cluster_labels[cluster]
+        cluster_attr = dict(_CLUSTER_GRAPH_ATTR, label=full_name, rankdir="LR",
+                            bgcolor=_CLUSTER_BGCOLORS[depth % len(_CLUSTER_BGCOLORS)])
+        if cluster_pos:
+            cluster_attr.update(cluster_pos[cluster])
+        lines.append(f"{indent}subgraph {quote('cluster_' + full_name)} {{")
+        lines.append(f"{indent}\tgraph{attr_list(cluster_attr)}")
+        emit_nodes(ir.cluster_nodes[cluster], indent + "\t")
+
+        stack.append((True, cluster))
+        for nested_cluster in reversed(ir.cluster_children[cluster]):
+            stack.append((False, nested_cluster))
+
+    edge_attr_suffixes = []
+    for edge_color, edge_style, bidirectional in ir.edge_styles:
+        edge_attr = dict(_EDGE_ATTR, dir="none" if bidirectional else "forward")
+        if edge_color:
+            edge_attr["color"] = edge_color
+        if edge_style:
+            edge_attr["style"] = edge_style
+        edge_attr_suffixes.append(attr_list(edge_attr))
+
+    edge_labels = ir.edge_labels
+    if edge_pos or edge_labels:
+        for index, (source, target, style) in enumerate(zip(ir.edge_src, ir.edge_dst, ir.edge_style)):
+            extra = {}
+            if index in edge_labels:
+                extra["xlabel"] = edge_labels[index]
+            if edge_pos and edge_pos[index]:
+                extra["pos"] = edge_pos[index]
+            lines.append(f"\tn{source} -> n{target}{edge_attr_suffixes[style]}{attr_list(extra)}")
+    else:
+        for source, target, style in zip(ir.edge_src, ir.edge_dst, ir.edge_style):
+            lines.append(f"\tn{source} -> n{target}{edge_attr_suffixes[style]}")
+
+    lines.append("}")
+    return "\n".join(lines) + "\n"
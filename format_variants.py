@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+import io
+import re
+import gzip
+
+from PIL import Image
+
+try:
+    import brotli  # 可选依赖，未安装时只提供gzip压缩
+except ImportError:
+    brotli = None
+
+# 可以由同一份布局绘制的输出格式及其MIME类型
+MIME_TYPES = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "pdf": "application/pdf",
+    "dot": "text/vnd.graphviz",
+}
+# 可以生成缩略图的格式：位图用Pillow缩放，SVG改写根元素的宽高
+RESIZABLE_FORMATS = ("png", "jpg", "svg")
+# 已定位DOT文本在渲染缓存中的条目名，各格式都由它绘制
+LAYOUT_VARIANT = "layout.gv"
+
+MAX_WIDTH = 8192
+MAX_SCALE = 4.0
+
+# 值得压缩传输的文本/矢量格式（PNG/JPG本身已压缩）及服务端支持的内容编码，按优先顺序
+COMPRESSIBLE_FORMATS = ("svg", "pdf", "dot")
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+_PIL_FORMATS = {"png": "PNG", "jpg": "JPEG"}
+_VARIANT = re.compile(r"(?:w(?P<width>\d+)\.|x(?P<scale>[0-9.]+)\.)?(?P<format>[a-z]+)")
+_SVG_TAG = re.compile(r"<svg\b[^>]*>", re.S)
+_SVG_LENGTH = re.compile(r'\b(width|height)="([0-9.]+)([a-z%]*)"')
+
+
+def negotiate_format(accept, default):
+    """按Accept请求头选择输出格式
+
+    accept 为按q值排序的 (MIME类型, q值) 序列（werkzeug的 request.accept_mimetypes）；
+    只写了通配符或没有支持的类型时返回 default。
+    """
+    by_mime = {mime: fmt for fmt, mime in MIME_TYPES.items()}
+    for mime, quality in accept:
+        if quality > 0 and mime in by_mime:
+            return by_mime[mime]
+    return default
+
+
+def negotiate_encoding(accept_encodings, outformat):
+    """按Accept-Encoding请求头选择压缩编码（werkzeug的 request.accept_encodings），不压缩时返回None"""
+    if outformat not in COMPRESSIBLE_FORMATS:
+        return None
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data, encoding):
+    """按内容编码压缩；gzip固定mtime，相同内容的压缩结果逐字节相同"""
+    if encoding == "br":
+        return brotli.compress(data)
+    if encoding == "gzip":
+        return gzip.compress(data, mtime=0)
+    raise ValueError(f"不支持的内容编码: {encoding}")
+
+
+def parse_size(width=None, scale=None):
+    """校验缩略图参数（字符串或数字），返回 (width, scale)；参数无效时抛出ValueError"""
+    if width not in (None, "") and scale not in (None, ""):
+        raise ValueError("width 和 scale 只能指定一个")
+    if width not in (None, ""):
+        try:
+            width = int(width)
+        except (TypeError, ValueError):
+            raise ValueError("width 必须是整数")
+        if not 1 <= width <= MAX_WIDTH:
+            raise ValueError(f"width 必须在 1 到 {MAX_WIDTH} 之间")
+        return width, None
+    if scale not in (None, ""):
+        try:
+            scale = float(scale)
+        except (TypeError, ValueError):
+            raise ValueError("scale 必须是数字")
+        if not 0 < scale <= MAX_SCALE:
+            raise ValueError(f"scale 必须大于0且不超过 {MAX_SCALE}")
+        return None, scale
+    return None, None
+
+
+def variant_name(outformat, width=None, scale=None):
+    """渲染缓存中的条目名：png、w320.png（指定宽度）或 x0.5.png（按比例）"""
+    if width is not None:
+        return f"w{width}.{outformat}"
+    if scale is not None:
+        return f"x{scale:g}.{outformat}"
+    return outformat
+
+
+def parse_variant(variant):
+    """解析 variant_name 生成的条目名，返回 (格式, width, scale)；名称无效时抛出ValueError"""
+    match = _VARIANT.fullmatch(variant)
+    if not match or match.group("format") not in MIME_TYPES:
+        raise ValueError(f"无效的结果名称: {variant}")
+    outformat = match.group("format")
+    width, scale = parse_size(match.group("width"), match.group("scale"))
+    if (width is not None or scale is not None) and outformat not in RESIZABLE_FORMATS:
+        raise ValueError(f"{outformat} 格式不支持缩略图")
+    if variant_name(outformat, width, scale) != variant:
+        raise ValueError(f"无效的结果名称: {variant}")  # 每个结果只有一个地址，如 x0.50.png 应写作 x0.5.png
+    return outformat, width, scale
+
+
+def resize(data, outformat, width=None, scale=None):
+    """从完整尺寸的结果派生缩略图，width 为目标宽度（像素），scale 为缩放比例"""
+    if outformat == "svg":
+        return _resize_svg(data, width, scale)
+    if outformat in _PIL_FORMATS:
+        return _resize_raster(data, outformat, width, scale)
+    raise ValueError(f"{outformat} 格式不支持 width/scale，可缩放的格式: {', '.join(RESIZABLE_FORMATS)}")
+
+
+def _resize_raster(data, outformat, width, scale):
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        if width is not None:
+            size = (width, max(1, round(image.height * width / image.width)))
+        else:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        resized = image.resize(size, Image.LANCZOS)
+    if outformat == "jpg" and resized.mode != "RGB":
+        resized = resized.convert("RGB")
+    out = io.BytesIO()
+    resized.save(out, _PIL_FORMATS[outformat], optimize=True)
+    return out.getvalue()
+
+
+def _resize_svg(data, width, scale):
+    """改写SVG根元素的 width/height，保留（或补上）viewBox，矢量内容不变"""
+    text = data.decode("utf-8")
+    match = _SVG_TAG.search(text)
+    lengths = {name: (float(value), unit) for name, value, unit in _SVG_LENGTH.findall(match.group(0))} if match else {}
+    if "width" not in lengths or "height" not in lengths or not lengths["width"][0]:
+        raise ValueError("SVG缺少宽高属性，无法缩放")
+    (old_w, unit), (old_h, _) = lengths["width"], lengths["height"]
+    if width is not None:
+        new_w, new_h, unit = width, old_h * width / old_w, "px"
+    else:
+        new_w, new_h = old_w * scale, old_h * scale
+
+    def replace(m):
+        value = new_w if m.group(1) == "width" else new_h
+        return f'{m.group(1)}="{value:.2f}{unit}"'
+
+    tag = _SVG_LENGTH.sub(replace, match.group(0), count=2)
+    if "viewBox" not in tag:
+        tag = tag[:4] + f' viewBox="0 0 {old_w:g} {old_h:g}"' + tag[4:]
+    return (text[:match.start()] + tag + text[match.end():]).encode("utf-8")
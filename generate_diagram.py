@@ -1,34 +1,43 @@
 #!/usr/bin/env python
 import os
 import sys
-import json
-import yaml
 import argparse
-from generate_from_json import generate_diagram
+
+# 渲染相关的模块（diagrams、graphviz、yaml）在用到时才导入，
+# --help 和 --check 不加载渲染依赖，--daemon 模式由守护进程负责渲染
 
 def load_config(config_path):
-    """加载配置文件，自动检测JSON或YAML格式"""
+    """加载配置文件，自动检测JSON或YAML格式
+
+    没有.json/.yaml/.yml后缀时按文件开头的字节判断格式，不再先按JSON试解析再回退到YAML。
+    """
+    from config_stream import detect_format
     try:
         file_ext = os.path.splitext(config_path)[1].lower()
+        if file_ext in ['.yml', '.yaml']:
+            print(f"检测到YAML格式配置文件: {config_path}")
+            config_format = 'yaml'
+        elif file_ext == '.json':
+            print(f"检测到JSON格式配置文件: {config_path}")
+            config_format = 'json'
+        else:
+            config_format = detect_format(config_path)
         
         with open(config_path, 'r', encoding='utf-8') as f:
-            if file_ext in ['.yml', '.yaml']:
-                print(f"检测到YAML格式配置文件: {config_path}")
-                return yaml.safe_load(f)
-            elif file_ext == '.json':
-                print(f"检测到JSON格式配置文件: {config_path}")
+            if config_format == 'json':
+                import json
                 return json.load(f)
-            else:
-                # 尝试按JSON格式加载
-                try:
-                    content = f.read()
-                    return json.loads(content)
-                except json.JSONDecodeError:
-                    # 如果JSON解析失败，尝试YAML格式
-                    try:
-                        return yaml.safe_load(content)
-                    except yaml.YAMLError:
-                        raise ValueError(f"无法识别文件格式: {config_path}，请使用.json或.yaml/.yml后缀")
+            import yaml
+            return yaml.safe_load(f)
+    except Exception as e:
+        print(f"❌ 加载配置文件失败: {e}")
+        sys.exit(1)
+
+def load_topology_streaming(config_path, overrides=None):
+    """流式加载配置文件：逐个解析并编译节点、区域和连接，峰值内存不随文件大小增长"""
+    from config_stream import load_topology
+    try:
+        return load_topology(config_path, overrides=overrides)
     except Exception as e:
         print(f"❌ 加载配置文件失败: {e}")
         sys.exit(1)
@@ -36,45 +45,183 @@ def load_config(config_path):
 def main():
     # 创建命令行参数解析器
     parser = argparse.ArgumentParser(description='根据配置文件生成网络拓扑图')
-    parser.add_argument('config_file', help='配置文件路径 (.json, .yaml 或 .yml)')
+    parser.add_argument('config_files', nargs='+', metavar='config_file',
+                        help='配置文件路径 (.json, .yaml 或 .yml)，可指定多个')
     parser.add_argument('-o', '--output', help='输出文件名（不含扩展名，覆盖配置中的设置）')
     parser.add_argument('-f', '--format', choices=['svg', 'png', 'jpg', 'pdf'], 
                         help='输出文件格式（覆盖配置中的设置）')
     parser.add_argument('-d', '--direction', choices=['TB', 'LR', 'BT', 'RL'],
                         help='图表方向: TB=从上到下, LR=从左到右, BT=从下到上, RL=从右到左（覆盖配置中的设置）')
     parser.add_argument('--title', help='图表标题（覆盖配置中的设置）')
+    parser.add_argument('--max-depth', type=int,
+                        help='细节层级: 嵌套深度达到该值的区域折叠为一个汇总节点（0表示折叠所有顶层区域）')
+    parser.add_argument('--max-cluster-nodes', type=int,
+                        help='细节层级: 节点数（含嵌套区域）超过该值的区域折叠为一个汇总节点')
+    parser.add_argument('--expand', action='append', metavar='CLUSTER',
+                        help='始终展开指定名称的区域，可多次使用')
+    parser.add_argument('--budget', type=float, metavar='SECONDS',
+                        help='布局时间预算（秒）：按图的规模选择布局档位，超时后终止Graphviz并依次改用 '
+                             'polyline、直线、sfdp 重试')
+    parser.add_argument('--path', nargs=2, metavar=('FROM', 'TO'),
+                        help='只绘制两个节点之间的最短路径（路径上的连线高亮）')
+    parser.add_argument('--neighbours', metavar='NODE', help='只绘制指定节点 --hops 跳以内的节点')
+    parser.add_argument('--hops', type=int, default=1, help='--neighbours 的跳数（默认1）')
+    parser.add_argument('--reachable', metavar='NODE', help='只绘制从指定节点出发可达的节点')
+    parser.add_argument('--undirected', action='store_true',
+                        help='--path/--reachable 忽略连线方向（默认沿连线方向查找）')
+    parser.add_argument('--shard', action='store_true',
+                        help='按顶层区域拆分并行渲染，输出总览图、各区域图和索引到 <输出文件名>_shards 目录')
+    parser.add_argument('--workers', type=int, help='--shard/--build 模式下的并行进程数（默认CPU核数）')
+    parser.add_argument('--check', action='store_true',
+                        help='只校验配置并列出所有错误（带JSON路径），不生成图表')
+    parser.add_argument('--daemon', action='store_true',
+                        default=os.environ.get('DIAGRAM_DAEMON', '').strip().lower() in ('1', 'true', 'yes', 'on'),
+                        help='交给本地渲染守护进程（render_daemon.py）生成，守护进程未运行时在本进程内生成；'
+                             '也可设置环境变量 DIAGRAM_DAEMON=1（0/false 等其它值不启用）')
+    parser.add_argument('--daemon-socket', help='渲染守护进程的Unix套接字路径')
+    parser.add_argument('--watch', action='store_true',
+                        help='监视配置文件和图标目录，保存后自动重新生成（只在拓扑实际变化时渲染）')
+    parser.add_argument('--debounce', type=float, default=0.3,
+                        help='--watch 模式下最后一次修改后等待多少秒再渲染，合并连续保存')
+    parser.add_argument('--build', action='store_true',
+                        help='批量构建：参数可以是目录（递归查找配置文件）或通配符，并行生成，'
+                             '跳过配置和图标都没有变化的文件')
+    parser.add_argument('--out-dir', default='diagrams_build',
+                        help='--build 模式的输出目录，按配置文件的相对路径存放（默认 diagrams_build）')
+    parser.add_argument('--manifest', help='--build 模式的清单文件（默认 <输出目录>/.manifest.json）')
+    parser.add_argument('--force', action='store_true', help='--build 模式下忽略清单，全部重新生成')
     
     # 解析命令行参数
     args = parser.parse_args()
     
-    config_path = args.config_file
+    if args.build:
+        if args.output or args.watch or args.shard:
+            print("❌ --build 不能与 -o/--output、--watch 或 --shard 同时使用")
+            sys.exit(1)
+    if args.shard and (args.path or args.neighbours or args.reachable):
+        print("❌ --shard 不能与 --path、--neighbours 或 --reachable 同时使用")
+        sys.exit(1)
     
-    # 检查文件是否存在
-    if not os.path.exists(config_path):
-        print(f"❌ 文件不存在: {config_path}")
+    # 检查文件是否存在（--build 模式的参数可以是目录或通配符）
+    for config_path in [] if args.build else args.config_files:
+        if not os.path.exists(config_path):
+            print(f"❌ 文件不存在: {config_path}")
+            sys.exit(1)
+    if args.output and len(args.config_files) > 1:
+        print("❌ 指定多个配置文件时不能使用 -o/--output")
         sys.exit(1)
         
-    # 加载配置
-    print(f"正在加载配置文件: {config_path}")
-    config = load_config(config_path)
-    
-    # 应用命令行参数覆盖配置中的设置
+    # 命令行参数覆盖配置中的设置
+    overrides = {}
     if args.output:
-        config['output_filename'] = args.output
+        overrides['output_filename'] = args.output
     if args.format:
-        config['outformat'] = args.format
+        overrides['outformat'] = args.format
     if args.direction:
-        config['direction'] = args.direction
+        overrides['direction'] = args.direction
     if args.title:
-        config['title'] = args.title
+        overrides['title'] = args.title
+    if args.budget:
+        overrides['layout_budget'] = args.budget
+    if args.path:
+        overrides['query'] = {'type': 'path', 'from': args.path[0], 'to': args.path[1]}
+    elif args.neighbours:
+        overrides['query'] = {'type': 'neighbours', 'node': args.neighbours, 'hops': args.hops}
+    elif args.reachable:
+        overrides['query'] = {'type': 'reachable', 'from': args.reachable}
+    if args.undirected and 'query' in overrides:
+        overrides['query']['directed'] = False
+    lod = {}
+    if args.max_depth is not None:
+        lod['max_depth'] = args.max_depth
+    if args.max_cluster_nodes is not None:
+        lod['max_cluster_nodes'] = args.max_cluster_nodes
+    if args.expand:
+        lod['expand'] = args.expand
+    
+    if args.build:
+        from build_mode import DiagramBuild, print_summary
+        summary = DiagramBuild(args.config_files, args.out_dir, args.manifest, overrides, lod,
+                               workers=args.workers, force=args.force).run()
+        print_summary(summary)
+        if summary["failed"]:
+            sys.exit(1)
+        return
+    
+    if args.watch:
+        from watch_mode import watch
+        watch(args.config_files, overrides, lod, debounce=args.debounce)
+        return
+    
+    ok = True
+    for config_path in args.config_files:
+        ok = process_config(config_path, args, overrides, lod) and ok
+    if not ok:
+        sys.exit(1)
+
+def process_config(config_path, args, overrides, lod):
+    """按命令行选项校验或生成一个配置文件，校验失败时返回False"""
+    print(f"正在加载配置文件: {config_path}")
+    if args.check:
+        from config_validator import format_errors, validate_config
+        config = load_config(config_path)
+        if isinstance(config, dict):  # 空文件或顶层不是对象时交给校验器报告 "$: config must be an object"
+            config.update(overrides)
+        errors = validate_config(config)
+        if errors:
+            print(f"❌ 配置校验失败，共{len(errors)}个错误:")
+            print(format_errors(errors))
+            return False
+        print("✅ 配置校验通过")
+        if config.get('subnets'):
+            # 按子网自动分组的提示（无效或重复的子网/IP、不属于任何子网的节点）不算校验错误
+            from topology_ir import compile_topology
+            diagnostics = compile_topology(config, log=None).diagnostics
+            if diagnostics:
+                print(f"⚠️ 按子网自动分组有{len(diagnostics)}条提示:")
+                for item in diagnostics:
+                    print(f"  [{item['code']}] {item['message']}")
+        return True
+    
+    if args.shard:
+        # 拆分需要原始配置结构，整体加载
+        config = load_config(config_path)
+        if not isinstance(config, dict):
+            print("❌ 配置文件的顶层必须是对象（文件为空或格式不对）")
+            return False
+        config.update(overrides)
+        if lod:
+            config['level_of_detail'] = dict(config.get('level_of_detail') or {}, **lod)
+        output_dir = f"{config.get('output_filename', 'network_topology')}_shards"
+        print(f"正在按顶层区域并行生成网络拓扑图: {output_dir}")
+        from sharded_render import render_sharded
+        render_sharded(config, output_dir, workers=args.workers)
+        return True
+    
+    if args.daemon:
+        from render_daemon import DaemonUnavailable, render_via_daemon
+        try:
+            output = render_via_daemon(config_path, overrides, lod, socket_path=args.daemon_socket)
+        except DaemonUnavailable:
+            print("渲染守护进程未运行，在本进程内生成")
+        except RuntimeError as e:
+            print(f"❌ 生成图表失败: {e}")
+            sys.exit(1)
+        else:
+            print(f"✅ 完成! 输出文件: {output}")
+            return True
+    
+    topology = load_topology_streaming(config_path, overrides)
+    if lod:
+        topology.level_of_detail = dict(topology.level_of_detail or {}, **lod)
     
     # 生成图表
     print("正在生成网络拓扑图...")
-    generate_diagram(config)
+    from generate_from_json import generate_diagram
+    generate_diagram(topology)
     
-    output_filename = config.get('output_filename', 'network_topology')
-    output_format = config.get('outformat', 'svg')
-    print(f"✅ 完成! 输出文件: {output_filename}.{output_format}")
+    print(f"✅ 完成! 输出文件: {topology.output_filename}.{topology.outformat}")
+    return True
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
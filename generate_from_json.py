@@ -1,8 +1,71 @@
 import os
 import json
 import sys
-from diagrams import Diagram, Cluster, Edge
+import subprocess
+import time
+from diagrams import Diagram, Cluster, Edge, setdiagram
 from diagrams.custom import Custom
+from config_stream import load_topology
+from dot_emitter import emit_dot
+from layout_cache import default_cache, parse_layout, structural_key
+from layout_tiers import TIER_SHARE, TIERS, apply_tier, engine_args, plan_tiers
+from level_of_detail import apply_level_of_detail
+from topology_index import apply_query
+from topology_ir import BACKENDS, compile_topology
+
+# Graphviz layout executable, override with GRAPHVIZ_DOT if it is not on PATH
+DOT_BINARY = os.environ.get("GRAPHVIZ_DOT", "dot")
+
+class RenderTimeoutError(RuntimeError):
+    """Raised when graphviz does not finish within the render timeout"""
+
+class _SourceOnlyDiagram(Diagram):
+    """Diagram context that only builds the graph; rendering is done by run_graphviz"""
+
+    def render(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        setdiagram(None)
+
+# Renders DOT source whose positions are already fixed, without a new layout
+PINNED_LAYOUT_ARGS = ("-Kneato", "-n2")
+
+def run_graphviz(source, outformat, output_path=None, timeout=None, args=(), started=None):
+    """Lay out DOT source with graphviz.
+
+    args are extra command line options such as PINNED_LAYOUT_ARGS. The
+    result is written to output_path, or returned as bytes when no path is
+    given (the source is piped in and the image read back from stdout, so no
+    intermediate files are created). The graphviz process is killed if it runs
+    longer than timeout seconds.
+
+    started, if given, is called with the running subprocess.Popen so another
+    thread can kill it; a killed run raises RuntimeError.
+    """
+    cmd = [DOT_BINARY, *args, f"-T{outformat}"]
+    if output_path:
+        cmd += ["-o", output_path]
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError(f"graphviz executable not found: {DOT_BINARY}")
+    with proc:
+        if started is not None:
+            started(proc)
+        try:
+            stdout, stderr = proc.communicate(source.encode("utf-8"), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise RenderTimeoutError(f"graphviz did not finish within {timeout}s")
+        except BaseException:
+            proc.kill()
+            raise
+    if proc.returncode != 0:
+        message = stderr.decode("utf-8", "replace").strip() or f"exit status {proc.returncode}"
+        raise RuntimeError(f"graphviz failed: {message}")
+    return None if output_path else stdout
 
 def load_json_config(json_path):
     """Load diagram configuration from a JSON file"""
@@ -13,185 +76,278 @@ def load_json_config(json_path):
         print(f"❌ Failed to load JSON configuration: {e}")
         sys.exit(1)
 
-def generate_diagram(config):
-    """Generate network diagram based on JSON configuration"""
-    # Get base configuration
-    title = config.get("title", "Network Topology")
-    output_filename = config.get("output_filename", "network_topology")
-    direction = config.get("direction", "TB")  # Top to Bottom by default
-    
-    # Get diagram attributes
-    graph_attr = config.get("graph_attr", {"fontsize": "12", "bgcolor": "transparent", "splines": "ortho"})
-    node_attr = config.get("node_attr", {
-        "fontsize": "20", 
-        "height": "0.8",
-        "width": "0.8",
-        "fixedsize": "true",
-        "imagescale": "true"
-    })
-    
-    # Get output format
-    outformat = config.get("outformat", "svg")
-    
-    # Set up icon directory
+def load_json_topology(json_path):
+    """Stream a JSON file straight into a TopologyIR without building the whole document"""
+    try:
+        return load_topology(json_path)
+    except Exception as e:
+        print(f"❌ Failed to load JSON configuration: {e}")
+        sys.exit(1)
+
+def generate_diagram(config, timeout=None, strict=False, timings=None, in_memory=False,
+                     backend=None, reuse_layout=None, render_info=None, level_of_detail=None,
+                     layout_budget=None):
+    """Generate network diagram based on JSON configuration
+
+    config may also be an already compiled TopologyIR. backend selects how the
+    graph is built (see BACKENDS); it defaults to the config's "backend" key
+    and then to "diagrams".
+
+    By default the diagram is written to "<output_filename>.<outformat>". With
+    in_memory=True nothing is written to disk and the rendered bytes are
+    returned instead (None if rendering failed).
+
+    timeout limits the graphviz run in seconds. With strict=True errors are
+    raised to the caller instead of being printed. If a timings dict is given,
+    the duration of each phase ("parse", "build", "layout") is recorded in it.
+
+    reuse_layout (default: the config's "reuse_layout" key) caches graphviz
+    positions by structural_key, so a config that only changes styling is
+    re-rendered from the cached positions ("render" phase) instead of running
+    a new layout. It applies to the "dot" backend. If a render_info dict is
+    given, the backend used and the layout path taken are recorded in it:
+    "full" (layout computed and cached), "cached" (positions reused) or
+    "direct" (plain layout, no cache).
+
+    level_of_detail (default: the config's "level_of_detail" key) collapses
+    clusters into summary nodes before layout, see
+    level_of_detail.collapse_clusters for the options.
+
+    layout_budget (default: the config's "layout_budget" key) is a time
+    budget in seconds for the layout. The starting tier (see layout_tiers) is
+    chosen by graph size, and a graphviz run that exceeds its share of the
+    budget is killed and retried with cheaper settings. The tier used is
+    recorded in render_info["tier"] and each attempt in
+    render_info["attempts"].
+
+    A "query" key in the config renders only the matching subgraph, such
+    as the path between two nodes; see topology_index.apply_query. The
+    match is recorded in render_info["query"].
+    """
+    if timings is None:
+        timings = {}
+    if render_info is None:
+        render_info = {}
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    icons_dir = os.path.join(script_dir, "my_icons")
-    
-    # Store all created nodes to reference when creating edges
-    node_registry = {}
     
     try:
-        # Create diagram
-        with Diagram(title, show=False, filename=output_filename, outformat=outformat, 
-                    graph_attr=graph_attr, node_attr=node_attr, direction=direction):
-            
-            # Process nodes
-            for node_def in config.get("nodes", []):
-                node_id = node_def.get("id")
-                node_label = node_def.get("label", node_id)
-                node_icon = node_def.get("icon")
-                node_ip = node_def.get("ip", "")
-                node_docker_image = node_def.get("image", "")
-                
-                # Skip nodes without ID or icon
-                if not node_id or not node_icon:
-                    print(f"⚠️ Skipping node with missing id or icon: {node_def}")
-                    continue
-                
-                icon_path = os.path.join(icons_dir, f"{node_icon}.svg")
-                
-                # Check if icon exists
-                if not os.path.exists(icon_path):
-                    print(f"⚠️ Icon not found: {icon_path}, using default server.svg")
-                    icon_path = os.path.join(icons_dir, "server.svg")
-                
-                # Create label with IP address and Docker image if provided
-                display_parts = [node_label]
-                if node_ip:
-                    display_parts.append(node_ip)
-                if node_docker_image:
-                    display_parts.append(f"镜像: {node_docker_image}")
-                
-                display_label = "\n".join(display_parts)
-                
-                # Create the node
-                node = Custom(display_label, icon_path=icon_path)
-                node_registry[node_id] = node
-            
-            # Process clusters and their nodes
-            for cluster_def in config.get("clusters", []):
-                cluster_name = cluster_def.get("name", "Cluster")
-                subnet = cluster_def.get("subnet", "")
-                full_name = f"{cluster_name}{' (' + subnet + ')' if subnet else ''}"
-                
-                with Cluster(full_name):
-                    # Process nodes inside this cluster
-                    for node_def in cluster_def.get("nodes", []):
-                        node_id = node_def.get("id")
-                        node_label = node_def.get("label", node_id)
-                        node_icon = node_def.get("icon")
-                        node_ip = node_def.get("ip", "")
-                        node_docker_image = node_def.get("image", "")
-                        
-                        # Skip nodes without ID or icon
-                        if not node_id or not node_icon:
-                            print(f"⚠️ Skipping node with missing id or icon: {node_def}")
-                            continue
-                        
-                        icon_path = os.path.join(icons_dir, f"{node_icon}.svg")
-                        
-                        # Check if icon exists
-                        if not os.path.exists(icon_path):
-                            print(f"⚠️ Icon not found: {icon_path}, using default server.svg")
-                            icon_path = os.path.join(icons_dir, "server.svg")
-                        
-                        # Create label with IP address and Docker image if provided
-                        display_parts = [node_label]
-                        if node_ip:
-                            display_parts.append(node_ip)
-                        if node_docker_image:
-                            display_parts.append(f"镜像: {node_docker_image}")
-                        
-                        display_label = "\n".join(display_parts)
-                        
-                        # Create the node
-                        node = Custom(display_label, icon_path=icon_path)
-                        node_registry[node_id] = node
-                    
-                    # Process nested clusters
-                    for nested_cluster in cluster_def.get("clusters", []):
-                        process_nested_cluster(nested_cluster, icons_dir, node_registry)
-            
-            # Process connections
-            for connection in config.get("connections", []):
-                source_id = connection.get("from")
-                target_id = connection.get("to")
-                edge_color = connection.get("color", "black")
-                edge_style = connection.get("style", "solid")
-                
-                # Skip connections with missing source or target
-                if source_id not in node_registry or target_id not in node_registry:
-                    print(f"⚠️ Skipping connection with invalid source or target: {connection}")
-                    continue
-                
-                # Create edge with properties
-                source = node_registry[source_id]
-                target = node_registry[target_id]
-                
-                if connection.get("bidirectional", False):
-                    source - Edge(color=edge_color, style=edge_style) - target
-                else:
-                    source >> Edge(color=edge_color, style=edge_style) >> target
+        ir, backend, reuse_layout, layout_budget = _prepare(config, timings, backend, reuse_layout, render_info,
+                                                            level_of_detail, layout_budget)
+        
+        output_file = f"{ir.output_filename}.{ir.outformat}"
+        output_path = None if in_memory else output_file
+        if reuse_layout and backend == "dot":
+            source = _positioned_source(ir, timeout, timings, render_info, layout_budget)
+            phase_start = time.perf_counter()
+            data = run_graphviz(source, ir.outformat, output_path, timeout=timeout, args=PINNED_LAYOUT_ARGS)
+            timings["render"] = time.perf_counter() - phase_start
+        else:
+            render_info["layout"] = "direct"
+            data, _ = _run_layout(ir, backend, ir.outformat, timeout, layout_budget, timings, render_info,
+                                  output_path)
+        if in_memory:
+            return data
         
         print(f"✅ Diagram successfully generated!")
-        print(f"   Please check '{output_filename}.{outformat}' file in: {script_dir}")
+        if render_info.get("tier", "full") != "full":
+            print(f"   Layout tier '{render_info['tier']}' used to stay within the {layout_budget}s budget")
+        query = render_info.get("query")
+        if query:
+            matched = " -> ".join(query["path"]) if "path" in query else f"{query['nodes']} nodes"
+            print(f"   Query ({query['type']}): {matched}")
+        print(f"   Please check '{output_file}' file in: {script_dir}")
         
     except Exception as e:
+        if strict:
+            raise
         print(f"❌ Error generating diagram: {e}")
 
-def process_nested_cluster(cluster_def, icons_dir, node_registry):
-    """Process a nested cluster recursively"""
-    cluster_name = cluster_def.get("name", "Nested Cluster")
-    subnet = cluster_def.get("subnet", "")
-    full_name = f"{cluster_name}{' (' + subnet + ')' if subnet else ''}"
+def layout_diagram(config, timeout=None, timings=None, backend=None, reuse_layout=None,
+                   render_info=None, level_of_detail=None, layout_budget=None):
+    """Run the graphviz layout once and return DOT source with every position fixed.
+
+    The result is drawn in any outformat by render_formats without a new
+    layout, so producing several formats costs one layout plus a cheap draw
+    per format. The arguments are those of generate_diagram; the config's
+    outformat is ignored. Errors are always raised.
+    """
+    if timings is None:
+        timings = {}
+    if render_info is None:
+        render_info = {}
+    ir, backend, reuse_layout, layout_budget = _prepare(config, timings, backend, reuse_layout, render_info,
+                                                        level_of_detail, layout_budget)
+    if reuse_layout and backend == "dot":
+        return _positioned_source(ir, timeout, timings, render_info, layout_budget)
+    
+    render_info["layout"] = "direct"
+    positioned, _ = _run_layout(ir, backend, "dot", timeout, layout_budget, timings, render_info)
+    return positioned.decode("utf-8")
+
+def render_formats(positioned, formats, timeout=None, timings=None):
+    """Draw DOT source returned by layout_diagram in each format, returns {format: bytes}"""
+    if timings is None:
+        timings = {}
+    phase_start = time.perf_counter()
+    results = {fmt: run_graphviz(positioned, fmt, timeout=timeout, args=PINNED_LAYOUT_ARGS) for fmt in formats}
+    timings["render"] = timings.get("render", 0.0) + time.perf_counter() - phase_start
+    return results
+
+def render_draft(config, outformat="svg", timeout=None, timings=None, level_of_detail=None, started=None):
+    """Render a quick low-fidelity preview and return its bytes.
+
+    The graph is emitted with emit_dot(draft=True): straight edges instead of
+    ortho routing and plain boxes instead of embedded icons, which keeps the
+    layout of a few hundred nodes well under a second. The backend and
+    reuse_layout options are ignored. started is passed to run_graphviz so the
+    caller can cancel a preview that has been superseded. Errors are raised.
+    """
+    if timings is None:
+        timings = {}
+    ir, _, _, _ = _prepare(config, timings, "dot", False, {}, level_of_detail)
+    phase_start = time.perf_counter()
+    source = emit_dot(ir, draft=True)
+    timings["build"] = time.perf_counter() - phase_start
+    phase_start = time.perf_counter()
+    data = run_graphviz(source, outformat, timeout=timeout, started=started)
+    timings["layout"] = time.perf_counter() - phase_start
+    return data
+
+def _prepare(config, timings, backend, reuse_layout, render_info, level_of_detail, layout_budget=None):
+    """Compile the config and resolve the backend, reuse_layout and layout_budget options"""
+    # Parse and validate the config once; every backend reads the IR
+    phase_start = time.perf_counter()
+    ir = compile_topology(config)
+    level_of_detail = level_of_detail or ir.level_of_detail
+    ir = apply_query(ir, ir.query, render_info)
+    ir = apply_level_of_detail(ir, level_of_detail)
+    timings["parse"] = time.perf_counter() - phase_start
+    
+    backend = backend or ir.backend or "diagrams"
+    if backend not in BACKENDS:
+        raise ValueError(f'"{backend}" is not a valid backend, expected one of {BACKENDS}')
     
-    with Cluster(full_name):
-        # Process nodes inside this cluster
-        for node_def in cluster_def.get("nodes", []):
-            node_id = node_def.get("id")
-            node_label = node_def.get("label", node_id)
-            node_icon = node_def.get("icon")
-            node_ip = node_def.get("ip", "")
-            node_docker_image = node_def.get("image", "")
-            
-            # Skip nodes without ID or icon
-            if not node_id or not node_icon:
-                print(f"⚠️ Skipping node with missing id or icon: {node_def}")
+    render_info["backend"] = backend
+    if reuse_layout is None:
+        reuse_layout = ir.reuse_layout
+    if layout_budget is None:
+        layout_budget = ir.layout_budget
+    return ir, backend, reuse_layout, layout_budget
+
+def _run_layout(ir, backend, outformat, timeout, layout_budget, timings, render_info, output_path=None):
+    """Build the graph with the backend and lay it out, returns (graphviz output, IR as laid out).
+
+    Without a budget the config is laid out as written. With one, the tiers
+    from plan_tiers are tried in order; each run may use TIER_SHARE of the
+    remaining budget (the last one all of it, timeout caps every run) before
+    it is killed and the next, cheaper tier is tried. RenderTimeoutError is
+    raised when no tier finishes in time.
+    """
+    tiers = plan_tiers(ir) if layout_budget else TIERS[:1]
+    deadline = time.monotonic() + layout_budget if layout_budget else None
+    attempts = render_info["attempts"] = []
+    for position, tier in enumerate(tiers):
+        run_timeout = timeout
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            share = remaining if position == len(tiers) - 1 else remaining * TIER_SHARE
+            run_timeout = share if timeout is None else min(timeout, share)
+            if run_timeout <= 0:
+                break
+        tiered = apply_tier(ir, tier)
+        phase_start = time.perf_counter()
+        source = emit_dot(tiered) if backend == "dot" else _build_with_diagrams(tiered)
+        timings["build"] = timings.get("build", 0.0) + time.perf_counter() - phase_start
+        
+        phase_start = time.perf_counter()
+        try:
+            data = run_graphviz(source, outformat, output_path, timeout=run_timeout, args=engine_args(tier))
+            outcome = "ok"
+        except RenderTimeoutError:
+            if deadline is None:
+                raise
+            outcome = "timeout"
+        seconds = time.perf_counter() - phase_start
+        timings["layout"] = timings.get("layout", 0.0) + seconds
+        attempts.append({"tier": tier[0], "seconds": round(seconds, 4), "outcome": outcome})
+        if outcome == "ok":
+            render_info["tier"] = tier[0]
+            return data, tiered
+    tried = ", ".join(attempt["tier"] for attempt in attempts) or "none"
+    raise RenderTimeoutError(f"layout did not finish within the {layout_budget}s budget (tiers tried: {tried})")
+
+def _positioned_source(ir, timeout, timings, render_info, layout_budget=None):
+    """Return DOT source with positions filled in, from the layout cache if possible
+
+    Layouts are cached under the structural key of the tier they were computed
+    with, so a config that needed a cheaper tier reuses that layout.
+    """
+    cache = default_cache()
+    tiers = plan_tiers(ir) if layout_budget else TIERS[:1]
+    render_info["layout"] = "cached"
+    for tier in tiers:
+        tiered = apply_tier(ir, tier)
+        positions = cache.get(structural_key(tiered))
+        if positions is not None:
+            render_info["tier"] = tier[0]
+            break
+    else:
+        layout_json, tiered = _run_layout(ir, "dot", "json0", timeout, layout_budget, timings, render_info)
+        phase_start = time.perf_counter()
+        positions = parse_layout(layout_json, tiered)
+        timings["layout"] += time.perf_counter() - phase_start
+        cache.put(structural_key(tiered), positions)
+        render_info["layout"] = "full"
+    
+    phase_start = time.perf_counter()
+    source = emit_dot(tiered, positions=positions)
+    timings["build"] = timings.get("build", 0.0) + time.perf_counter() - phase_start
+    return source
+
+def _build_with_diagrams(ir):
+    """Build the graph with diagrams Custom/Edge objects and return its DOT source"""
+    nodes = [None] * ir.node_count
+    
+    def create_nodes(members):
+        for index in members:
+            extra = {"URL": ir.node_links[index]} if index in ir.node_links else {}
+            nodes[index] = Custom(ir.node_labels[index], icon_path=ir.icon_paths[ir.node_icon[index]],
+                                  **extra)
+    
+    # Create diagram
+    with _SourceOnlyDiagram(ir.title, show=False, filename=ir.output_filename, outformat=ir.outformat,
+                            graph_attr=ir.graph_attr, node_attr=ir.node_attr,
+                            direction=ir.direction) as diagram:
+        
+        # Process top-level nodes
+        create_nodes(ir.root_nodes)
+        
+        # Process clusters and their nodes; nested Cluster contexts are entered
+        # and exited from an explicit stack instead of recursion
+        stack = [(None, cluster) for cluster in reversed(ir.root_clusters)]
+        while stack:
+            open_cluster, cluster = stack.pop()
+            if open_cluster is not None:
+                open_cluster.__exit__(None, None, None)
                 continue
-            
-            icon_path = os.path.join(icons_dir, f"{node_icon}.svg")
-            
-            # Check if icon exists
-            if not os.path.exists(icon_path):
-                print(f"⚠️ Icon not found: {icon_path}, using default server.svg")
-                icon_path = os.path.join(icons_dir, "server.svg")
-            
-            # Create label with IP address and Docker image if provided
-            display_parts = [node_label]
-            if node_ip:
-                display_parts.append(node_ip)
-            if node_docker_image:
-                display_parts.append(f"镜像: {node_docker_image}")
-            
-            display_label = "\n".join(display_parts)
-            
-            # Create the node
-            node = Custom(display_label, icon_path=icon_path)
-            node_registry[node_id] = node
+            open_cluster = Cluster(ir.cluster_labels[cluster])
+            open_cluster.__enter__()
+            create_nodes(ir.cluster_nodes[cluster])
+            stack.append((open_cluster, cluster))
+            for nested_cluster in reversed(ir.cluster_children[cluster]):
+                stack.append((None, nested_cluster))
         
-        # Recursively process nested clusters
-        for nested_cluster in cluster_def.get("clusters", []):
-            process_nested_cluster(nested_cluster, icons_dir, node_registry)
+        # Process connections
+        edge_labels = ir.edge_labels
+        for index, (source, target, style) in enumerate(zip(ir.edge_src, ir.edge_dst, ir.edge_style)):
+            edge_color, edge_style, bidirectional = ir.edge_styles[style]
+            extra = {"xlabel": edge_labels[index]} if index in edge_labels else {}
+            if bidirectional:
+                nodes[source] - Edge(color=edge_color, style=edge_style, **extra) - nodes[target]
+            else:
+                nodes[source] >> Edge(color=edge_color, style=edge_style, **extra) >> nodes[target]
+    
+    return diagram.dot.source
 
 if __name__ == "__main__":
     if len(sys.argv) != 2:
@@ -199,5 +355,5 @@ if __name__ == "__main__":
         sys.exit(1)
     
     json_path = sys.argv[1]
-    config = load_json_config(json_path)
-    generate_diagram(config) 
\ No newline at end of file
+    config = load_json_topology(json_path)
+    generate_diagram(config)
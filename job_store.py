@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+import os
+import re
+import json
+import time
+import threading
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStore:
+    """异步渲染任务存储接口
+
+    任务以字典表示，至少包含 id、status、created_at 字段。完成或失败的任务
+    在 finished_at 之后保留 ttl 秒，过期后由 purge_expired 清理。
+    """
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+
+    def create(self, job):
+        """保存新任务"""
+        raise NotImplementedError
+
+    def get(self, job_id):
+        """返回任务的副本，任务不存在或已过期时返回None"""
+        raise NotImplementedError
+
+    def update(self, job_id, **fields):
+        """更新任务字段，任务不存在时忽略"""
+        raise NotImplementedError
+
+    def delete(self, job_id):
+        """删除任务"""
+        raise NotImplementedError
+
+    def purge_expired(self, now=None):
+        """删除所有过期任务并返回它们，调用方负责清理结果文件"""
+        raise NotImplementedError
+
+    def _is_expired(self, job, now):
+        finished_at = job.get("finished_at")
+        return finished_at is not None and now - finished_at > self.ttl
+
+
+class InMemoryJobStore(JobStore):
+    """进程内的任务存储，适用于单进程部署和测试"""
+
+    def __init__(self, ttl=3600):
+        super().__init__(ttl)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or self._is_expired(job, time.time()):
+                return None
+            return dict(job)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def delete(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def purge_expired(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if self._is_expired(job, now)]
+            return [self._jobs.pop(job_id) for job_id in expired]
+
+
+class FileJobStore(JobStore):
+    """保存在共享目录中的任务存储，适用于多进程部署（start_service.py --production）
+
+    每个任务一个 <任务ID>.json 文件，先写临时文件再原子替换，任一工作进程都能
+    查询其它进程提交的任务，工作进程回收或退出后任务记录仍然保留。任务只由提交
+    它的进程更新，其它进程只读取和清理过期记录。
+    """
+
+    _ID = re.compile(r"[0-9A-Za-z_-]+")
+
+    def __init__(self, directory, ttl=3600):
+        super().__init__(ttl)
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id):
+        if not self._ID.fullmatch(str(job_id)):
+            return None
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _read(self, path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, job):
+        path = self._path(job["id"])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def create(self, job):
+        with self._lock:
+            self._write(job)
+
+    def get(self, job_id):
+        path = self._path(job_id)
+        job = self._read(path) if path else None
+        if job is None or self._is_expired(job, time.time()):
+            return None
+        return job
+
+    def update(self, job_id, **fields):
+        path = self._path(job_id)
+        if path is None:
+            return
+        with self._lock:
+            job = self._read(path)
+            if job is not None:
+                job.update(fields)
+                self._write(job)
+
+    def delete(self, job_id):
+        path = self._path(job_id)
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self, now=None):
+        now = time.time() if now is None else now
+        expired = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                # 记录最后一次写入不早于 finished_at，修改时间在TTL内的不必读取
+                if now - os.path.getmtime(path) <= self.ttl:
+                    continue
+            except OSError:
+                continue
+            job = self._read(path)
+            if job is None or not self._is_expired(job, now):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue  # 已被其它工作进程清理
+            expired.append(job)
+        return expired
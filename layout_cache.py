@@ -0,0 +1,149 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from array import array
+from collections import OrderedDict, defaultdict, deque
+
+# Attributes that only change colours/fonts, never node positions or edge routes
+STYLE_ONLY_ATTRS = {"bgcolor", "color", "fontcolor", "fillcolor", "pencolor", "style"}
+
+
+def _layout_attrs(attrs):
+    return sorted((str(k), str(v)) for k, v in attrs.items() if k not in STYLE_ONLY_ATTRS)
+
+
+def structural_key(ir):
+    """Hash everything in a TopologyIR that can move a node or reroute an edge.
+
+    Covers node order and cluster membership, node heights (label line
+    count), the cluster tree and its labels, connection endpoints, direction
+    and labels, the graph direction and layout-affecting graph/node attrs.
+    Edge colour/style and other STYLE_ONLY_ATTRS are left out, so configs
+    that differ only in styling share a layout. Node label text is included
+    only when nodes are not fixed-size.
+    """
+    h = hashlib.sha256()
+    fixedsize = str(ir.node_attr.get("fixedsize", "")).lower() == "true"
+    header = [ir.title, ir.direction, _layout_attrs(ir.graph_attr), _layout_attrs(ir.node_attr),
+              ir.node_count, ir.cluster_labels]
+    h.update(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+    h.update(ir.node_cluster.tobytes())
+    h.update(array("i", (label.count("\n") for label in ir.node_labels)).tobytes())
+    if not fixedsize:
+        h.update("\0".join(ir.node_labels).encode("utf-8"))
+    h.update(ir.cluster_parent.tobytes())
+    h.update(ir.edge_src.tobytes())
+    h.update(ir.edge_dst.tobytes())
+    bidirectional = [style[2] for style in ir.edge_styles]
+    h.update(bytes(bidirectional[style] for style in ir.edge_style))
+    h.update(json.dumps(sorted(ir.edge_labels.items()), ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+def parse_layout(layout_json, ir):
+    """Turn graphviz -Tjson0 output for emit_dot(ir) into per-index positions.
+
+    Returns a dict with "graph" (bb/lp), "nodes" (pos/width/height per node
+    index), "clusters" (bb/lp per cluster index) and "edges" (pos per edge
+    index), which emit_dot accepts as positions=.
+    """
+    data = json.loads(layout_json)
+    by_gvid = {}
+    node_layout = {}
+    cluster_layout = {}
+    for obj in data.get("objects", []):
+        by_gvid[obj.get("_gvid")] = obj.get("name")
+        name = obj.get("name", "")
+        if name.startswith("cluster"):
+            cluster_layout[name] = {k: obj[k] for k in ("bb", "lp") if k in obj}
+        elif "pos" in obj:
+            node_layout[name] = {k: obj[k] for k in ("pos", "width", "height") if k in obj}
+
+    edge_routes = defaultdict(deque)
+    for edge in data.get("edges", []):
+        if "pos" in edge:
+            edge_routes[(by_gvid.get(edge["tail"]), by_gvid.get(edge["head"]))].append(edge["pos"])
+
+    nodes = [node_layout.get(f"n{index}", {}) for index in range(ir.node_count)]
+    clusters = [cluster_layout.get(f"cluster_{label}", {}) for label in ir.cluster_labels]
+    edges = []
+    for source, target in zip(ir.edge_src, ir.edge_dst):
+        routes = edge_routes.get((f"n{source}", f"n{target}"))
+        edges.append(routes.popleft() if routes else None)
+    graph = {k: data[k] for k in ("bb", "lp") if k in data}
+    return {"graph": graph, "nodes": nodes, "clusters": clusters, "edges": edges}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_cache():
+    """Process-wide LayoutCache; set LAYOUT_CACHE_DIR to share layouts between processes"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LayoutCache(
+                max_entries=int(os.environ.get("LAYOUT_CACHE_MAX_ENTRIES", "64")),
+                cache_dir=os.environ.get("LAYOUT_CACHE_DIR") or None)
+        return _default_cache
+
+
+class LayoutCache:
+    """LRU cache of computed layouts keyed by structural_key.
+
+    Layouts are kept in memory and, when a directory is configured, also
+    stored as JSON files so several worker processes can share them.
+    """
+
+    def __init__(self, max_entries=64, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key):
+        with self._lock:
+            layout = self._entries.get(key)
+            if layout is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return layout
+        if self.cache_dir:
+            try:
+                with open(os.path.join(self.cache_dir, f"{key}.json"), "r", encoding="utf-8") as f:
+                    layout = json.load(f)
+            except (OSError, ValueError):
+                layout = None
+        with self._lock:
+            if layout is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store_locked(key, layout)
+            return layout
+
+    def put(self, key, layout):
+        with self._lock:
+            self._store_locked(key, layout)
+        if self.cache_dir:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(layout, f)
+            os.replace(tmp_path, os.path.join(self.cache_dir, f"{key}.json"))
+
+    def _store_locked(self, key, layout):
+        self._entries[key] = layout
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
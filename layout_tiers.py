@@ -0,0 +1,68 @@
+import os
+import copy
+
+# Layout tiers from best-looking to cheapest: name, graphviz engine and the
+# graph attributes that replace the config's. "full" lays the config out as
+# written (ortho routing by default); the others trade edge routing quality
+# for speed, and sfdp drops the hierarchical layout altogether.
+TIERS = (
+    ("full", "dot", {}),
+    ("polyline", "dot", {"splines": "polyline"}),
+    ("line", "dot", {"splines": "line", "mclimit": "0.2"}),
+    ("sfdp", "sfdp", {"splines": "line", "overlap": "false"}),
+)
+TIER_NAMES = tuple(name for name, _, _ in TIERS)
+
+# Largest graph (nodes + edges) each tier is tried on first; bigger graphs
+# start at a cheaper tier. Tune from the diagram_layout_tier_seconds metric
+# with LAYOUT_TIER_LIMITS, e.g. "full=600,polyline=4000,line=20000".
+DEFAULT_TIER_LIMITS = {"full": 600, "polyline": 4000, "line": 20000}
+
+# Share of the remaining budget a tier may use before falling back to the
+# next one; the last tier gets whatever is left
+TIER_SHARE = 0.5
+
+
+def parse_tier_limits(spec):
+    """Parse "tier=size,..." into a limits dict, starting from DEFAULT_TIER_LIMITS"""
+    limits = dict(DEFAULT_TIER_LIMITS)
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, size = item.partition("=")
+        if name not in limits:
+            raise ValueError(f'unknown layout tier "{name}", expected one of {", ".join(DEFAULT_TIER_LIMITS)}')
+        limits[name] = int(size)
+    return limits
+
+
+TIER_LIMITS = parse_tier_limits(os.environ.get("LAYOUT_TIER_LIMITS"))
+
+
+def plan_tiers(ir, limits=None):
+    """Return the tiers to try for ir in order, skipping those too slow for its size
+
+    limits defaults to ir.tier_limits and then TIER_LIMITS; empty limits
+    always start at "full", so the budget only triggers fallbacks on timeout.
+    """
+    if limits is None:
+        limits = TIER_LIMITS if ir.tier_limits is None else ir.tier_limits
+    size = ir.node_count + ir.edge_count
+    for start, (name, _, _) in enumerate(TIERS):
+        if name not in limits or size <= limits[name]:
+            return TIERS[start:]
+    return TIERS[-1:]
+
+
+def apply_tier(ir, tier):
+    """Return ir with the tier's graph attributes; the "full" tier returns ir itself"""
+    _, _, graph_attr = tier
+    if not graph_attr:
+        return ir
+    tiered = copy.copy(ir)
+    tiered.graph_attr = dict(ir.graph_attr, **graph_attr)
+    return tiered
+
+
+def engine_args(tier):
+    """Extra graphviz command line options for the tier's layout engine"""
+    _, engine, _ = tier
+    return () if engine == "dot" else (f"-K{engine}",)
@@ -0,0 +1,211 @@
+import os
+
+from topology_ir import ICONS_DIR, NO_CLUSTER, TopologyIR
+
+# Icon used for the summary node that stands in for a collapsed cluster
+SUMMARY_ICON = "switch"
+
+LOD_OPTIONS = ("max_depth", "max_cluster_nodes", "expand")
+
+
+def summary_node_id(cluster_label):
+    """Node id given to the summary node of a collapsed cluster"""
+    return f"cluster:{cluster_label}"
+
+
+def collapse_clusters(ir, max_depth=None, max_cluster_nodes=None, expand=(), summary_nodes=None):
+    """Return a TopologyIR in which large or deep clusters are single summary nodes.
+
+    A cluster is collapsed when its depth is at least max_depth (0 collapses
+    every top-level cluster) or when it holds more than max_cluster_nodes
+    nodes including nested clusters. Clusters named in expand (by name or
+    full label) and their ancestors are always shown.
+
+    A summary node lists the member node, sub-cluster and internal link
+    counts, and takes over the members' link when they all link to the same
+    URL. Connections into a collapsed cluster are merged per pair of
+    visible endpoints and labelled with the number of merged links, so the
+    graph handed to graphviz only grows with what is shown. If a
+    summary_nodes dict is given, it is filled with the summary node index of
+    each collapsed cluster (keyed by cluster index in ir), since clusters
+    with the same label get the same summary node id.
+    """
+    if isinstance(expand, str):
+        expand = [expand]
+    expand = set(expand or ())
+
+    cluster_count = ir.cluster_count
+    parent = ir.cluster_parent
+
+    # Clusters are stored in pre-order, so children always come after their parent
+    total_nodes = [len(members) for members in ir.cluster_nodes]
+    total_clusters = [0] * cluster_count
+    for cluster in range(cluster_count - 1, -1, -1):
+        if parent[cluster] != NO_CLUSTER:
+            total_nodes[parent[cluster]] += total_nodes[cluster]
+            total_clusters[parent[cluster]] += total_clusters[cluster] + 1
+
+    expanded = set()
+    for cluster in range(cluster_count):
+        if ir.cluster_names[cluster] in expand or ir.cluster_labels[cluster] in expand:
+            while cluster != NO_CLUSTER and cluster not in expanded:
+                expanded.add(cluster)
+                cluster = parent[cluster]
+
+    # owner[c] is the collapsed cluster that swallows c, or NO_CLUSTER if c is shown
+    owner = [NO_CLUSTER] * cluster_count
+    for cluster in range(cluster_count):
+        up = parent[cluster]
+        if up != NO_CLUSTER and owner[up] != NO_CLUSTER:
+            owner[cluster] = owner[up]
+        elif cluster not in expanded and (
+                (max_depth is not None and ir.cluster_depth[cluster] >= max_depth)
+                or (max_cluster_nodes is not None and total_nodes[cluster] > max_cluster_nodes)):
+            owner[cluster] = cluster
+
+    if all(o == NO_CLUSTER for o in owner):
+        return ir
+
+    out = TopologyIR()
+    for attr in ("title", "direction", "outformat", "output_filename", "backend", "reuse_layout",
+                 "level_of_detail", "layout_budget", "tier_limits", "query", "subnets", "graph_attr",
+                 "node_attr"):
+        setattr(out, attr, getattr(ir, attr))
+    out.warnings = list(ir.warnings)
+    out.diagnostics = list(ir.diagnostics)
+
+    node_map = [0] * ir.node_count
+    summary_node = {}
+    icon_ids = {}
+
+    def icon_for(name, path):
+        icon = icon_ids.get(name)
+        if icon is None:
+            icon = icon_ids[name] = len(out.icon_paths)
+            out.icon_names.append(name)
+            out.icon_paths.append(path)
+        return icon
+
+    def copy_nodes(members, cluster):
+        new_members = []
+        for index in members:
+            new_index = len(out.node_ids)
+            out.node_ids.append(ir.node_ids[index])
+            out.node_labels.append(ir.node_labels[index])
+            out.node_ips.append(ir.node_ips[index])
+            out.node_icon.append(icon_for(ir.icon_names[ir.node_icon[index]],
+                                          ir.icon_paths[ir.node_icon[index]]))
+            out.node_cluster.append(cluster)
+            out.node_index[ir.node_ids[index]] = new_index
+            if index in ir.node_links:
+                out.node_links[new_index] = ir.node_links[index]
+            node_map[index] = new_index
+            new_members.append(new_index)
+        return new_members
+
+    def add_summary(collapsed, cluster):
+        index = len(out.node_ids)
+        node_id = summary_node_id(ir.cluster_labels[collapsed])
+        out.node_ids.append(node_id)
+        out.node_labels.append("")  # filled in once internal links are counted
+        out.node_ips.append("")
+        out.node_icon.append(icon_for(SUMMARY_ICON, os.path.join(ICONS_DIR, f"{SUMMARY_ICON}.svg")))
+        out.node_cluster.append(cluster)
+        out.node_index[node_id] = index
+        summary_node[collapsed] = index
+        if summary_nodes is not None:
+            summary_nodes[collapsed] = index
+        return index
+
+    new_cluster = {}
+    out.root_nodes = copy_nodes(ir.root_nodes, NO_CLUSTER)
+    for cluster in ir.root_clusters:
+        if owner[cluster] != NO_CLUSTER:
+            out.root_nodes.append(add_summary(cluster, NO_CLUSTER))
+
+    for cluster in range(cluster_count):
+        if owner[cluster] != NO_CLUSTER:
+            continue
+        index = new_cluster[cluster] = len(out.cluster_labels)
+        up = parent[cluster]
+        new_parent = NO_CLUSTER if up == NO_CLUSTER else new_cluster[up]
+        out.cluster_names.append(ir.cluster_names[cluster])
+        out.cluster_labels.append(ir.cluster_labels[cluster])
+        out.cluster_parent.append(new_parent)
+        out.cluster_depth.append(ir.cluster_depth[cluster])
+        out.cluster_children.append([])
+        members = copy_nodes(ir.cluster_nodes[cluster], index)
+        for child in ir.cluster_children[cluster]:
+            if owner[child] != NO_CLUSTER:
+                members.append(add_summary(child, index))
+        out.cluster_nodes.append(members)
+        if new_parent == NO_CLUSTER:
+            out.root_clusters.append(index)
+        else:
+            out.cluster_children[new_parent].append(index)
+
+    # Nodes inside collapsed clusters are represented by their summary node
+    for collapsed, index in summary_node.items():
+        links = set()
+        stack = [collapsed]
+        while stack:
+            cluster = stack.pop()
+            for member in ir.cluster_nodes[cluster]:
+                node_map[member] = index
+                if member in ir.node_links:
+                    links.add(ir.node_links[member])
+            stack.extend(ir.cluster_children[cluster])
+        if len(links) == 1:
+            out.node_links[index] = links.pop()
+
+    hidden = [cluster != NO_CLUSTER and owner[cluster] != NO_CLUSTER for cluster in ir.node_cluster]
+    internal_links = {}
+    merged = {}  # (source, target) -> [link count, style]
+    for edge, (source, target, style) in enumerate(zip(ir.edge_src, ir.edge_dst, ir.edge_style)):
+        new_source, new_target = node_map[source], node_map[target]
+        if not hidden[source] and not hidden[target]:
+            if edge in ir.edge_labels:
+                out.edge_labels[len(out.edge_src)] = ir.edge_labels[edge]
+            out.edge_src.append(new_source)
+            out.edge_dst.append(new_target)
+            out.edge_style.append(style)
+        elif new_source == new_target:
+            internal_links[new_source] = internal_links.get(new_source, 0) + 1
+        else:
+            entry = merged.get((new_source, new_target))
+            if entry is None:
+                merged[(new_source, new_target)] = [1, style]
+            else:
+                entry[0] += 1
+    out.edge_styles = list(ir.edge_styles)
+    for (source, target), (count, style) in merged.items():
+        if count > 1:
+            out.edge_labels[len(out.edge_src)] = f"×{count}"
+        out.edge_src.append(source)
+        out.edge_dst.append(target)
+        out.edge_style.append(style)
+
+    for collapsed, index in summary_node.items():
+        lines = [ir.cluster_labels[collapsed], f"{total_nodes[collapsed]} 个节点"]
+        if total_clusters[collapsed]:
+            lines[-1] += f", {total_clusters[collapsed]} 个子区域"
+        if internal_links.get(index):
+            lines.append(f"{internal_links[index]} 条内部连线")
+        out.node_labels[index] = "\n".join(lines)
+    return out
+
+
+def apply_level_of_detail(ir, options):
+    """Apply a level_of_detail option dict (see LOD_OPTIONS) to a TopologyIR"""
+    if not options:
+        return ir
+    if not isinstance(options, dict):
+        raise ValueError("level_of_detail must be an object")
+    unknown = set(options) - set(LOD_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown level_of_detail option(s): {', '.join(sorted(unknown))}")
+    for key in ("max_depth", "max_cluster_nodes"):
+        value = options.get(key)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise ValueError(f"level_of_detail.{key} must be a non-negative integer")
+    return collapse_clusters(ir, **options)
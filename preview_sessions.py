@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+import os
+import time
+import uuid
+import hashlib
+import threading
+
+from render_pool import PoolBusyError
+
+
+class PreviewTicket:
+    """一次草图预览渲染：所属会话、代号、Graphviz进程，以及是否已被同一会话的新请求取代"""
+
+    __slots__ = ("session", "token", "proc", "superseded")
+
+    def __init__(self, session):
+        self.session = session
+        self.token = uuid.uuid4().hex
+        self.proc = None
+        self.superseded = False
+
+
+class PreviewSessions:
+    """草图预览的会话表，每个会话只保留最新的一次渲染
+
+    编辑器连续修改配置时，浏览器会中止旧的请求，但服务端察觉不到连接已断开。
+    因此同一会话的新请求到达时，仍在进行的旧渲染被标记为已取代，其Graphviz进程
+    立即终止，不再占用CPU。max_in_flight 限制同时进行的预览渲染数。
+
+    多进程部署（start_service.py --production）时同一会话的请求可能落在不同的
+    工作进程。给出 state_dir 时，每个会话最新一次渲染的代号写入该目录（各工作
+    进程共享），后台线程每隔 poll_interval 秒检查本进程中进行的渲染，代号已被
+    其它进程更新的立即终止并按已取代处理。
+    """
+
+    def __init__(self, max_in_flight, state_dir=None, poll_interval=0.1):
+        self.max_in_flight = max_in_flight
+        self.state_dir = state_dir
+        self.poll_interval = poll_interval
+        self.renders = 0
+        self.superseded = 0
+        self._in_flight = 0
+        self._latest = {}  # 会话ID -> 本进程中最新的 PreviewTicket
+        self._lock = threading.Lock()
+        self._monitor_pid = None
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+
+    def begin(self, session):
+        """登记一次新的预览渲染并取代同一会话中的上一次；并发已满时抛出 PoolBusyError"""
+        with self._lock:
+            previous = self._latest.pop(session, None)
+            if previous is not None:
+                self._cancel_locked(previous)
+            if self._in_flight >= self.max_in_flight:
+                raise PoolBusyError(retry_after=1)
+            ticket = PreviewTicket(session)
+            self._latest[session] = ticket
+            self._in_flight += 1
+            self.renders += 1
+        if self.state_dir:
+            self._publish(ticket)
+            self._ensure_monitor()
+        return ticket
+
+    def started(self, ticket, proc):
+        """run_graphviz 的回调：记录进程，渲染在启动前已被取代时立即终止"""
+        with self._lock:
+            ticket.proc = proc
+            if ticket.superseded:
+                proc.kill()
+
+    def finish(self, ticket):
+        """渲染结束（成功、失败或被取消）后调用，返回该渲染是否仍是会话中最新的一次"""
+        current = not ticket.superseded and (not self.state_dir or self._published(ticket.session) == ticket.token)
+        with self._lock:
+            if not ticket.superseded:
+                self._in_flight -= 1  # 被取代的渲染在取消时已经释放了名额
+                if not current:
+                    ticket.superseded = True  # 渲染完成前已被其它工作进程中的新请求取代
+                    self.superseded += 1
+            ticket.proc = None
+            if self._latest.get(ticket.session) is ticket:
+                del self._latest[ticket.session]
+        if current and self.state_dir:
+            self._unpublish(ticket)
+        return current
+
+    def _cancel_locked(self, ticket):
+        ticket.superseded = True
+        self.superseded += 1
+        self._in_flight -= 1
+        if ticket.proc is not None and ticket.proc.poll() is None:
+            ticket.proc.kill()
+
+    def _state_path(self, session):
+        return os.path.join(self.state_dir, hashlib.sha256(session.encode("utf-8")).hexdigest()[:32])
+
+    def _publish(self, ticket):
+        """把会话最新一次渲染的代号写入共享目录（先写临时文件再替换，读取方不会读到半个代号）"""
+        path = self._state_path(ticket.session)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(ticket.token)
+        os.replace(tmp_path, path)
+
+    def _published(self, session):
+        try:
+            with open(self._state_path(session)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _unpublish(self, ticket):
+        """会话最新的渲染结束后删除其代号文件，避免目录随会话数增长"""
+        if self._published(ticket.session) == ticket.token:
+            try:
+                os.remove(self._state_path(ticket.session))
+            except OSError:
+                pass
+
+    def _ensure_monitor(self):
+        # 按进程启动：fork出的工作进程不会继承主进程中的线程
+        with self._lock:
+            if self._monitor_pid == os.getpid():
+                return
+            self._monitor_pid = os.getpid()
+        threading.Thread(target=self._monitor, name="preview-sessions", daemon=True).start()
+
+    def _monitor(self):
+        """终止已被其它工作进程中的新请求取代的渲染"""
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                tickets = list(self._latest.values())
+            for ticket in tickets:
+                token = self._published(ticket.session)
+                if token is None or token == ticket.token:
+                    continue
+                with self._lock:
+                    if self._latest.get(ticket.session) is ticket:
+                        del self._latest[ticket.session]
+                        self._cancel_locked(ticket)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": self._in_flight, "renders": self.renders, "superseded": self.superseded,
+                    "max_in_flight": self.max_in_flight}
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+import os
+import json
+import hashlib
+import threading
+import tempfile
+from collections import OrderedDict
+
+# 图标内容哈希的进程内缓存: 路径 -> (mtime, size, sha256)
+_icon_digests = {}
+_icon_digests_lock = threading.Lock()
+
+
+def icon_digest(icon_path):
+    """计算图标文件的内容哈希，按 mtime/size 缓存避免重复读取"""
+    try:
+        st = os.stat(icon_path)
+    except OSError:
+        return "missing"
+    with _icon_digests_lock:
+        memo = _icon_digests.get(icon_path)
+        if memo and memo[0] == st.st_mtime_ns and memo[1] == st.st_size:
+            return memo[2]
+    with open(icon_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with _icon_digests_lock:
+        _icon_digests[icon_path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def config_cache_key(config, ir):
+    """根据规范化配置和引用图标的内容哈希计算缓存键
+
+    键与输出格式无关（格式体现在缓存条目名 ``<key>.<format>`` 中），同一配置的
+    各种格式、缩略图和已定位的布局共用一个键。ir 为同一配置编译出的 TopologyIR，
+    用于获取已解析的图标路径。
+    """
+    canonical = {k: v for k, v in config.items() if k not in ("output_filename", "outformat")}
+    payload = json.dumps(canonical, sort_keys=True, ensure_ascii=False,
+                         separators=(",", ":"), default=str)
+
+    h = hashlib.sha256()
+    h.update(payload.encode("utf-8"))
+
+    for icon_name, icon_path in sorted(zip(ir.icon_names, ir.icon_paths), key=lambda item: str(item[0])):
+        h.update(b"\0")
+        h.update(str(icon_name).encode("utf-8"))
+        h.update(icon_digest(icon_path).encode("ascii"))
+    return h.hexdigest()
+
+
+class RenderCache:
+    """按内容寻址的渲染结果缓存（LRU淘汰，带容量上限与命中统计）
+
+    缓存文件以 ``<key>.<format>`` 存放在 cache_dir 中，写入时先写临时文件再
+    原子替换，因此多个Flask工作进程可以共享同一个目录：某个进程渲染的结果
+    其它进程也能直接命中，被其它进程淘汰的文件则按未命中处理。
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, max_entries=1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # 文件名 -> 字节数，按最近使用排序
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """启动时按修改时间载入磁盘上已有的缓存文件"""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            found.append((st.st_mtime, name, st.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    @staticmethod
+    def _entry_name(key, outformat):
+        return f"{key}.{outformat}"
+
+    def path_for(self, key, outformat):
+        return os.path.join(self.cache_dir, self._entry_name(key, outformat))
+
+    def get(self, key, outformat, record=True):
+        """查找缓存，命中时返回文件路径，否则返回None
+
+        record=False 用于内部探查（布局、压缩版本、派生缩略图用的完整尺寸结果），
+        不计入命中统计，hit_ratio 只反映请求所要结果的查找。
+        """
+        name = self._entry_name(key, outformat)
+        path = os.path.join(self.cache_dir, name)
+        with self._lock:
+            if os.path.exists(path):
+                if name in self._entries:
+                    self._entries.move_to_end(name)
+                else:
+                    # 其它工作进程写入的结果
+                    size = os.path.getsize(path)
+                    self._entries[name] = size
+                    self._total_bytes += size
+                    self._evict_locked()
+                if record:
+                    self.hits += 1
+                return path
+            if name in self._entries:
+                # 文件已被其它工作进程淘汰
+                self._total_bytes -= self._entries.pop(name)
+            if record:
+                self.misses += 1
+            return None
+
+    def record_hit(self):
+        """请求的结果由内部探查（如压缩版本）直接命中时，补记一次命中"""
+        with self._lock:
+            self.hits += 1
+
+    def put_file(self, key, outformat, src_path):
+        """把已渲染好的文件移入缓存，返回缓存中的文件路径"""
+        path = self.path_for(key, outformat)
+        os.replace(src_path, path)
+        self._record(key, outformat, os.path.getsize(path))
+        return path
+
+    def put_bytes(self, key, outformat, data):
+        """把渲染结果字节写入缓存，返回缓存中的文件路径"""
+        path = self.path_for(key, outformat)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._record(key, outformat, len(data))
+        return path
+
+    def _record(self, key, outformat, size):
+        name = self._entry_name(key, outformat)
+        with self._lock:
+            if name in self._entries:
+                self._total_bytes -= self._entries.pop(name)
+            self._entries[name] = size
+            self._total_bytes += size
+            self._evict_locked()
+
+    def _evict_locked(self):
+        # 至少保留最新的一个条目，即使它本身超过了容量上限
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes):
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
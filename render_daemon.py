@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+"""本地渲染守护进程
+
+常驻后台并保持已导入diagrams/graphviz的渲染进程，命令行工具通过Unix套接字把
+渲染请求交给它，省去每次运行的解释器启动和依赖导入开销:
+
+    python render_daemon.py &                         # 启动守护进程
+    python generate_diagram.py config.yaml --daemon   # 交给守护进程渲染
+    python render_daemon.py --status                  # 查看状态
+    python render_daemon.py --stop                    # 停止
+
+协议为每个连接一问一答，请求和响应各是一行JSON。
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+
+# 默认套接字路径，按用户区分；可通过环境变量 DIAGRAM_DAEMON_SOCKET 修改
+DEFAULT_SOCKET = os.environ.get(
+    'DIAGRAM_DAEMON_SOCKET',
+    os.path.join(tempfile.gettempdir(), f"network-diagram-{os.getuid() if hasattr(os, 'getuid') else 'user'}.sock"))
+
+
+class DaemonUnavailable(Exception):
+    """守护进程未运行或无法连接，调用方应回退到进程内渲染"""
+
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _receive(sock):
+    buffer = b""
+    while not buffer.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        buffer += chunk
+    if not buffer:
+        raise ConnectionError("守护进程未返回响应")
+    return json.loads(buffer)
+
+
+def request(message, socket_path=None, timeout=None):
+    """向守护进程发送一个请求并返回响应；无法连接时抛出 DaemonUnavailable"""
+    socket_path = socket_path or DEFAULT_SOCKET
+    if not hasattr(socket, 'AF_UNIX'):
+        raise DaemonUnavailable("当前系统不支持Unix套接字")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonUnavailable(str(e))
+        sock.settimeout(timeout)
+        _send(sock, message)
+        return _receive(sock)
+    finally:
+        sock.close()
+
+
+def render_via_daemon(config_path, overrides=None, level_of_detail=None, socket_path=None, timeout=None):
+    """请求守护进程渲染配置文件，返回输出文件路径
+
+    相对路径（配置文件和输出文件名）都按当前工作目录解析。守护进程未运行时抛出
+    DaemonUnavailable，渲染失败时抛出 RuntimeError。
+    """
+    response = request({
+        "op": "render",
+        "config_path": os.path.abspath(config_path),
+        "cwd": os.getcwd(),
+        "overrides": overrides or {},
+        "level_of_detail": level_of_detail or {},
+        "timeout": timeout,
+    }, socket_path)
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error") or "守护进程渲染失败")
+    return response["output"]
+
+
+class RenderDaemon:
+    """在Unix套接字上接收渲染请求，配置在守护进程内流式加载，渲染交给预热好的进程池
+
+    每个连接一个线程，多个命令行进程可以同时提交，并发度由进程池大小决定。
+    idle_timeout 秒内没有请求时自动退出（0表示不退出）。
+    """
+
+    def __init__(self, socket_path=None, workers=None, timeout=None, idle_timeout=0):
+        from render_pool import RenderPool
+        self.socket_path = socket_path or DEFAULT_SOCKET
+        self.pool = RenderPool(workers=workers, queue_depth=1024, timeout=timeout)
+        self.idle_timeout = idle_timeout
+        self.started = time.time()
+        self.renders = 0
+        self.failures = 0
+        self._last_active = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _bind(self):
+        # 已有守护进程在运行则退出；残留的套接字文件直接删除
+        try:
+            request({"op": "ping"}, self.socket_path, timeout=2)
+        except DaemonUnavailable:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        else:
+            raise SystemExit(f"渲染守护进程已在运行: {self.socket_path}")
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)  # 套接字只允许当前用户访问
+        try:
+            listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        listener.listen(128)
+        listener.settimeout(1)
+        return listener
+
+    def serve(self):
+        listener = self._bind()
+        start = time.perf_counter()
+        self.pool.warm_up()
+        print(f"渲染守护进程已就绪: {self.socket_path}（{self.pool.workers}个渲染进程，"
+              f"预热{time.perf_counter() - start:.2f}秒）", flush=True)
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    with self._lock:
+                        idle = time.monotonic() - self._last_active
+                        busy = self.pool.stats()["in_flight"]
+                    if self.idle_timeout and not busy and idle > self.idle_timeout:
+                        print(f"空闲超过{self.idle_timeout}秒，守护进程退出", flush=True)
+                        break
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.pool.shutdown()
+
+    def _handle(self, conn):
+        with conn:
+            with self._lock:
+                self._last_active = time.monotonic()
+            try:
+                message = _receive(conn)
+                op = message.get("op")
+                if op == "ping":
+                    response = {"ok": True, **self.status()}
+                elif op == "stop":
+                    self._stop.set()
+                    response = {"ok": True}
+                elif op == "render":
+                    response = self._render(message)
+                else:
+                    response = {"ok": False, "error": f"未知操作: {op}"}
+            except Exception as e:
+                response = {"ok": False, "error": str(e) or type(e).__name__}
+            try:
+                _send(conn, response)
+            except OSError:
+                pass  # 客户端已断开
+            with self._lock:
+                self._last_active = time.monotonic()
+
+    def _render(self, message):
+        from config_stream import load_topology
+        start = time.perf_counter()
+        overrides = dict(message.get("overrides") or {})
+        try:
+            topology = load_topology(message["config_path"], overrides=overrides)
+            if message.get("level_of_detail"):
+                topology.level_of_detail = dict(topology.level_of_detail or {}, **message["level_of_detail"])
+            output = os.path.join(message.get("cwd") or os.getcwd(),
+                                  f"{topology.output_filename}.{topology.outformat}")
+            data = self.pool.render(topology, timeout=message.get("timeout"))
+            if not data["data"]:
+                raise RuntimeError("图表生成失败")
+            # 先写临时文件再替换，读取方不会看到写了一半的图
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output) or ".", suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data["data"])
+            os.replace(tmp_path, output)
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        with self._lock:
+            self.renders += 1
+        return {"ok": True, "output": output, "seconds": round(time.perf_counter() - start, 3)}
+
+    def status(self):
+        with self._lock:
+            return {"pid": os.getpid(), "socket": self.socket_path, "uptime": round(time.time() - self.started, 1),
+                    "renders": self.renders, "failures": self.failures, "pool": self.pool.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地渲染守护进程，供 generate_diagram.py --daemon 使用')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f'Unix套接字路径（默认 {DEFAULT_SOCKET}）')
+    parser.add_argument('--workers', type=int, help='渲染进程数（默认CPU核数）')
+    parser.add_argument('--timeout', type=float, default=120, help='单次Graphviz渲染的超时秒数')
+    parser.add_argument('--idle-timeout', type=float, default=0, help='空闲多少秒后自动退出，0表示不退出')
+    parser.add_argument('--status', action='store_true', help='查看正在运行的守护进程状态')
+    parser.add_argument('--stop', action='store_true', help='停止正在运行的守护进程')
+    args = parser.parse_args()
+
+    if args.status or args.stop:
+        try:
+            response = request({"op": "stop" if args.stop else "ping"}, args.socket, timeout=10)
+        except DaemonUnavailable:
+            print(f"渲染守护进程未运行: {args.socket}")
+            sys.exit(1)
+        print("守护进程已停止" if args.stop else json.dumps(response, ensure_ascii=False, indent=2))
+        return
+
+    if not hasattr(socket, 'AF_UNIX'):
+        print("❌ 当前系统不支持Unix套接字，无法启动守护进程")
+        sys.exit(1)
+    RenderDaemon(args.socket, args.workers, args.timeout, args.idle_timeout).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+import os
+import math
+import time
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from generate_from_json import RenderTimeoutError
+
+
+class PoolBusyError(Exception):
+    """渲染队列已满，调用方应在 retry_after 秒后重试"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"渲染队列已满，请在{retry_after}秒后重试")
+        self.retry_after = retry_after
+
+
+def _warm_worker():
+    """工作进程初始化：预先导入渲染依赖，避免首个请求承担导入开销"""
+    import diagrams  # noqa: F401
+    import diagrams.custom  # noqa: F401
+    import generate_from_json  # noqa: F401
+
+
+def _ping():
+    return os.getpid()
+
+
+@contextlib.contextmanager
+def _profiled(profile_path):
+    """指定 profile_path 时用 cProfile 记录代码块，结束后把统计数据写入该文件
+
+    只覆盖工作进程内的Python代码，Graphviz子进程的耗时体现在 layout 阶段。
+    """
+    if not profile_path:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+
+
+def _render_job(topology, timeout, profile_path=None):
+    """在工作进程中执行一次内存渲染，返回图像字节、开始时间、各阶段耗时、布局路径和布局档位
+
+    profile_path 见 _profiled。
+    """
+    from generate_from_json import generate_diagram
+    timings = {}
+    render_info = {}
+    started_at = time.time()
+    with _profiled(profile_path):
+        data = generate_diagram(topology, timeout=timeout, strict=True, timings=timings, in_memory=True,
+                                render_info=render_info)
+    return {"data": data, "started_at": started_at, "timings": timings,
+            "layout": render_info.get("layout"), "tier": render_info.get("tier"),
+            "attempts": render_info.get("attempts", []), "query": render_info.get("query")}
+
+
+def _render_formats_job(topology, formats, timeout, positioned=None, profile_path=None):
+    """在工作进程中只做一次布局，再按布局绘制每种格式
+
+    positioned 为之前 layout_diagram 返回的已定位DOT文本，给出时跳过布局（布局路径记为
+    cached，没有布局档位）。返回的 data 为 {格式: 字节}，positioned 为本次使用的已定位DOT文本。
+    """
+    from generate_from_json import layout_diagram, render_formats
+    timings = {}
+    render_info = {"layout": "cached"}
+    started_at = time.time()
+    with _profiled(profile_path):
+        if positioned is None:
+            positioned = layout_diagram(topology, timeout=timeout, timings=timings, render_info=render_info)
+        data = render_formats(positioned, formats, timeout=timeout, timings=timings)
+    return {"data": data, "positioned": positioned, "started_at": started_at, "timings": timings,
+            "layout": render_info.get("layout"), "tier": render_info.get("tier"),
+            "attempts": render_info.get("attempts", []), "query": render_info.get("query")}
+
+
+def _layout_budget(topology):
+    """配置（字典或 TopologyIR）中的布局时间预算"""
+    if isinstance(topology, dict):
+        return topology.get("layout_budget")
+    return getattr(topology, "layout_budget", None)
+
+
+class RenderPool:
+    """有界的渲染进程池
+
+    同时最多接受 workers + queue_depth 个任务（正在渲染的加上排队的），
+    超出时立即抛出 PoolBusyError 而不是无限排队。
+    """
+
+    def __init__(self, workers=None, queue_depth=None, timeout=120):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_depth = self.workers * 2 if queue_depth is None else queue_depth
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._in_flight = 0
+        self._completed = 0
+        self._avg_seconds = 1.0  # 渲染耗时的指数滑动平均，用于估算Retry-After
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=_warm_worker)
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def warm_up(self):
+        """启动全部工作进程并等待它们完成依赖导入"""
+        executor = self._get_executor()
+        futures = [executor.submit(_ping) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def retry_after(self):
+        """根据当前排队量和平均渲染耗时估算客户端的重试等待秒数"""
+        with self._lock:
+            waves = self._in_flight / self.workers
+            return max(1, math.ceil(waves * self._avg_seconds))
+
+    def submit(self, fn, *args):
+        """提交任务到进程池，队列已满时抛出 PoolBusyError"""
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusyError(self.retry_after())
+        executor = self._get_executor()
+        started = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            try:
+                future = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                # 之前的工作进程异常退出，重建进程池后重试一次
+                self._reset_executor(executor)
+                future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(lambda f: self._release(time.monotonic() - started))
+        return future
+
+    def _release(self, elapsed):
+        with self._lock:
+            self._in_flight -= 1
+            if elapsed is not None:
+                self._completed += 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+        self._slots.release()
+
+    def submit_render(self, topology, timeout=None, profile_path=None):
+        """提交渲染任务但不等待，返回Future，结果为图像字节、开始时间和各阶段耗时
+
+        topology 可以是配置字典或已编译的 TopologyIR；profile_path 见 _render_job。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return self.submit(_render_job, topology, timeout, profile_path)
+
+    def submit_formats(self, topology, formats, positioned=None, timeout=None, profile_path=None):
+        """提交“只布局一次、渲染多种格式”的任务但不等待，返回Future，结果同 render_formats
+
+        异步任务和批量接口通过它与 /generate 使用同一条布局路径，同一缓存键的结果
+        不会因接口不同而来自不同的布局方式。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        return self.submit(_render_formats_job, topology, list(formats), timeout, positioned, profile_path)
+
+    def render_formats(self, topology, formats, positioned=None, timeout=None, profile_path=None):
+        """只布局一次并渲染多种格式，等待完成后返回 {格式: 字节}、已定位DOT文本和各阶段耗时
+
+        positioned 为缓存的已定位DOT文本时跳过布局；超时处理同 render。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        executor = self._get_executor()
+        future = self.submit_formats(topology, formats, positioned, timeout, profile_path)
+        return self._wait(future, executor, timeout, runs=1 + len(formats),
+                          budget=None if positioned else _layout_budget(topology))
+
+    def render(self, topology, timeout=None, profile_path=None):
+        """在工作进程中渲染配置，等待完成后返回图像字节、开始时间和各阶段耗时
+
+        graphviz 超过 timeout 秒会在工作进程中被终止，此时抛出 RenderTimeoutError。
+        """
+        timeout = self.timeout if timeout is None else timeout
+        executor = self._get_executor()
+        future = self.submit_render(topology, timeout, profile_path)
+        return self._wait(future, executor, timeout, budget=_layout_budget(topology))
+
+    def _wait(self, future, executor, timeout, runs=1, budget=None):
+        """等待任务结果；runs 为任务中graphviz的运行次数，每次各有 timeout 秒
+
+        budget 为布局的时间预算，按预算降档重试的总耗时可能超过单次的 timeout。
+        """
+        try:
+            # 排队时间不计入graphviz超时，这里额外留出一个超时周期作为兜底
+            return future.result(timeout=timeout * (runs + 1) + (budget or 0) if timeout else None)
+        except FutureTimeoutError:
+            raise RenderTimeoutError(f"渲染超时（{timeout}秒）")
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise RuntimeError("渲染工作进程异常退出")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "completed": self._completed,
+                "avg_render_seconds": round(self._avg_seconds, 3),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+import json
+import logging
+import logging.handlers
+import os
+import re
+
+# Server-Timing 指标名只允许token字符
+_TOKEN = re.compile(r"[^!#$%&'*+.^_`|~0-9A-Za-z-]")
+
+
+def server_timing(phases, descriptions=None):
+    """把各阶段耗时（秒）格式化为 Server-Timing 响应头（毫秒）
+
+    descriptions 可为部分阶段附加说明，例如 {"cache": "hit"}；只有说明、没有耗时的
+    阶段也会输出。
+    """
+    descriptions = descriptions or {}
+    parts = []
+    for name in list(phases) + [n for n in descriptions if n not in phases]:
+        part = _TOKEN.sub("_", name)
+        if name in descriptions:
+            part += f';desc="{descriptions[name]}"'
+        if name in phases:
+            part += f";dur={phases[name] * 1000:.2f}"
+        parts.append(part)
+    return ", ".join(parts)
+
+
+class TraceLog:
+    """按大小轮转的JSON Lines请求追踪日志
+
+    每条追踪一行JSON，文件超过 max_bytes 后轮转，保留 backups 个历史文件。
+    基于 logging 的 RotatingFileHandler，多线程写入是安全的。
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._logger = logging.getLogger(f"{__name__}.{os.path.abspath(path)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def write(self, trace):
+        self._logger.info(json.dumps(trace, ensure_ascii=False, default=str))
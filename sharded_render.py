@@ -0,0 +1,149 @@
+import os
+import re
+import html
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from level_of_detail import collapse_clusters
+from topology_index import subgraph
+from topology_ir import compile_topology
+
+
+def _shard_filename(index, name):
+    slug = re.sub(r"[^\w.-]+", "_", str(name)).strip("_") or "cluster"
+    return f"{index + 1:02d}_{slug}"
+
+
+def _subtree_nodes(ir, root_cluster):
+    nodes = []
+    stack = [root_cluster]
+    while stack:
+        cluster = stack.pop()
+        nodes.extend(ir.cluster_nodes[cluster])
+        stack.extend(ir.cluster_children[cluster])
+    return nodes
+
+
+def split_config(config, ir=None):
+    """Split a config along its top-level clusters.
+
+    Returns a list of (label, shard TopologyIR) pairs, one per top-level
+    cluster of the compiled IR, including clusters placed from "subnets".
+    Each shard holds that cluster's subtree and the connections inside it.
+    Connections between shards and to top-level nodes are left to the
+    overview graph.
+    """
+    if ir is None:
+        ir = compile_topology(config, log=None)
+    shards = []
+    for cluster in ir.root_clusters:
+        label = ir.cluster_labels[cluster]
+        shard = subgraph(ir, _subtree_nodes(ir, cluster))
+        shard.title = f"{ir.title} - {label}"
+        shards.append((label, shard))
+    return shards
+
+
+def _render_shard(topology, timeout):
+    """Worker entry point: render one shard in memory and time it"""
+    from generate_from_json import generate_diagram
+    started = time.perf_counter()
+    data = generate_diagram(topology, timeout=timeout, strict=True, in_memory=True)
+    return data, time.perf_counter() - started
+
+
+def render_sharded(config, output_dir, workers=None, timeout=None, log=print):
+    """Render each top-level cluster of config in its own process.
+
+    Writes to output_dir:
+
+    - overview.<fmt>: every top-level cluster as one summary node, with
+      cross-cluster connections merged into counted links; in SVG output the
+      summary nodes link to the shard files for drill-down
+    - NN_<cluster>.<fmt>: one diagram per top-level cluster
+    - index.html / index.json: links to all files plus per-shard sizes and
+      render times
+
+    Shards are rendered concurrently with up to workers processes (default:
+    CPU count), so wall-clock time is bounded by the largest shard rather
+    than the whole graph. Returns the index entries.
+    """
+    started = time.perf_counter()
+    ir = compile_topology(config, log=log)
+    outformat = ir.outformat
+    os.makedirs(output_dir, exist_ok=True)
+
+    shards = split_config(config, ir)
+    files = [f"{_shard_filename(i, label)}.{outformat}" for i, (label, _) in enumerate(shards)]
+
+    summary_nodes = {}
+    overview = collapse_clusters(ir, max_depth=0, summary_nodes=summary_nodes)
+    overview.query = None  # like the shards, the overview shows the whole config
+    # Shards follow ir.root_clusters; labels may repeat, so link by cluster index
+    for cluster, filename in zip(ir.root_clusters, files):
+        summary = summary_nodes.get(cluster)
+        if summary is not None:
+            overview.node_links[summary] = filename
+    overview.title = f"{ir.title} - Overview"
+
+    entries = [None] * len(shards)
+    overview_entry = {"name": "overview", "file": f"overview.{outformat}",
+                      "nodes": overview.node_count, "edges": overview.edge_count}
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards) + 1)) as executor:
+        futures = {executor.submit(_render_shard, overview, timeout): None}
+        for i, (label, shard) in enumerate(shards):
+            futures[executor.submit(_render_shard, shard, timeout)] = i
+            entries[i] = {"name": label, "file": files[i], "nodes": shard.node_count,
+                          "edges": shard.edge_count}
+        for future in as_completed(futures):
+            i = futures[future]
+            entry = overview_entry if i is None else entries[i]
+            try:
+                data, seconds = future.result()
+            except Exception as e:
+                entry["error"] = str(e) or type(e).__name__
+                if log:
+                    log(f"❌ Failed to render {entry['name']}: {entry['error']}")
+                continue
+            with open(os.path.join(output_dir, entry["file"]), "wb") as f:
+                f.write(data)
+            entry["seconds"] = round(seconds, 3)
+
+    index = {"title": ir.title, "format": outformat, "overview": overview_entry, "shards": entries,
+             "seconds": round(time.perf_counter() - started, 3)}
+    with open(os.path.join(output_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(output_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write(_index_html(index))
+    if log:
+        log(f"✅ Rendered {len(entries)} shards into {output_dir} in {index['seconds']}s")
+    return index
+
+
+def _index_html(index):
+    title = html.escape(index["title"])
+    overview = index["overview"]
+    rows = []
+    for entry in index["shards"]:
+        status = html.escape(entry.get("error", f"{entry.get('seconds', 0)}s"))
+        rows.append(f'<tr><td><a href="{html.escape(entry["file"])}">{html.escape(entry["name"])}</a></td>'
+                    f'<td>{entry["nodes"]}</td><td>{entry["edges"]}</td><td>{status}</td></tr>')
+    if index["format"] == "svg":
+        preview = f'<object data="{html.escape(overview["file"])}" type="image/svg+xml"></object>'
+    else:
+        preview = f'<p><a href="{html.escape(overview["file"])}">Overview</a></p>'
+    return f"""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body>
+<h1>{title}</h1>
+{preview}
+<table>
+<tr><th>Cluster</th><th>Nodes</th><th>Connections</th><th>Render</th></tr>
+{chr(10).join(rows)}
+</table>
+</body>
+</html>
+"""
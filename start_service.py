@@ -1,14 +1,33 @@
 #!/usr/bin/env python
 import os
 import sys
+import json
+import time
+import signal
+import select
+import socket
+import argparse
 import subprocess
 import threading
-import time
 import webbrowser
+import urllib.request
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 
-def start_api_server():
-    """启动API服务器"""
+def wait_until_ready(url, timeout=120, interval=0.2):
+    """轮询就绪探针直到返回200，返回等待的秒数；超时返回None"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=interval * 5) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(interval)
+    return None
+
+def start_api_server(port=5000):
+    """启动API服务器（开发模式），等待就绪探针通过后返回"""
     print("正在启动API服务器...")
     # 检查是否安装了flask_cors
     try:
@@ -18,13 +37,273 @@ def start_api_server():
         subprocess.check_call([sys.executable, "-m", "pip", "install", "flask-cors"])
     
     # 启动API服务
+    env = dict(os.environ, PORT=str(port))
     if os.name == 'nt':  # Windows
-        subprocess.Popen([sys.executable, "api_service.py"], creationflags=subprocess.CREATE_NEW_CONSOLE)
+        subprocess.Popen([sys.executable, "api_service.py"], env=env, creationflags=subprocess.CREATE_NEW_CONSOLE)
     else:  # Linux/Mac
-        subprocess.Popen([sys.executable, "api_service.py"])
+        subprocess.Popen([sys.executable, "api_service.py"], env=env)
     
-    print("API服务器已启动，监听端口5000")
-    time.sleep(2)  # 等待API服务启动
+    # 等待预热完成（/ready 返回200）
+    waited = wait_until_ready(f"http://127.0.0.1:{port}/ready")
+    if waited is None:
+        print(f"警告: API服务器在端口{port}上未能就绪，请检查其输出")
+    else:
+        print(f"API服务器已就绪，监听端口{port}（启动耗时{waited:.2f}秒）")
+
+
+class _InFlight:
+    """统计正在处理的HTTP请求数的WSGI中间件，响应体发送完毕才算结束"""
+
+    def __init__(self, app):
+        self.app = app
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _done(self):
+        with self._lock:
+            self.count -= 1
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.count += 1
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        return _ClosingIterator(body, self._done)
+
+
+class _ClosingIterator:
+    def __init__(self, body, on_close):
+        self._body = body
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._on_close()
+
+
+def _report(status_fd, **message):
+    """工作进程向主进程汇报状态（每条一行JSON）"""
+    os.write(status_fd, (json.dumps(message) + "\n").encode("utf-8"))
+
+
+def _worker_main(listener, status_fd, max_renders, graceful_timeout):
+    """预派生的工作进程：导入依赖、预热渲染，然后在共享的监听套接字上处理请求
+
+    完成 max_renders 次渲染后主动退出以回收内存，收到SIGTERM时停止接收新连接，
+    等待进行中的请求和渲染任务结束（最多 graceful_timeout 秒）后退出。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程统一处理
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    started = time.perf_counter()
+    import api_service
+    from werkzeug.serving import make_server
+    imported = time.perf_counter()
+    warmup = api_service.warm_up()
+    app = _InFlight(api_service.app)
+    host, port = listener.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    _report(status_fd, event="ready", pid=os.getpid(), import_seconds=round(imported - started, 3),
+            warmup_seconds=warmup["seconds"], cold_start_seconds=round(time.perf_counter() - started, 3))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    pool = api_service.render_pool
+    baseline = pool.stats()["completed"]
+    reason = "shutdown"
+    while not stop.wait(0.5):
+        if max_renders and pool.stats()["completed"] - baseline >= max_renders:
+            reason = "recycle"
+            break
+    _report(status_fd, event="draining", pid=os.getpid(), reason=reason,
+            renders=pool.stats()["completed"] - baseline)
+
+    # 停止接收新连接，等待已接收的请求和异步渲染任务完成
+    api_service.stop_accepting()
+    server.shutdown()
+    deadline = time.monotonic() + graceful_timeout
+    while (app.count or pool.stats()["in_flight"]) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    pool.shutdown()
+    os._exit(0)
+
+
+class PreforkServer:
+    """生产模式的主进程：绑定端口后派生 workers 个工作进程并负责监控和替换
+
+    主进程本身不导入渲染依赖，只负责:
+    - 收集各工作进程的导入、预热和冷启动耗时，全部就绪后打印汇总
+    - 工作进程因达到渲染次数上限开始退出时，立即派生替代进程
+    - 收到SIGTERM/SIGINT时通知所有工作进程优雅退出，超时后强制结束
+    """
+
+    def __init__(self, host, port, workers, max_renders, graceful_timeout, ready_file=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_renders = max_renders
+        self.graceful_timeout = graceful_timeout
+        self.ready_file = ready_file
+        self.children = {}  # pid -> {"pipe": 读端, "state": starting/ready/draining, "buffer": bytes}
+        self.stopping = False
+        self.started = None
+        self.startup_stats = []
+
+    def spawn(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for child in self.children.values():
+                if child["pipe"] is not None:
+                    os.close(child["pipe"])
+            try:
+                _worker_main(self.listener, write_fd, self.max_renders, self.graceful_timeout)
+            except BaseException as e:
+                print(f"工作进程 {os.getpid()} 启动失败: {e}", file=sys.stderr)
+            finally:
+                os._exit(1)
+        os.close(write_fd)
+        self.children[pid] = {"pipe": read_fd, "state": "starting", "buffer": b""}
+        return pid
+
+    def _handle_message(self, pid, message):
+        child = self.children[pid]
+        if message["event"] == "ready":
+            child["state"] = "ready"
+            print(f"工作进程 {pid} 就绪: 导入{message['import_seconds']:.2f}秒, "
+                  f"预热{message['warmup_seconds']:.2f}秒, 冷启动{message['cold_start_seconds']:.2f}秒")
+            if self.started is not None:
+                self.startup_stats.append(message)
+                if len(self.startup_stats) == self.workers:
+                    self._all_ready()
+        elif message["event"] == "draining":
+            child["state"] = "draining"
+            if message["reason"] == "recycle" and not self.stopping:
+                print(f"工作进程 {pid} 已完成{message['renders']}次渲染，回收并派生替代进程")
+                self.spawn()
+
+    def _all_ready(self):
+        summary = {
+            "workers": self.workers,
+            "ready_seconds": round(time.perf_counter() - self.started, 3),
+            "cold_start_seconds": max(m["cold_start_seconds"] for m in self.startup_stats),
+            "warmup_seconds": max(m["warmup_seconds"] for m in self.startup_stats),
+            "import_seconds": max(m["import_seconds"] for m in self.startup_stats),
+        }
+        print(f"全部{self.workers}个工作进程已就绪，用时{summary['ready_seconds']:.2f}秒，"
+              f"监听 http://{self.host}:{self.port}")
+        self.started = None
+        if self.ready_file:
+            with open(self.ready_file, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+
+    def _read_pipes(self, timeout):
+        pipes = {child["pipe"]: pid for pid, child in self.children.items() if child["pipe"] is not None}
+        if not pipes:
+            time.sleep(timeout)
+            return
+        try:
+            readable, _, _ = select.select(list(pipes), [], [], timeout)
+        except InterruptedError:
+            return
+        for fd in readable:
+            pid = pipes[fd]
+            child = self.children[pid]
+            data = os.read(fd, 4096)
+            if not data:
+                os.close(fd)
+                child["pipe"] = None
+                continue
+            child["buffer"] += data
+            *lines, child["buffer"] = child["buffer"].split(b"\n")
+            for line in lines:
+                self._handle_message(pid, json.loads(line))
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self.children.pop(pid, None)
+            if child is None:
+                continue
+            if child["pipe"] is not None:
+                os.close(child["pipe"])
+            if self.stopping or child["state"] == "draining":
+                continue
+            # 意外退出的进程直接替换；启动阶段就失败的稍等片刻，避免反复派生
+            print(f"工作进程 {pid} 意外退出（状态{status}），重新派生", file=sys.stderr)
+            if child["state"] == "starting":
+                time.sleep(1)
+            self.spawn()
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def serve(self):
+        self.listener = socket.create_server((self.host, self.port), backlog=1024)
+        self.listener.set_inheritable(True)
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self.started = time.perf_counter()
+        print(f"生产模式: 派生{self.workers}个工作进程，每个进程渲染{self.max_renders or '不限'}次后回收")
+        for _ in range(self.workers):
+            self.spawn()
+        while not self.stopping:
+            self._read_pipes(0.5)
+            self._reap()
+
+        print(f"正在优雅退出，最多等待{self.graceful_timeout}秒...")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self._read_pipes(0.2)
+            self._reap()
+        for pid in list(self.children):
+            print(f"工作进程 {pid} 未能按时退出，强制结束", file=sys.stderr)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.listener.close()
+        print("服务已停止。")
+
+
+def run_production(args):
+    """生产模式：不启动静态Web服务器、不打开浏览器，也不在运行时安装依赖"""
+    if os.name == 'nt' or not hasattr(os, 'fork'):
+        print("错误: 生产模式需要支持fork的系统（Linux/macOS）")
+        sys.exit(1)
+    missing = []
+    for module in ("flask", "flask_cors", "diagrams", "graphviz"):
+        try:
+            __import__(module)
+        except ImportError:
+            missing.append(module)
+    if missing:
+        print(f"错误: 缺少依赖 {', '.join(missing)}，请先执行 pip install -r requirements.txt")
+        sys.exit(1)
+    # 请求可能落在任一工作进程，异步任务记录保存在共享的任务目录中
+    os.environ.setdefault('JOB_STORE', 'file')
+    # 每个工作进程各有一个渲染进程池，默认把CPU平均分给各工作进程
+    os.environ.setdefault('RENDER_WORKERS', str(max(1, (os.cpu_count() or 1) // args.workers)))
+    PreforkServer(args.host, args.port, args.workers, args.max_renders, args.graceful_timeout,
+                  args.ready_file).serve()
 
 def start_web_server():
     """启动简单的HTTP服务器提供静态文件"""
@@ -65,7 +344,27 @@ def update_web_interface():
     except Exception as e:
         print(f"更新Web界面时出错: {e}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="网络拓扑图生成器启动器")
+    parser.add_argument("--production", action="store_true",
+                        help="生产模式：预派生多个工作进程，预热后再接收流量")
+    parser.add_argument("--host", default=os.environ.get('HOST', '0.0.0.0'), help="生产模式的监听地址")
+    parser.add_argument("--port", type=int, default=int(os.environ.get('PORT', 5000)), help="API服务端口")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('WEB_WORKERS', 4)),
+                        help="生产模式的工作进程数")
+    parser.add_argument("--max-renders", type=int, default=int(os.environ.get('MAX_RENDERS_PER_WORKER', 1000)),
+                        help="工作进程完成多少次渲染后回收，0表示不回收")
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.environ.get('GRACEFUL_TIMEOUT', 30)),
+                        help="退出时等待进行中请求的最长秒数")
+    parser.add_argument("--ready-file", help="全部工作进程就绪后把启动耗时写入该JSON文件")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    if args.production:
+        run_production(args)
+        return
+
     print("=" * 50)
     print("网络拓扑图生成器 - 启动器")
     print("=" * 50)
@@ -83,7 +382,7 @@ def main():
     update_web_interface()
     
     # 启动API服务器
-    start_api_server()
+    start_api_server(args.port)
     
     # 启动Web服务器
     httpd = start_web_server()
@@ -93,7 +392,7 @@ def main():
     
     print("-" * 50)
     print("服务已启动:")
-    print("1. API服务: http://localhost:5000")
+    print(f"1. API服务: http://localhost:{args.port}")
     print("2. Web界面: http://localhost:8000/web_interface.html")
     print("-" * 50)
     print("按Ctrl+C停止Web服务器...")
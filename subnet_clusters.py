@@ -0,0 +1,122 @@
+import socket
+import ipaddress
+from bisect import bisect_right
+
+NO_SUBNET = -1
+
+
+def diagnostic(code, message, **fields):
+    """A structured auto-clustering diagnostic: code, message and the offending node/ip/subnet"""
+    return dict(fields, code=code, message=message)
+
+
+def address_key(text):
+    """(IP version, integer address) of a node ip, also in interface notation ("10.0.0.5/24").
+
+    Returns None if invalid. IPv4 goes through inet_pton, which is much
+    faster than the ipaddress module on large inventories.
+    """
+    host = str(text).strip().partition("/")[0]
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, host), "big")
+    except OSError:
+        pass
+    try:
+        return 6, int(ipaddress.IPv6Address(host))
+    except ValueError:
+        return None
+
+
+class SubnetIndex:
+    """Sorted interval index over a set of CIDR subnets.
+
+    Subnets are sorted by (IP version, first address, prefix length), which
+    is a pre-order walk of their containment tree: CIDR blocks either nest
+    or are disjoint, so one stack sweep finds each subnet's parent. lookup
+    bisects for the last subnet starting at or before an address and walks
+    up its parents to the first that contains it, the most specific match.
+    Building is O(s log s) and each lookup O(log s + prefix depth).
+
+    subnets is a list of {"subnet": cidr, "name": optional label}. Invalid
+    and duplicate subnets are left out and reported in diagnostics.
+    """
+
+    def __init__(self, subnets):
+        self.diagnostics = []
+        parsed = []
+        for position, subnet_def in enumerate(subnets):
+            cidr = str(subnet_def.get("subnet", "")).strip()
+            try:
+                network = ipaddress.ip_network(cidr, strict=False)
+            except ValueError:
+                self.diagnostics.append(diagnostic(
+                    "invalid_subnet", f'"{cidr}" is not a valid subnet', subnet=cidr))
+                continue
+            if str(network) != cidr:
+                self.diagnostics.append(diagnostic(
+                    "host_bits", f'subnet "{cidr}" has host bits set, using {network}', subnet=cidr))
+            parsed.append((network.version, int(network.network_address), network.prefixlen,
+                           position, network, subnet_def.get("name") or str(network)))
+        parsed.sort()
+
+        self.networks = []
+        self.names = []
+        self.parent = []
+        self._starts = []
+        self._ends = []
+        stack = []
+        for version, start, prefixlen, _, network, name in parsed:
+            end = (version, int(network.broadcast_address))
+            while stack and self._ends[stack[-1]] < (version, start):
+                stack.pop()
+            if stack and self.networks[stack[-1]] == network:
+                self.diagnostics.append(diagnostic(
+                    "duplicate_subnet", f'subnet {network} is listed more than once, keeping '
+                    f'"{self.names[stack[-1]]}"', subnet=str(network), name=name))
+                continue
+            stack.append(len(self.networks))
+            self.parent.append(stack[-2] if len(stack) > 1 else NO_SUBNET)
+            self.networks.append(network)
+            self.names.append(name)
+            self._starts.append((version, start, prefixlen))
+            self._ends.append(end)
+
+    def __len__(self):
+        return len(self.networks)
+
+    def lookup(self, key):
+        """Index of the most specific subnet containing an address_key, or NO_SUBNET"""
+        subnet = bisect_right(self._starts, key + (129,)) - 1
+        while subnet != NO_SUBNET and self._ends[subnet] < key:
+            subnet = self.parent[subnet]
+        return subnet
+
+
+def assign_subnets(index, nodes):
+    """Assign (node_id, ip) pairs to their most specific subnet.
+
+    Returns (assignment, diagnostics): assignment[i] is the subnet index for
+    nodes[i], or NO_SUBNET for nodes without an ip, with an invalid ip or
+    outside every subnet. Invalid, unmatched and shared addresses are
+    reported as diagnostics; nodes without an ip are left alone silently.
+    """
+    assignment = [NO_SUBNET] * len(nodes)
+    diagnostics = []
+    owners = {}
+    for i, (node_id, ip) in enumerate(nodes):
+        if not ip:
+            continue
+        key = address_key(ip)
+        if key is None:
+            diagnostics.append(diagnostic("invalid_ip", f'node "{node_id}" has an invalid ip "{ip}"',
+                                          node=node_id, ip=ip))
+            continue
+        first = owners.setdefault(key, node_id)
+        if first != node_id:
+            diagnostics.append(diagnostic("duplicate_ip", f'node "{node_id}" has the same ip {ip} '
+                                          f'as node "{first}"', node=node_id, ip=ip, other=first))
+        subnet = assignment[i] = index.lookup(key)
+        if subnet == NO_SUBNET:
+            diagnostics.append(diagnostic("unmatched", f'node "{node_id}" ip {ip} is not in any subnet',
+                                          node=node_id, ip=ip))
+    return assignment, diagnostics
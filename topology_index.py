@@ -0,0 +1,272 @@
+from array import array
+from collections import deque
+
+from topology_ir import NO_CLUSTER, TopologyIR
+
+# Query types accepted in a config's "query" option and whether each one
+# follows connection direction by default
+QUERY_TYPES = {"path": True, "neighbours": False, "reachable": True}
+QUERY_OPTIONS = ("type", "from", "to", "node", "hops", "directed")
+
+# How the edges of a matched path are drawn in the query subgraph
+HIGHLIGHT_COLOR = "#E74C3C"
+HIGHLIGHT_STYLE = "bold"
+
+
+class QueryError(ValueError):
+    """Raised when a query names an unknown node or matches nothing"""
+
+
+def _csr(count, sources, targets, edges):
+    """Group (source, target, edge) triples by source into CSR arrays.
+
+    Returns (offsets, targets, edges): the neighbours of node i are
+    targets[offsets[i]:offsets[i + 1]], reached through the connection with
+    the same position in edges. A counting sort, O(count + len(sources)).
+    """
+    offsets = array("i", bytes(4 * (count + 1)))
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    fill = array("i", offsets)
+    out_targets = array("i", bytes(4 * len(sources)))
+    out_edges = array("i", bytes(4 * len(sources)))
+    for source, target, edge in zip(sources, targets, edges):
+        position = fill[source]
+        out_targets[position] = target
+        out_edges[position] = edge
+        fill[source] = position + 1
+    return offsets, out_targets, out_edges
+
+
+class TopologyIndex:
+    """Compact adjacency index over a TopologyIR for path and neighbourhood queries.
+
+    Nodes are the IR's integer node indices. Outgoing and incoming adjacency
+    are CSR arrays (array("i") offsets into flat neighbour and connection
+    arrays); a bidirectional connection is stored in both directions.
+    Cluster membership uses the same layout: the nodes directly in cluster c
+    are cluster_members[cluster_offsets[c]:cluster_offsets[c + 1]], and
+    ir.node_cluster maps each node back to its cluster.
+
+    Building is linear in nodes + connections and every array holds 4-byte
+    integers, so a config with 100k connections indexes in well under a
+    second and a few megabytes.
+    """
+
+    def __init__(self, ir):
+        self.ir = ir
+        count = ir.node_count
+        bidirectional = [style[2] for style in ir.edge_styles]
+        both_ways = array("i", (edge for edge, style in enumerate(ir.edge_style) if bidirectional[style]))
+        sources = ir.edge_src + array("i", (ir.edge_dst[edge] for edge in both_ways))
+        targets = ir.edge_dst + array("i", (ir.edge_src[edge] for edge in both_ways))
+        edges = array("i", range(ir.edge_count)) + both_ways
+
+        self.out_offsets, self.out_targets, self.out_edges = _csr(count, sources, targets, edges)
+        self.in_offsets, self.in_sources, self.in_edges = _csr(count, targets, sources, edges)
+
+        clustered = [node for node in range(count) if ir.node_cluster[node] != NO_CLUSTER]
+        self.cluster_offsets, self.cluster_members, _ = _csr(
+            ir.cluster_count, [ir.node_cluster[node] for node in clustered], clustered, clustered)
+
+    def node(self, node_id):
+        """Integer index of a config node id"""
+        index = self.ir.node_index.get(node_id)
+        if index is None:
+            raise QueryError(f'unknown node id "{node_id}"')
+        return index
+
+    def members(self, cluster):
+        """Nodes directly in a cluster"""
+        return self.cluster_members[self.cluster_offsets[cluster]:self.cluster_offsets[cluster + 1]]
+
+    def _walk(self, start, directed, max_hops=None, stop=None):
+        """Breadth-first search from start.
+
+        Returns (parent, parent_edge, order): parent[v] is the node v was
+        first reached from (-1 for unreached nodes and start), parent_edge[v]
+        the connection used, and order the reached nodes by distance. The
+        search ends early once stop has been reached.
+        """
+        count = self.ir.node_count
+        parent = array("i", [-1]) * count
+        parent_edge = array("i", [-1]) * count
+        seen = bytearray(count)
+        seen[start] = 1
+        order = [start]
+        queue = deque([(start, 0)])
+        adjacency = [(self.out_offsets, self.out_targets, self.out_edges)]
+        if not directed:
+            adjacency.append((self.in_offsets, self.in_sources, self.in_edges))
+        while queue:
+            node, hops = queue.popleft()
+            if max_hops is not None and hops >= max_hops:
+                continue
+            for offsets, neighbours, edges in adjacency:
+                for position in range(offsets[node], offsets[node + 1]):
+                    neighbour = neighbours[position]
+                    if seen[neighbour]:
+                        continue
+                    seen[neighbour] = 1
+                    parent[neighbour] = node
+                    parent_edge[neighbour] = edges[position]
+                    order.append(neighbour)
+                    if neighbour == stop:
+                        return parent, parent_edge, order
+                    queue.append((neighbour, hops + 1))
+        return parent, parent_edge, order
+
+    def shortest_path(self, source, target, directed=True):
+        """Fewest-hop path as (nodes, connections), or None if target is unreachable"""
+        if source == target:
+            return [source], []
+        parent, parent_edge, _ = self._walk(source, directed, stop=target)
+        if parent[target] == -1:
+            return None
+        nodes, edges = [target], []
+        while nodes[-1] != source:
+            edges.append(parent_edge[nodes[-1]])
+            nodes.append(parent[nodes[-1]])
+        nodes.reverse()
+        edges.reverse()
+        return nodes, edges
+
+    def neighbourhood(self, node, hops, directed=False):
+        """Nodes at most hops connections away from node, nearest first"""
+        return self._walk(node, directed, max_hops=hops)[2]
+
+    def reachable(self, source, directed=True):
+        """Nodes reachable from source (including it), nearest first"""
+        return self._walk(source, directed)[2]
+
+
+def subgraph(ir, nodes, highlight_edges=()):
+    """Return a TopologyIR with only the given nodes and the connections among them.
+
+    Clusters holding a kept node (directly or through nested clusters) are
+    kept with their original labels and nesting; members stay in config
+    order. Connections in highlight_edges are drawn with HIGHLIGHT_COLOR
+    and HIGHLIGHT_STYLE.
+    """
+    keep = bytearray(ir.node_count)
+    for node in nodes:
+        keep[node] = 1
+    keep_cluster = bytearray(ir.cluster_count)
+    for node in nodes:
+        cluster = ir.node_cluster[node]
+        while cluster != NO_CLUSTER and not keep_cluster[cluster]:
+            keep_cluster[cluster] = 1
+            cluster = ir.cluster_parent[cluster]
+
+    out = TopologyIR()
+    for attr in ("title", "direction", "outformat", "output_filename", "backend", "reuse_layout",
+                 "level_of_detail", "layout_budget", "tier_limits", "graph_attr", "node_attr"):
+        setattr(out, attr, getattr(ir, attr))
+    out.warnings = list(ir.warnings)
+    out.diagnostics = list(ir.diagnostics)
+    out.icon_names = list(ir.icon_names)
+    out.icon_paths = list(ir.icon_paths)
+
+    node_map = {}
+
+    def copy_nodes(members, cluster):
+        new_members = []
+        for index in members:
+            if not keep[index]:
+                continue
+            new_index = node_map[index] = len(out.node_ids)
+            out.node_ids.append(ir.node_ids[index])
+            out.node_labels.append(ir.node_labels[index])
+            out.node_ips.append(ir.node_ips[index])
+            out.node_icon.append(ir.node_icon[index])
+            out.node_cluster.append(cluster)
+            out.node_index[ir.node_ids[index]] = new_index
+            if index in ir.node_links:
+                out.node_links[new_index] = ir.node_links[index]
+            new_members.append(new_index)
+        return new_members
+
+    out.root_nodes = copy_nodes(ir.root_nodes, NO_CLUSTER)
+    # Clusters are stored in pre-order, so a kept parent is always created before its children
+    new_cluster = {}
+    for cluster in range(ir.cluster_count):
+        if not keep_cluster[cluster]:
+            continue
+        index = new_cluster[cluster] = len(out.cluster_labels)
+        up = ir.cluster_parent[cluster]
+        new_parent = NO_CLUSTER if up == NO_CLUSTER else new_cluster[up]
+        out.cluster_names.append(ir.cluster_names[cluster])
+        out.cluster_labels.append(ir.cluster_labels[cluster])
+        out.cluster_parent.append(new_parent)
+        out.cluster_depth.append(ir.cluster_depth[cluster])
+        out.cluster_children.append([])
+        out.cluster_nodes.append(copy_nodes(ir.cluster_nodes[cluster], index))
+        if new_parent == NO_CLUSTER:
+            out.root_clusters.append(index)
+        else:
+            out.cluster_children[new_parent].append(index)
+
+    out.edge_styles = list(ir.edge_styles)
+    highlighted = {}  # original style -> highlighted style
+    highlight_edges = set(highlight_edges)
+    for edge, (source, target, style) in enumerate(zip(ir.edge_src, ir.edge_dst, ir.edge_style)):
+        if not (keep[source] and keep[target]):
+            continue
+        if edge in highlight_edges:
+            if style not in highlighted:
+                highlighted[style] = len(out.edge_styles)
+                out.edge_styles.append((HIGHLIGHT_COLOR, HIGHLIGHT_STYLE, ir.edge_styles[style][2]))
+            style = highlighted[style]
+        if edge in ir.edge_labels:
+            out.edge_labels[len(out.edge_src)] = ir.edge_labels[edge]
+        out.edge_src.append(node_map[source])
+        out.edge_dst.append(node_map[target])
+        out.edge_style.append(style)
+    return out
+
+
+def apply_query(ir, query, info=None):
+    """Apply a "query" option and return the matched subgraph of ir.
+
+    query is a dict with a "type" from QUERY_TYPES:
+
+    - {"type": "path", "from": a, "to": b}: the fewest-hop path, highlighted
+    - {"type": "neighbours", "node": a, "hops": k}: everything within k hops (default 1)
+    - {"type": "reachable", "from": a}: everything reachable from a
+
+    "directed" overrides whether connection direction is followed (see
+    QUERY_TYPES); bidirectional connections work both ways either way. If
+    an info dict is given, the match is recorded in info["query"].
+    """
+    if not query:
+        return ir
+    if not isinstance(query, dict):
+        raise QueryError("query must be an object")
+    query_type = query.get("type")
+    if query_type not in QUERY_TYPES:
+        raise QueryError(f'query type must be one of {", ".join(QUERY_TYPES)}')
+    directed = bool(query.get("directed", QUERY_TYPES[query_type]))
+
+    index = TopologyIndex(ir)
+    highlight = []
+    if query_type == "path":
+        found = index.shortest_path(index.node(query.get("from")), index.node(query.get("to")), directed)
+        if found is None:
+            raise QueryError(f'no path from "{query.get("from")}" to "{query.get("to")}"')
+        nodes, highlight = found
+    elif query_type == "neighbours":
+        hops = query.get("hops", 1)
+        if not isinstance(hops, int) or isinstance(hops, bool) or hops < 0:
+            raise QueryError("query.hops must be a non-negative integer")
+        nodes = index.neighbourhood(index.node(query.get("node")), hops, directed)
+    else:
+        nodes = index.reachable(index.node(query.get("from")), directed)
+
+    out = subgraph(ir, nodes, highlight)
+    if info is not None:
+        info["query"] = {"type": query_type, "nodes": out.node_count, "edges": out.edge_count}
+        if query_type == "path":
+            info["query"]["path"] = [ir.node_ids[node] for node in nodes]
+    return out
@@ -0,0 +1,343 @@
+import os
+from array import array
+
+from subnet_clusters import NO_SUBNET, SubnetIndex, assign_subnets
+
+# Defaults used when the config does not provide graph_attr / node_attr
+DEFAULT_GRAPH_ATTR = {"fontsize": "12", "bgcolor": "transparent", "splines": "ortho"}
+DEFAULT_NODE_ATTR = {
+    "fontsize": "20",
+    "height": "0.8",
+    "width": "0.8",
+    "fixedsize": "true",
+    "imagescale": "true"
+}
+
+DIRECTIONS = ("TB", "BT", "LR", "RL")
+OUTFORMATS = ("png", "jpg", "svg", "pdf", "dot")
+
+# Graph construction backends: "diagrams" builds diagrams.Custom/Edge objects,
+# "dot" compiles the config straight into DOT text (much faster on large graphs)
+BACKENDS = ("diagrams", "dot")
+
+ICONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "my_icons")
+DEFAULT_ICON = "server"
+
+NO_CLUSTER = -1
+
+# Compiled options that change the rendered output without showing up in the
+# DOT text of the compiled IR (generate_from_json._prepare resolves them)
+RENDER_OPTIONS = ("outformat", "output_filename", "backend", "reuse_layout", "level_of_detail",
+                  "layout_budget", "tier_limits", "query")
+
+
+def node_display_label(node_def, node_id):
+    """Build the label shown under a node icon: name, IP and Docker image"""
+    display_parts = [node_def.get("label", node_id)]
+    if node_def.get("ip", ""):
+        display_parts.append(node_def["ip"])
+    if node_def.get("image", ""):
+        display_parts.append(f"镜像: {node_def['image']}")
+    return "\n".join(str(part) for part in display_parts)
+
+
+class TopologyIR:
+    """Compact, validated form of a diagram config shared by every renderer.
+
+    Nodes, clusters and edges are addressed by integer index:
+
+    - node_ids / node_labels / node_ips: per-node strings (labels are interned)
+    - node_icon: index into icon_paths, resolved once per distinct icon
+    - node_links: the few nodes that link elsewhere in SVG output (node index -> URL)
+    - node_cluster: index of the owning cluster, or NO_CLUSTER
+    - cluster_names / cluster_labels / cluster_parent / cluster_depth: the
+      cluster tree in pre-order (labels include the subnet); cluster_nodes and
+      cluster_children list members in config order
+    - root_nodes / root_clusters: top-level members in config order
+    - edge_src / edge_dst / edge_style: connections, edge_style indexes
+      edge_styles, a table of (color, style, bidirectional); edge_labels maps
+      the few edges that carry a label (edge index -> text)
+    - diagnostics: structured problems found while placing nodes by subnet
+      (see TopologyBuilder.place_by_subnet)
+    """
+
+    def __init__(self):
+        self.title = "Network Topology"
+        self.direction = "TB"
+        self.outformat = "svg"
+        self.output_filename = "network_topology"
+        self.backend = None
+        self.reuse_layout = False
+        self.level_of_detail = None
+        self.layout_budget = None
+        self.tier_limits = None  # None: layout_tiers.TIER_LIMITS
+        self.query = None
+        self.subnets = None
+        self.graph_attr = DEFAULT_GRAPH_ATTR
+        self.node_attr = DEFAULT_NODE_ATTR
+
+        self.node_ids = []
+        self.node_labels = []
+        self.node_ips = []
+        self.node_icon = array("i")
+        self.node_cluster = array("i")
+        self.node_index = {}  # node id -> index (last definition wins)
+        self.node_links = {}
+        self.icon_names = []
+        self.icon_paths = []
+
+        self.cluster_names = []
+        self.cluster_labels = []
+        self.cluster_parent = array("i")
+        self.cluster_depth = array("i")
+        self.cluster_nodes = []
+        self.cluster_children = []
+        self.root_nodes = []
+        self.root_clusters = []
+
+        self.edge_src = array("i")
+        self.edge_dst = array("i")
+        self.edge_style = array("i")
+        self.edge_styles = []
+        self.edge_labels = {}
+
+        self.warnings = []
+        self.diagnostics = []
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_src)
+
+    @property
+    def cluster_count(self):
+        return len(self.cluster_labels)
+
+
+# Config keys holding lists that are compiled element by element
+ELEMENT_KEYS = ("nodes", "clusters", "connections")
+
+
+class TopologyBuilder:
+    """Builds a TopologyIR incrementally, one config element at a time.
+
+    Used by compile_topology for in-memory configs and by config_stream to
+    compile very large files without holding the whole document. Call
+    add_node / add_cluster / add_connection in any order, then set_options
+    with the remaining top-level keys and finish(). As in compile_topology,
+    connections end up on the last definition of a duplicated node id, even
+    when they were added before it.
+    """
+
+    def __init__(self, icons_dir=None, log=print):
+        self.ir = TopologyIR()
+        self.icons_dir = ICONS_DIR if icons_dir is None else icons_dir
+        self.log = log
+        self._strings = {}
+        self._icon_ids = {}
+        self._style_ids = {}
+        self._pending_connections = []  # connections seen before their endpoints
+        self._redefined = False  # a node id was defined again after connections were added
+
+    def warn(self, message):
+        self.ir.warnings.append(message)
+        if self.log:
+            self.log(f"⚠️ {message}")
+
+    def set_options(self, config):
+        """Apply the non-element top-level keys; invalid direction/outformat raise ValueError"""
+        ir = self.ir
+        ir.title = config.get("title", "Network Topology")
+        ir.direction = config.get("direction", "TB")
+        ir.outformat = config.get("outformat", "svg")
+        ir.output_filename = config.get("output_filename", "network_topology")
+        ir.backend = config.get("backend")
+        ir.reuse_layout = bool(config.get("reuse_layout", False))
+        ir.level_of_detail = config.get("level_of_detail")
+        ir.layout_budget = config.get("layout_budget")
+        ir.query = config.get("query")
+        ir.subnets = config.get("subnets")
+        ir.graph_attr = config.get("graph_attr", DEFAULT_GRAPH_ATTR)
+        ir.node_attr = config.get("node_attr", DEFAULT_NODE_ATTR)
+        if ir.direction not in DIRECTIONS:
+            raise ValueError(f'"{ir.direction}" is not a valid direction')
+        if ir.outformat not in OUTFORMATS:
+            raise ValueError(f'"{ir.outformat}" is not a valid output format')
+
+    def _add_nodes(self, node_defs, cluster):
+        ir = self.ir
+        intern = self._strings.setdefault
+        icon_ids = self._icon_ids
+        members = []
+        for node_def in node_defs:
+            node_id = node_def.get("id")
+            node_icon = node_def.get("icon")
+            if not node_id or not node_icon:
+                self.warn(f"Skipping node with missing id or icon: {node_def}")
+                continue
+
+            icon = icon_ids.get(node_icon)
+            if icon is None:
+                icon_path = os.path.join(self.icons_dir, f"{node_icon}.svg")
+                if not os.path.exists(icon_path):
+                    self.warn(f"Icon not found: {icon_path}, using default server.svg")
+                    icon_path = os.path.join(self.icons_dir, f"{DEFAULT_ICON}.svg")
+                icon = icon_ids[node_icon] = len(ir.icon_paths)
+                ir.icon_names.append(node_icon)
+                ir.icon_paths.append(icon_path)
+
+            label = node_display_label(node_def, node_id)
+            index = len(ir.node_ids)
+            if ir.edge_src and node_id in ir.node_index:
+                self._redefined = True
+            ir.node_ids.append(node_id)
+            ir.node_labels.append(intern(label, label))
+            ip = str(node_def.get("ip", "") or "")
+            ir.node_ips.append(intern(ip, ip))
+            ir.node_icon.append(icon)
+            ir.node_cluster.append(cluster)
+            ir.node_index[node_id] = index
+            members.append(index)
+        return members
+
+    def add_node(self, node_def):
+        """Add one top-level node"""
+        self.ir.root_nodes += self._add_nodes([node_def], NO_CLUSTER)
+
+    def add_cluster(self, cluster_def):
+        """Add one top-level cluster with everything nested in it"""
+        ir = self.ir
+        # Walk the cluster tree with an explicit stack so deep nesting cannot hit the recursion limit
+        stack = [(cluster_def, NO_CLUSTER, 0)]
+        while stack:
+            cluster_def, parent, depth = stack.pop()
+            cluster_name = cluster_def.get("name", "Cluster" if depth == 0 else "Nested Cluster")
+            subnet = cluster_def.get("subnet", "")
+            full_name = f"{cluster_name}{' (' + subnet + ')' if subnet else ''}"
+
+            cluster = len(ir.cluster_labels)
+            ir.cluster_names.append(cluster_name)
+            ir.cluster_labels.append(full_name)
+            ir.cluster_parent.append(parent)
+            ir.cluster_depth.append(depth)
+            ir.cluster_children.append([])
+            ir.cluster_nodes.append(self._add_nodes(cluster_def.get("nodes", []), cluster))
+            if parent == NO_CLUSTER:
+                ir.root_clusters.append(cluster)
+            else:
+                ir.cluster_children[parent].append(cluster)
+
+            for nested_cluster in reversed(cluster_def.get("clusters", [])):
+                stack.append((nested_cluster, cluster, depth + 1))
+
+    def add_connection(self, connection, final=False):
+        """Add one connection; unknown endpoints are retried in finish()"""
+        ir = self.ir
+        source = ir.node_index.get(connection.get("from"))
+        target = ir.node_index.get(connection.get("to"))
+        if source is None or target is None:
+            if final:
+                self.warn(f"Skipping connection with invalid source or target: {connection}")
+            else:
+                self._pending_connections.append(connection)
+            return
+        style_key = (connection.get("color", "black"), connection.get("style", "solid"),
+                     bool(connection.get("bidirectional", False)))
+        style = self._style_ids.get(style_key)
+        if style is None:
+            style = self._style_ids[style_key] = len(ir.edge_styles)
+            ir.edge_styles.append(style_key)
+        ir.edge_src.append(source)
+        ir.edge_dst.append(target)
+        ir.edge_style.append(style)
+
+    def finish(self):
+        """Resolve connections that came before their nodes and return the TopologyIR"""
+        pending, self._pending_connections = self._pending_connections, []
+        if self._redefined:
+            self._rebind_connections()
+        for connection in pending:
+            self.add_connection(connection, final=True)
+        if self.ir.subnets:
+            self.place_by_subnet(self.ir.subnets)
+        return self.ir
+
+    def _rebind_connections(self):
+        """Move connections off node definitions that a later duplicate id replaced"""
+        ir = self.ir
+        latest = array("i", (ir.node_index[node_id] for node_id in ir.node_ids))
+        ir.edge_src = array("i", (latest[node] for node in ir.edge_src))
+        ir.edge_dst = array("i", (latest[node] for node in ir.edge_dst))
+
+    def place_by_subnet(self, subnets):
+        """Move top-level nodes into nested clusters built from a list of subnets.
+
+        Each node with an ip goes to its most specific containing subnet
+        (see subnet_clusters.SubnetIndex); subnets nest by containment and
+        only those that end up holding nodes become clusters, appended after
+        the config's own clusters. Nodes already inside a cluster stay where
+        they are. Invalid, unmatched and duplicate addresses or subnets are
+        recorded in ir.diagnostics and reported as warnings.
+        """
+        ir = self.ir
+        index = SubnetIndex(subnets)
+        assignment, node_diagnostics = assign_subnets(
+            index, [(ir.node_ids[node], ir.node_ips[node]) for node in ir.root_nodes])
+        for item in index.diagnostics + node_diagnostics:
+            ir.diagnostics.append(item)
+            self.warn(item["message"])
+
+        members = [[] for _ in range(len(index))]
+        remaining = []
+        for node, subnet in zip(ir.root_nodes, assignment):
+            (remaining if subnet == NO_SUBNET else members[subnet]).append(node)
+        used = [bool(nodes) for nodes in members]
+        # Subnets are in pre-order, so walking them backwards sees children before parents
+        for subnet in range(len(index) - 1, -1, -1):
+            if used[subnet] and index.parent[subnet] != NO_SUBNET:
+                used[index.parent[subnet]] = True
+
+        cluster_of = {}
+        for subnet in range(len(index)):
+            if not used[subnet]:
+                continue
+            up = index.parent[subnet]
+            parent = NO_CLUSTER if up == NO_SUBNET else cluster_of[up]
+            cluster = cluster_of[subnet] = len(ir.cluster_labels)
+            name, network = index.names[subnet], str(index.networks[subnet])
+            ir.cluster_names.append(name)
+            ir.cluster_labels.append(name if name == network else f"{name} ({network})")
+            ir.cluster_parent.append(parent)
+            ir.cluster_depth.append(0 if parent == NO_CLUSTER else ir.cluster_depth[parent] + 1)
+            ir.cluster_children.append([])
+            ir.cluster_nodes.append(members[subnet])
+            for node in members[subnet]:
+                ir.node_cluster[node] = cluster
+            if parent == NO_CLUSTER:
+                ir.root_clusters.append(cluster)
+            else:
+                ir.cluster_children[parent].append(cluster)
+        ir.root_nodes = remaining
+
+
+def compile_topology(config, icons_dir=None, log=print):
+    """Compile a diagram config into a TopologyIR in a single iterative pass.
+
+    Invalid direction/outformat raise ValueError. Nodes without id or icon and
+    connections to unknown ids are skipped with a warning, as before.
+    """
+    if isinstance(config, TopologyIR):
+        return config
+
+    builder = TopologyBuilder(icons_dir, log)
+    builder.set_options(config)
+    for node_def in config.get("nodes", []):
+        builder.add_node(node_def)
+    for cluster_def in config.get("clusters", []):
+        builder.add_cluster(cluster_def)
+    for connection in config.get("connections", []):
+        builder.add_connection(connection, final=True)
+    return builder.finish()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+import os
+import time
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+from config_stream import load_topology
+from dot_emitter import emit_dot
+from generate_from_json import generate_diagram
+from render_cache import icon_digest
+from topology_ir import ICONS_DIR, RENDER_OPTIONS
+
+
+class FileWatcher:
+    """轮询文件的 (mtime_ns, size) 检测变化，目录按其中的文件逐个比较
+
+    每次轮询只对被监视的文件做一次stat，不读取文件内容，几十个文件的开销可以忽略。
+    """
+
+    def __init__(self, paths):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self._state = self._snapshot()
+
+    def _snapshot(self):
+        state = {}
+        for path in self.paths:
+            if os.path.isdir(path):
+                try:
+                    entries = list(os.scandir(path))
+                except OSError:
+                    continue
+                for entry in entries:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    state[entry.path] = (st.st_mtime_ns, st.st_size)
+            else:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # 编辑器保存时可能短暂删除文件
+                state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def poll(self):
+        """返回自上次轮询以来新增、修改或删除的文件路径集合"""
+        state = self._snapshot()
+        changed = {path for path in state.keys() | self._state.keys()
+                   if state.get(path) != self._state.get(path)}
+        self._state = state
+        return changed
+
+
+def topology_fingerprint(ir):
+    """拓扑内容的哈希：DOT文本（包含全部节点、区域、连线和样式）、RENDER_OPTIONS 中的全部渲染选项和引用图标的内容
+
+    只改动了空白、注释或键顺序的配置得到相同的指纹，不会触发重新渲染。
+    """
+    h = hashlib.sha256()
+    h.update(emit_dot(ir).encode("utf-8"))
+    for option in RENDER_OPTIONS:
+        h.update(b"\0")
+        h.update(repr(getattr(ir, option)).encode("utf-8"))
+    for icon_path in ir.icon_paths:
+        h.update(b"\0")
+        h.update(icon_digest(icon_path).encode("ascii"))
+    return h.hexdigest()
+
+
+class DiagramWatcher:
+    """监视配置文件和图标目录，防抖后只在拓扑实际变化时重新渲染
+
+    进程常驻，渲染依赖只导入一次；最近的渲染结果按指纹保存在内存中（撤销修改时
+    直接写回，不再渲染），dot后端的布局通过布局缓存复用，只改样式时跳过重新布局。
+    """
+
+    def __init__(self, config_paths, overrides=None, level_of_detail=None, icons_dir=None,
+                 interval=0.3, debounce=0.3, keep_results=32):
+        self.config_paths = [os.path.abspath(p) for p in config_paths]
+        self.overrides = overrides or {}
+        self.level_of_detail = level_of_detail or {}
+        self.icons_dir = os.path.abspath(icons_dir or ICONS_DIR)
+        self.interval = interval
+        self.debounce = debounce
+        self.keep_results = keep_results
+        self._fingerprints = {}  # 配置文件 -> 上次处理的指纹
+        self._results = OrderedDict()  # 指纹 -> 渲染结果字节（LRU）
+
+    def _load(self, path):
+        ir = load_topology(path, overrides=dict(self.overrides))
+        if self.level_of_detail:
+            ir.level_of_detail = dict(ir.level_of_detail or {}, **self.level_of_detail)
+        return ir
+
+    def refresh(self, path):
+        """重新解析一个配置文件，拓扑有变化时渲染；解析或渲染失败只打印错误"""
+        name = os.path.relpath(path)
+        start = time.perf_counter()
+        try:
+            ir = self._load(path)
+            fingerprint = topology_fingerprint(ir)
+            if self._fingerprints.get(path) == fingerprint:
+                print(f"· {name}: 拓扑未变化，跳过渲染")
+                return
+            output = f"{ir.output_filename}.{ir.outformat}"
+            data = self._results.get(fingerprint)
+            if data is not None:
+                self._results.move_to_end(fingerprint)
+                how = "复用内存中的结果"
+            else:
+                render_info = {}
+                data = generate_diagram(ir, strict=True, in_memory=True, reuse_layout=True,
+                                        render_info=render_info)
+                if not data:
+                    raise RuntimeError("图表生成失败")
+                self._results[fingerprint] = data
+                while len(self._results) > self.keep_results:
+                    self._results.popitem(last=False)
+                how = {"cached": "复用布局", "full": "重新布局"}.get(render_info.get("layout"), "完整渲染")
+            _write_atomic(output, data)
+            self._fingerprints[path] = fingerprint
+            print(f"✅ {name} -> {output}（{how}，{time.perf_counter() - start:.2f}秒）")
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+
+    def run(self):
+        for path in self.config_paths:
+            self.refresh(path)
+        watcher = FileWatcher(self.config_paths + [self.icons_dir])
+        print(f"👀 正在监视 {len(self.config_paths)} 个配置文件和图标目录 {self.icons_dir}，按Ctrl+C退出")
+        pending = set()
+        last_change = 0.0
+        try:
+            while True:
+                time.sleep(self.interval)
+                changed = watcher.poll()
+                if changed:
+                    pending |= changed
+                    last_change = time.monotonic()
+                    continue
+                # 连续保存时等到最后一次修改之后 debounce 秒再处理
+                if not pending or time.monotonic() - last_change < self.debounce:
+                    continue
+                if any(os.path.dirname(p) == self.icons_dir for p in pending):
+                    targets = self.config_paths  # 图标变化可能影响所有配置，由指纹判断是否需要渲染
+                else:
+                    targets = [p for p in self.config_paths if p in pending]
+                pending.clear()
+                for path in targets:
+                    self.refresh(path)
+        except KeyboardInterrupt:
+            print("\n已停止监视")
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def watch(config_paths, overrides=None, level_of_detail=None, **options):
+    """阻塞运行监视模式，直到按下Ctrl+C"""
+    DiagramWatcher(config_paths, overrides, level_of_detail, **options).run()
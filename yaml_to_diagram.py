@@ -4,6 +4,7 @@ import sys
 import json
 import yaml
 import tempfile
+from config_stream import load_topology
 from generate_from_json import generate_diagram
 
 def load_yaml_config(yaml_path):
@@ -15,6 +16,14 @@ def load_yaml_config(yaml_path):
         print(f"❌ Failed to load YAML configuration: {e}")
         sys.exit(1)
 
+def load_yaml_topology(yaml_path):
+    """Stream a YAML file straight into a TopologyIR without building the whole document"""
+    try:
+        return load_topology(yaml_path)
+    except Exception as e:
+        print(f"❌ Failed to load YAML configuration: {e}")
+        sys.exit(1)
+
 def main():
     if len(sys.argv) != 2:
         print("Usage: python yaml_to_diagram.py <yaml_config_file>")
@@ -23,8 +32,8 @@ def main():
     yaml_path = sys.argv[1]
     print(f"Loading YAML configuration from {yaml_path}")
     
-    # Load YAML configuration
-    config = load_yaml_config(yaml_path)
+    # Load YAML configuration, compiling nodes/clusters/connections as they are parsed
+    config = load_yaml_topology(yaml_path)
     
     # Generate diagram directly from the loaded configuration
     print("Generating diagram...")